@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -95,9 +96,25 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # тестова БД — прямо з моделей: ланцюг міграцій у репозиторії відстає від models.py
+        "TEST": {"MIGRATE": False},
     }
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # результати звітів; ключі містять версію даних, тому TIMEOUT — лише страховка
+    "reports": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "reports",
+        "TIMEOUT": 6 * 60 * 60,
+        "OPTIONS": {"MAX_ENTRIES": 200},
+    },
+}
+REPORT_CACHE_ALIAS = "reports"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -176,4 +193,50 @@ M365_SYNC_CHAINS = {
     ],
 }
 
-M365_SYNC_WORKERS = 4
\ No newline at end of file
+# потоки синхронних пакетних викликів (delta, upload); обхід папок у sync_m365_orders
+# обмежує не він, а вікно обмежувача зі стелею M365_MAX_CONCURRENCY
+M365_SYNC_WORKERS = 4
+# скільки секунд sync_m365_orders дає на одну папку проекту (0 — без обмеження)
+M365_FOLDER_TIMEOUT = float(os.getenv("M365_FOLDER_TIMEOUT", "120"))
+# за скільки секунд до закінчення дії токена Graph оновлювати його заздалегідь
+M365_TOKEN_REFRESH_MARGIN = int(os.getenv("M365_TOKEN_REFRESH_MARGIN", "300"))
+# спільний обмежувач Graph (doors/services/m365_limiter.py): стеля запитів/с (0 — без межі),
+# запас токенів і макс. одночасних запитів (0 — M365_SYNC_WORKERS + 4)
+M365_RATE_LIMIT = float(os.getenv("M365_RATE_LIMIT", "50"))
+M365_RATE_BURST = float(os.getenv("M365_RATE_BURST", "0")) or None
+M365_MAX_CONCURRENCY = int(os.getenv("M365_MAX_CONCURRENCY", "0"))
+# кеш переліків дітей папок для веб-процесу (doors/services/m365_cache.py): TTL у секундах
+# (0 — без кешу), макс. папок і макс. елементів сумарно
+M365_CHILDREN_CACHE_TTL = float(os.getenv("M365_CHILDREN_CACHE_TTL", "120"))
+M365_CHILDREN_CACHE_SIZE = int(os.getenv("M365_CHILDREN_CACHE_SIZE", "1000"))
+M365_CHILDREN_CACHE_MAX_ITEMS = int(os.getenv("M365_CHILDREN_CACHE_MAX_ITEMS", "50000"))
+# $top для переліків дітей/пошуку/delta Graph (0 — розмір сторінки за замовчуванням Graph)
+M365_PAGE_SIZE = int(os.getenv("M365_PAGE_SIZE", "500"))
+# запобіжник Graph: після стількох невдалих запитів поспіль (мережа/5xx) — відмова без запиту на COOLDOWN с
+M365_BREAKER_THRESHOLD = int(os.getenv("M365_BREAKER_THRESHOLD", "5"))
+M365_BREAKER_COOLDOWN = float(os.getenv("M365_BREAKER_COOLDOWN", "30"))
+# як часто процес скидає метрики викликів Graph у M365GraphMetric, секунди (0 — лише явно)
+M365_METRICS_FLUSH_INTERVAL = float(os.getenv("M365_METRICS_FLUSH_INTERVAL", "60"))
+# sync_m365_orders --watch: пауза між циклами сайту, с; розкид ±частка паузи; стеля паузи після помилок
+M365_SYNC_INTERVAL = float(os.getenv("M365_SYNC_INTERVAL", "300"))
+M365_SYNC_JITTER = float(os.getenv("M365_SYNC_JITTER", "0.1"))
+M365_SYNC_MAX_BACKOFF = float(os.getenv("M365_SYNC_MAX_BACKOFF", "3600"))
+# власні паузи окремих сайтів: "Проекти 2026=120,Переробка профілю 2026=900"
+raw_site_intervals = os.getenv("M365_SYNC_SITE_INTERVALS", "")
+M365_SYNC_SITE_INTERVALS = {
+    name.strip(): float(value)
+    for name, _, value in (s.rpartition("=") for s in raw_site_intervals.split(",") if "=" in s)
+}
+# один запуск sync_m365_orders обходить не більше стількох папок проектів / не починає нових після
+# стількох секунд (0 — без межі); незавершений повний обхід продовжує наступний запуск
+M365_SYNC_MAX_FOLDERS = int(os.getenv("M365_SYNC_MAX_FOLDERS", "0"))
+M365_SYNC_TIME_BUDGET = float(os.getenv("M365_SYNC_TIME_BUDGET", "0"))
+# скільки разів за повний обхід пробувати папку, що падає (у межах запуску — у кінці черги)
+M365_SYNC_FOLDER_ATTEMPTS = int(os.getenv("M365_SYNC_FOLDER_ATTEMPTS", "3"))
+# частка папок з помилками, вище якої цикл сайту невдалий (--watch відкладає його з backoff)
+M365_SYNC_MAX_ERROR_RATIO = float(os.getenv("M365_SYNC_MAX_ERROR_RATIO", "0.1"))
+# файл блокування: другий запуск, поки триває попередній, пропускає цикл
+M365_SYNC_LOCK_FILE = os.getenv("M365_SYNC_LOCK_FILE", os.path.join(tempfile.gettempdir(), "sync_m365_orders.lock"))
+
+# Норма виробітку Hv (к/с за год), якщо в адмінці не задано жодної ProductionNorm
+PRODUCTION_HV_DEFAULT = os.getenv("PRODUCTION_HV_DEFAULT", "0.75")
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Product, Addition, Coefficient, Rate, Order, OrderItem, AdditionItem, Worker, WorkLog, OrderProgress, Category, CompanyInfo,Customer
+from .models import Product, Addition, Coefficient, Rate, Order, OrderItem, AdditionItem, Worker, WorkLog, OrderProgress, Category, CompanyInfo,Customer, PdfSyncJob, ProductionNorm, M365GraphMetric, M365FolderSyncState
+from .services.m365_metrics import capped_percentile
 # Register your models here.
 
 admin.site.register(Product)
@@ -36,4 +37,58 @@ class CompanyInfoAdmin(admin.ModelAdmin):
         ("Банківські реквізити", {
             "fields": ("iban", "edrpou")
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(PdfSyncJob)
+class PdfSyncJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "order", "mode", "status", "progress_done", "progress_total", "attempts", "created_at")
+    list_filter = ("status", "mode")
+    readonly_fields = ("created_at", "updated_at", "started_at", "finished_at")
+
+
+@admin.register(ProductionNorm)
+class ProductionNormAdmin(admin.ModelAdmin):
+    list_display = ("valid_from", "hv", "comment")
+
+
+@admin.register(M365FolderSyncState)
+class M365FolderSyncStateAdmin(admin.ModelAdmin):
+    list_display = ("folder_name", "drive", "status", "attempts", "last_synced_at", "last_attempt_at", "error")
+    list_filter = ("status", "drive")
+    search_fields = ("folder_name", "folder_id")
+    readonly_fields = [field.name for field in M365FolderSyncState._meta.get_fields() if field.concrete]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(M365GraphMetric)
+class M365GraphMetricAdmin(admin.ModelAdmin):
+    list_display = ("period_start", "source", "endpoint", "calls", "errors", "retries", "throttled",
+                    "megabytes", "avg_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+    list_filter = ("source", "endpoint")
+    date_hierarchy = "period_start"
+    readonly_fields = [field.name for field in M365GraphMetric._meta.get_fields() if field.concrete]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description="МБ")
+    def megabytes(self, obj):
+        return round(obj.bytes / (1024 * 1024), 2)
+
+    @admin.display(description="avg, мс")
+    def avg_ms(self, obj):
+        return round(obj.total_ms / obj.calls, 1) if obj.calls else None
+
+    @admin.display(description="p50, мс")
+    def p50_ms(self, obj):
+        return capped_percentile(obj.latency_buckets, 0.50, obj.max_ms)
+
+    @admin.display(description="p95, мс")
+    def p95_ms(self, obj):
+        return capped_percentile(obj.latency_buckets, 0.95, obj.max_ms)
+
+    @admin.display(description="p99, мс")
+    def p99_ms(self, obj):
+        return capped_percentile(obj.latency_buckets, 0.99, obj.max_ms)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DoorsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "doors"
+
+    def ready(self):
+        from doors import signals  # noqa: F401 — реєстрація обробників
@@ -0,0 +1,236 @@
+import json
+import platform
+import random
+import time
+from io import StringIO
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from doors.models import Order, OrderFile, OrderImage
+from doors.management.commands import sync_m365_orders
+from doors.services import m365_graph, m365_limiter, m365_metrics
+from doors.services.m365_fake import FakeGraphServer, generate_project_tree
+
+SITE_NAME = "Бенчмарк"
+DRIVE_ID = "bench-drive"
+DRIVE_NAME = "Документи"
+WRITE_SQL = ("INSERT", "UPDATE", "DELETE")
+
+
+class _QueryCounter:
+    """execute_wrapper: рахує запити без queries_log (той обмежений 9000 записами)."""
+
+    def __init__(self):
+        self.queries = 0
+        self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        if sql.lstrip().upper().startswith(WRITE_SQL):
+            self.writes += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк sync_m365_orders проти локальної заглушки Graph (FakeGraphServer) "
+        "на згенерованих деревах папок. Дані створюються в транзакції і відкочуються після заміру."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--projects",
+            default="50,200",
+            help="Кількість папок проектів у згенерованих деревах, через кому",
+        )
+        parser.add_argument(
+            "--files-per-leaf",
+            type=int,
+            default=5,
+            help="Скільки файлів у кожній папці 'Для КС'",
+        )
+        parser.add_argument(
+            "--latency-ms",
+            type=float,
+            default=20,
+            help="Штучна затримка кожного HTTP-запиту до заглушки, мс",
+        )
+        parser.add_argument(
+            "--throttle-every",
+            type=int,
+            default=0,
+            help="Кожен n-й запит Graph отримує 429 з Retry-After (0 — без throttling)",
+        )
+        parser.add_argument(
+            "--rate-limit",
+            type=float,
+            default=0,
+            help="Стеля обмежувача Graph, запитів/с (0 — без межі)",
+        )
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=200,
+            help="Розмір сторінки колекцій у заглушці",
+        )
+        parser.add_argument(
+            "--changes",
+            type=int,
+            default=5,
+            help="Скільки нових файлів додати перед сценарієм incremental_changes",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=42,
+            help="Seed для генератора дерева",
+        )
+        parser.add_argument(
+            "--output",
+            default="",
+            help="Шлях до JSON-файлу з результатами (за замовчуванням — stdout)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(x) for x in options["projects"].split(",") if x.strip()]
+        except ValueError:
+            raise CommandError("--projects must be a comma separated list of integers")
+
+        results = []
+        for size in sizes:
+            with FakeGraphServer(page_size=options["page_size"]) as fake:
+                items = generate_project_tree(
+                    fake, DRIVE_ID, size,
+                    files_per_leaf=options["files_per_leaf"],
+                    seed=options["seed"],
+                    site_name=SITE_NAME,
+                    drive_name=DRIVE_NAME,
+                )
+                fake.latency = options["latency_ms"] / 1000
+                fake.throttle_every = options["throttle_every"]
+                # свій обмежувач на кожен розмір дерева: стан AIMD не переходить між замірами
+                limiter = m365_limiter.AdaptiveLimiter(
+                    rate=options["rate_limit"],
+                    max_concurrency=int(getattr(settings, "M365_SYNC_WORKERS", 4) or 1) + 4,
+                )
+
+                with transaction.atomic(), \
+                        mock.patch.object(m365_limiter, "_limiter", limiter), \
+                        mock.patch.object(m365_limiter, "_breaker", m365_limiter.CircuitBreaker()), \
+                        mock.patch.object(m365_metrics, "_metrics", m365_metrics.GraphMetrics(source="bench")), \
+                        mock.patch.object(m365_metrics, "FLUSH_INTERVAL", 0), \
+                        mock.patch.object(sync_m365_orders, "flush_metrics", lambda: None), \
+                        mock.patch.object(m365_graph, "GRAPH_BASE", fake.graph_base), \
+                        mock.patch.object(m365_graph, "get_app_token", lambda: "bench-token"), \
+                        override_settings(M365_SITE_DISPLAY_NAMES=[SITE_NAME], M365_DRIVE_NAME=DRIVE_NAME):
+                    scenarios = [
+                        ("full", []),
+                        ("full_repeat", []),
+                        ("full_forced", ["--full"]),
+                        ("incremental_noop", ["--incremental"]),
+                        ("incremental_changes", ["--incremental"]),
+                    ]
+                    for scenario, sync_args in scenarios:
+                        if scenario == "incremental_changes":
+                            self._add_files(fake, options["changes"], random.Random(options["seed"]))
+
+                        row = self._measure(fake, limiter, sync_args)
+                        row.update(scenario=scenario, projects=size, tree_items=items)
+                        results.append(row)
+                        self.stderr.write(
+                            f"[{size:>5} projects] {scenario:<20} "
+                            f"wall={row['wall_ms']:.0f}ms "
+                            f"http={row['http_requests']} "
+                            f"resp={row['response_kb']:.0f}KB "
+                            f"graph_calls={row['graph_calls']} "
+                            f"db_writes={row['db_writes']} "
+                            f"throttled={row['throttled']}"
+                        )
+
+                    # синтетичні дані не залишаємо в БД
+                    transaction.set_rollback(True)
+
+        report = {
+            "benchmark": "sync_m365_orders",
+            "generated_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "db_vendor": connection.vendor,
+            "latency_ms": options["latency_ms"],
+            "throttle_every": options["throttle_every"],
+            "rate_limit": options["rate_limit"],
+            "page_size": options["page_size"],
+            "files_per_leaf": options["files_per_leaf"],
+            "seed": options["seed"],
+            "results": results,
+        }
+
+        payload = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as fh:
+                fh.write(payload)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+    def _add_files(self, fake: FakeGraphServer, count: int, rnd: random.Random):
+        """Нові файли у випадкових папках 'Для КС' + відповідні записи в delta-журналі."""
+        leaf_keys = [
+            (DRIVE_ID, it["id"])
+            for key, children in fake.children.items() if key[0] == DRIVE_ID
+            for it in children if it.get("name", "").startswith("Для КС")
+        ]
+        for n, key in enumerate(rnd.sample(leaf_keys, min(count, len(leaf_keys))), start=1):
+            item = {"id": f"bench-new-{n}", "name": f"нове_{n}.dwg", "file": {}, "size": 1024}
+            fake.children[key].append(item)
+            fake.touch(DRIVE_ID, dict(item, parentReference={"driveId": DRIVE_ID, "id": key[1]}))
+
+    def _measure(self, fake: FakeGraphServer, limiter, sync_args: list) -> dict:
+        """Метрики Graph бенчмарк забирає сам (drain), у M365GraphMetric вони не пишуться."""
+        fake.calls.clear()
+        m365_metrics.get_metrics().drain()
+        fake.bytes_out = 0
+        before = limiter.snapshot()
+        out, err = StringIO(), StringIO()
+
+        counter = _QueryCounter()
+        with connection.execute_wrapper(counter):
+            t0 = time.perf_counter()
+            call_command("sync_m365_orders", *sync_args, stdout=out, stderr=err)
+            wall = time.perf_counter() - t0
+
+        calls = dict(fake.calls)
+        after = limiter.snapshot()
+        return {
+            "wall_ms": round(wall * 1000, 1),
+            # реальні HTTP-запити до "Graph"
+            "http_requests": calls.get("http_requests", 0),
+            "batches": calls.get("handle_batch", 0),
+            "response_kb": round(fake.bytes_out / 1024, 1),
+            # логічні операції Graph (включно з підзапитами $batch)
+            "graph_calls": sum(v for k, v in calls.items() if k.startswith("handle_") and k != "handle_batch"),
+            "throttled": calls.get("throttled", 0) + calls.get("batch_throttled", 0),
+            "db_queries": counter.queries,
+            "db_writes": counter.writes,
+            "orders": Order.objects.filter(remote_drive_id=DRIVE_ID).count(),
+            "files": OrderFile.objects.filter(remote_drive_id=DRIVE_ID).count(),
+            "images": OrderImage.objects.filter(remote_drive_id=DRIVE_ID).count(),
+            "errors": len([line for line in err.getvalue().splitlines() if line.strip()]),
+            "limiter": {
+                "waited_s": round(after["waited_s"] - before["waited_s"], 2),
+                "rate": after["rate"],
+                "window": after["window"],
+            },
+            "endpoints": m365_metrics.summarize(
+                dict(stat, endpoint=name) for name, stat in m365_metrics.get_metrics().drain().items()
+            ),
+            "calls": calls,
+        }
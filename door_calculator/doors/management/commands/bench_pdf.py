@@ -0,0 +1,241 @@
+import json
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from doors.models import (
+    Category, Product, Addition, Coefficient, Rate,
+    Order, OrderItem, OrderItemProduct, AdditionItem,
+)
+from doors.views import generate_pdf
+
+PDF_MODES = {
+    "detailed": {},
+    "simple": {"simple": "1"},
+    "internal": {"internal": "1"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк generate_pdf на синтетичних замовленнях (10/100/1000 позицій). "
+        "Дані створюються в транзакції і відкочуються після заміру."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="10,100,1000",
+            help="Кількість позицій у синтетичних замовленнях, через кому",
+        )
+        parser.add_argument(
+            "--modes",
+            default=",".join(PDF_MODES),
+            help="Режими PDF через кому: detailed,simple,internal",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Скільки разів рендерити кожен режим для заміру часу",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=42,
+            help="Seed для генератора синтетичних даних",
+        )
+        parser.add_argument(
+            "--output",
+            default="",
+            help="Шлях до JSON-файлу з результатами (за замовчуванням — stdout)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(x) for x in options["sizes"].split(",") if x.strip()]
+        except ValueError:
+            raise CommandError("--sizes must be a comma separated list of integers")
+
+        modes = [m.strip() for m in options["modes"].split(",") if m.strip()]
+        unknown = [m for m in modes if m not in PDF_MODES]
+        if unknown:
+            raise CommandError(f"Unknown PDF modes: {unknown}")
+
+        repeat = max(1, options["repeat"])
+        rnd = random.Random(options["seed"])
+
+        results = []
+        with transaction.atomic():
+            catalog = self._build_catalog(rnd)
+
+            for size in sizes:
+                order = self._build_order(rnd, catalog, size)
+                for mode in modes:
+                    row = self._measure(order, mode, repeat)
+                    row["items"] = size
+                    results.append(row)
+                    self.stderr.write(
+                        f"[{size:>5} items] {mode:<8} "
+                        f"median={row['time_median_ms']:.1f}ms "
+                        f"queries={row['queries']} "
+                        f"peak={row['peak_memory_kb']:.0f}KB"
+                    )
+
+            # синтетичні дані не залишаємо в БД
+            transaction.set_rollback(True)
+
+        report = {
+            "benchmark": "generate_pdf",
+            "generated_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "db_vendor": connection.vendor,
+            "repeat": repeat,
+            "seed": options["seed"],
+            "results": results,
+        }
+
+        payload = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as fh:
+                fh.write(payload)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+    # ------------------------------------------------------------------
+    # синтетичні дані
+    # ------------------------------------------------------------------
+    def _build_catalog(self, rnd: random.Random) -> dict:
+        cat = Category.objects.create(name=f"bench-{timezone.now().timestamp()}")
+
+        products = Product.objects.bulk_create([
+            Product(category=cat, name=f"Виріб {i}", base_ks=round(rnd.uniform(0.5, 12.0), 2))
+            for i in range(1, 31)
+        ])
+
+        additions = Addition.objects.bulk_create([
+            Addition(
+                name=f"Доповнення {i}",
+                ks_value=round(rnd.uniform(0.1, 3.0), 2),
+                # частина доповнень з порогом кількості, щоб зачепити гілку extra_ks_value
+                extra_ks_value=Decimal("0.250") if i % 3 == 0 else None,
+                base_qty_limit=2 if i % 3 == 0 else 999,
+                disallow_above_limit=(i % 7 == 0),
+            )
+            for i in range(1, 21)
+        ])
+
+        coefficients = Coefficient.objects.bulk_create([
+            Coefficient(name=f"Коефіцієнт {i}", value=round(rnd.uniform(1.0, 1.6), 2))
+            for i in range(1, 9)
+        ])
+
+        if not Rate.objects.exists():
+            Rate.objects.create(price_per_ks=Decimal("450.00"))
+
+        return {"products": products, "additions": additions, "coefficients": coefficients}
+
+    def _build_order(self, rnd: random.Random, catalog: dict, size: int) -> Order:
+        order = Order.objects.create(
+            order_number=f"BENCH-{size}-{rnd.randint(0, 10 ** 9)}",
+            order_name=f"Бенчмарк {size} позицій",
+            price_per_ks=Decimal("450.00"),
+            markup_percent=Decimal("10.00"),
+        )
+
+        items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                name=f"Позиція {i}",
+                quantity=Decimal(rnd.randint(1, 6)),
+                markup_percent=Decimal("15.00") if i % 5 == 0 else None,
+            )
+            for i in range(1, size + 1)
+        ])
+
+        item_products = []
+        item_additions = []
+        item_coefficients = []
+        coef_through = OrderItem.coefficients.through
+
+        for it in items:
+            for p in rnd.sample(catalog["products"], rnd.randint(1, 3)):
+                item_products.append(
+                    OrderItemProduct(order_item=it, product=p, quantity=Decimal(rnd.randint(1, 4)))
+                )
+            for a in rnd.sample(catalog["additions"], rnd.randint(0, 4)):
+                item_additions.append(
+                    AdditionItem(order_item=it, addition=a, quantity=Decimal(rnd.randint(1, 5)))
+                )
+            for c in rnd.sample(catalog["coefficients"], rnd.randint(0, 2)):
+                item_coefficients.append(coef_through(orderitem_id=it.id, coefficient_id=c.id))
+
+        OrderItemProduct.objects.bulk_create(item_products, batch_size=1000)
+        AdditionItem.objects.bulk_create(item_additions, batch_size=1000)
+        coef_through.objects.bulk_create(item_coefficients, batch_size=1000)
+
+        # як і в робочому потоці — підсумки зберігаються в Order
+        total_ks = Decimal("0")
+        total_cost = Decimal("0")
+        for it in order.items.all():
+            ks_base, coef = it.total_ks()
+            total_ks += Decimal(str(ks_base)) * Decimal(str(coef))
+            total_cost += Decimal(str(it.total_cost()))
+        order.total_ks = total_ks
+        order.total_cost = total_cost
+        order.save(update_fields=["total_ks", "total_cost"])
+
+        return order
+
+    # ------------------------------------------------------------------
+    # заміри
+    # ------------------------------------------------------------------
+    def _measure(self, order: Order, mode: str, repeat: int) -> dict:
+        factory = RequestFactory()
+        params = {"markup": "10", "delivery": "300", "packing": "200", **PDF_MODES[mode]}
+
+        def render():
+            request = factory.get(f"/generate-pdf/{order.id}/", params)
+            resp = generate_pdf(request, order.id)
+            return resp.content if hasattr(resp, "content") else b"".join(resp.streaming_content)
+
+        # прогрів (реєстрація шрифту, кеші reportlab)
+        render()
+
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - t0) * 1000)
+
+        # окремий прогін під tracemalloc і лічильником запитів,
+        # щоб накладні витрати трасування не потрапили в таймінги
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as ctx:
+                pdf_bytes = render()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "mode": mode,
+            "time_min_ms": round(min(timings), 2),
+            "time_median_ms": round(statistics.median(timings), 2),
+            "time_mean_ms": round(statistics.mean(timings), 2),
+            "queries": len(ctx.captured_queries),
+            "peak_memory_kb": round(peak / 1024, 1),
+            "pdf_bytes": len(pdf_bytes),
+        }
@@ -0,0 +1,67 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from doors.models import M365GraphMetric
+from doors.services.m365_metrics import summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Статистика викликів Microsoft Graph за класами endpoint-ів: кількість, помилки, "
+        "повтори, 429, обсяг і перцентилі латентності (з M365GraphMetric усіх процесів)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=int,
+            default=24,
+            help="За скільки останніх годин (за замовчуванням 24)",
+        )
+        parser.add_argument(
+            "--source",
+            default="",
+            help="Лише один процес: web, sync_m365_orders, run_pdf_sync_jobs, ...",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Вивести JSON замість таблиці",
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options["hours"])
+        rows = M365GraphMetric.objects.filter(period_start__gte=since.replace(minute=0, second=0, microsecond=0))
+        if options["source"]:
+            rows = rows.filter(source=options["source"])
+
+        summary = summarize(rows)
+        if options["json"]:
+            self.stdout.write(json.dumps(summary, ensure_ascii=False, indent=2, default=str))
+            return
+
+        if not summary:
+            self.stdout.write("No Graph calls recorded in this period")
+            return
+
+        header = f"{'endpoint':<10} {'calls':>7} {'errors':>6} {'retries':>7} {'429':>5} {'MB':>8} " \
+                 f"{'avg ms':>8} {'p50':>6} {'p95':>6} {'p99':>6} {'max ms':>8}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for endpoint, s in summary.items():
+            self.stdout.write(
+                f"{endpoint:<10} {s['calls']:>7} {s['errors']:>6} {s['retries']:>7} {s['throttled']:>5} "
+                f"{s['bytes'] / (1024 * 1024):>8.2f} {_ms(s['avg_ms']):>8} {_ms(s['p50_ms']):>6} "
+                f"{_ms(s['p95_ms']):>6} {_ms(s['p99_ms']):>6} {_ms(s['max_ms']):>8}"
+            )
+
+
+def _ms(value) -> str:
+    if value is None:
+        return "-"
+    if value == float("inf"):
+        return ">30000"
+    return f"{value:.0f}"
@@ -0,0 +1,74 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from doors.models import Order
+from doors.services.m365_graph import UPLOAD_CHUNK_UNIT, upload_many_to_folder
+from doors.services.m365_metrics import flush_metrics
+
+
+class Command(BaseCommand):
+    help = "Завантажити локальні файли (креслення, пакети PDF) в папку замовлення в Teams/SharePoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("order_id", type=int)
+        parser.add_argument("paths", nargs="+", help="Локальні файли для завантаження")
+        parser.add_argument(
+            "--folder-id",
+            default="",
+            help="ID цільової папки (за замовчуванням — коренева папка проєкту замовлення)",
+        )
+        parser.add_argument(
+            "--chunk-kb",
+            type=int,
+            default=UPLOAD_CHUNK_UNIT * 16 // 1024,
+            help="Розмір шматка upload session у КБ (кратно 320)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Скільки файлів завантажувати паралельно (за замовчуванням M365_SYNC_WORKERS)",
+        )
+
+    def handle(self, *args, **options):
+        order = Order.objects.filter(id=options["order_id"]).first()
+        if not order:
+            raise CommandError("Order not found")
+        if order.source != "m365" or not order.remote_drive_id:
+            raise CommandError("Order is not linked to M365 project folder")
+
+        folder_id = options["folder_id"] or order.remote_folder_id
+        if not folder_id:
+            raise CommandError("Target folder is not set")
+
+        missing = [p for p in options["paths"] if not os.path.isfile(p)]
+        if missing:
+            raise CommandError(f"Files not found: {missing}")
+
+        chunk_size = options["chunk_kb"] * 1024
+
+        def progress(path):
+            def _cb(done, total):
+                self.stdout.write(f"  {os.path.basename(path)}: {done * 100 // max(total, 1)}%")
+            return _cb
+
+        try:
+            items = upload_many_to_folder(
+                [
+                    {
+                        "drive_id": order.remote_drive_id,
+                        "folder_id": folder_id,
+                        "path": path,
+                        "chunk_size": chunk_size,
+                        "on_progress": progress(path),
+                    }
+                    for path in options["paths"]
+                ],
+                max_workers=options["workers"],
+            )
+        finally:
+            flush_metrics()
+
+        for item in items:
+            self.stdout.write(self.style.SUCCESS(f"Uploaded {item.get('name')} ({item.get('size')} bytes)"))
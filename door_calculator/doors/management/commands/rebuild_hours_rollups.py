@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from doors.services.hours_rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Перераховує підсумки годин працівників (день/тиждень/місяць) з журналу робіт"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--worker",
+            type=int,
+            action="append",
+            dest="worker_ids",
+            help="ID працівника (можна кілька разів). За замовчуванням — усі працівники",
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_rollups(options["worker_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Готово. Записано {rows} рядків підсумків."))
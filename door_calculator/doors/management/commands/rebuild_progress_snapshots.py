@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from doors.models import Order
+from doors.services.progress_snapshots import rebuild_order_snapshots
+
+
+class Command(BaseCommand):
+    help = "Перебудовує щоденні знімки прогресу (OrderProgressSnapshot) з записів OrderProgress"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--order",
+            type=int,
+            action="append",
+            dest="order_ids",
+            help="ID замовлення (можна кілька разів). За замовчуванням — усі замовлення",
+        )
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all().order_by("id")
+        if options["order_ids"]:
+            orders = orders.filter(id__in=options["order_ids"])
+
+        total = orders.count()
+        rows = 0
+        for n, order in enumerate(orders.iterator(), start=1):
+            written = rebuild_order_snapshots(order)
+            rows += written
+            if written:
+                self.stdout.write(f"[{n}/{total}] #{order.id} {order.order_number} — {written} днів")
+
+        self.stdout.write(self.style.SUCCESS(f"\nГотово. Записано {rows} знімків для {total} замовлень."))
@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from doors.services.pdf_sync import claim_next_job, requeue_stale_jobs, run_pdf_sync_job
+
+
+class Command(BaseCommand):
+    help = "Worker: виконує задачі синхронізації PDF в Teams/SharePoint з черги PdfSyncJob"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Виконати всі задачі, що готові зараз, і завершитись",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Пауза між опитуваннями черги, коли вона порожня (секунди)",
+        )
+        parser.add_argument(
+            "--max-jobs",
+            type=int,
+            default=0,
+            help="Завершитись після N задач (0 = без обмеження)",
+        )
+
+    def handle(self, *args, **options):
+        once = options["once"]
+        interval = max(0.2, options["interval"])
+        max_jobs = options["max_jobs"]
+        processed = 0
+
+        self.stdout.write(self.style.WARNING(f"PDF sync worker started. Interval={interval}s"))
+
+        while True:
+            requeued = requeue_stale_jobs()
+            if requeued:
+                self.stderr.write(self.style.WARNING(f"Requeued {requeued} stale job(s)"))
+
+            job = claim_next_job()
+            if job is None:
+                if once:
+                    break
+                time.sleep(interval)
+                continue
+
+            started = time.monotonic()
+            job = run_pdf_sync_job(job)
+            elapsed = time.monotonic() - started
+            processed += 1
+
+            line = (
+                f"Job #{job.id} order={job.order_id} mode={job.mode} "
+                f"-> {job.status} ({elapsed:.1f}s, attempt {job.attempts}/{job.max_attempts})"
+            )
+            if job.status == "done":
+                self.stdout.write(self.style.SUCCESS(line))
+            elif job.status == "failed":
+                self.stderr.write(self.style.ERROR(f"{line}: {job.error}"))
+            else:
+                self.stderr.write(self.style.WARNING(f"{line}: {job.error}"))
+
+            if max_jobs and processed >= max_jobs:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"Worker finished. processed={processed}"))
@@ -1,7 +1,9 @@
+import asyncio
 import os
 import time
-import concurrent.futures
-from typing import Iterable, List, Dict, Set
+from collections import Counter
+from datetime import timezone as dt_timezone
+from typing import List, Dict, Set
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
@@ -9,16 +11,25 @@ from django.db import transaction
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 
-from doors.models import Order, OrderFile, OrderImage
+from doors.models import M365DriveState, M365FolderSyncState, Order, OrderFile, OrderImage
+from doors.services.m365_async import AsyncGraphClient
 from doors.services.m365_graph import (
+    BATCH_LIMIT,
+    GraphError,
+    batch_get_items,
+    drive_delta,
+    drive_delta_latest,
     find_site_by_display_name,
     pick_drive,
     list_root_children,
-    list_children,
-    search_in_folder,
 )
+from doors.services.m365_limiter import get_breaker, get_limiter
+from doors.services.m365_metrics import flush_metrics
+from doors.services.sync_schedule import SiteSchedule, sync_lock
 
 IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tiff"}
+# що оновлюється в OrderFile/OrderImage, коли змінився eTag елемента
+ITEM_FIELDS = ["remote_web_url", "remote_name", "remote_size", "remote_etag", "remote_ctag", "remote_modified_at"]
 
 
 def _norm(s: str) -> str:
@@ -69,6 +80,34 @@ def _parse_m365_created_dt(item: dict):
     return timezone.localtime(dt)
 
 
+def _parse_m365_dt(raw: str):
+    dt = parse_datetime(raw) if raw else None
+    if dt is not None and timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, dt_timezone.utc)
+    return dt
+
+
+def _remote_version(item: dict) -> dict:
+    """Поля версії елемента M365 для Order/OrderFile/OrderImage."""
+    return {
+        "remote_etag": item.get("eTag"),
+        "remote_ctag": item.get("cTag"),
+        "remote_modified_at": _parse_m365_dt(item.get("lastModifiedDateTime")),
+    }
+
+
+def folder_unchanged(folder: dict, version: tuple) -> bool:
+    """
+    Папка проекту, схоже, не змінилася з минулої синхронізації: cTag (вміст самої папки)
+    і eTag (назва, розташування) ті самі. Що зміни глибше під папкою дійдуть до її cTag,
+    Graph не обіцяє, а в бібліотеках SharePoint cTag у папок часто й немає (тоді обходимо),
+    тож це лише дешевий пропуск для звичайного обходу — --full і відкат з --incremental
+    на повний обхід ним не користуються.
+    """
+    etag, ctag = version or (None, None)
+    return bool(folder.get("cTag")) and folder.get("cTag") == ctag and folder.get("eTag") == etag
+
+
 def get_type_letter(site_name: str) -> str:
     return "П" if "перероб" in (site_name or "").lower() else "О"
 
@@ -99,94 +138,199 @@ def make_unique_order_number(folder: dict, site_name: str) -> str:
     return f"{base}{index}"
 
 
-def _safe_search_in_folder(drive_id: str, parent_id: str, needle: str) -> List[dict]:
-    try:
-        return search_in_folder(drive_id, parent_id, needle) or []
-    except Exception:
-        try:
-            return list_children(drive_id, parent_id) or []
-        except Exception:
-            return []
-
-
-def pick_child_folder_contains(drive_id: str, parent_id: str, needle: str):
-    needle_n = _norm(needle)
-    for it in list_children(drive_id, parent_id) or []:
-        if _is_folder(it) and needle_n in _norm(it.get("name", "")):
-            return it
-    return None
+# кроки ланцюгів M365_SYNC_CHAINS: які читають дітей папки, а які — пошук у ній
+CHILD_STEPS = {"child_contains", "child_all_contains", "child_all"}
+SEARCH_STEPS = {"search_contains", "search_all_contains"}
 
 
-def pick_child_folders_contains(drive_id: str, parent_id: str, needle: str) -> List[dict]:
-    needle_n = _norm(needle)
-    out = []
-    for it in list_children(drive_id, parent_id) or []:
-        if _is_folder(it) and needle_n in _norm(it.get("name", "")):
-            out.append(it)
-    return out
+def _step_matches(step_type: str, value: str, items: List[dict]) -> List[dict]:
+    if step_type == "child_all":
+        # всі дочірні папки без фільтру
+        return [it for it in items if "folder" in it]
 
+    needle_n = _norm(value)
+    matches = [it for it in items if _is_folder(it) and needle_n in _norm(it.get("name", ""))]
+    if step_type in ("child_contains", "search_contains"):
+        return matches[:1]
+    if step_type in ("child_all_contains", "search_all_contains"):
+        return matches
+    return []
 
-def pick_search_folder_contains(drive_id: str, parent_id: str, needle: str):
-    needle_n = _norm(needle)
-    for it in _safe_search_in_folder(drive_id, parent_id, needle):
-        if _is_folder(it) and needle_n in _norm(it.get("name", "")):
-            return it
-    return None
 
-
-def pick_search_folders_contains(drive_id: str, parent_id: str, needle: str) -> List[dict]:
-    needle_n = _norm(needle)
-    out = []
-    for it in _safe_search_in_folder(drive_id, parent_id, needle):
-        if _is_folder(it) and needle_n in _norm(it.get("name", "")):
-            out.append(it)
-    return out
+async def _step_items(client: AsyncGraphClient, drive_id: str, cid: str, step_type: str, value: str) -> List[dict]:
+    if step_type in SEARCH_STEPS:
+        # пошук не вдався — беремо дітей папки; якщо й вони ні — порожньо
+        try:
+            return await client.search_in_folder(drive_id, cid, value)
+        except Exception:
+            try:
+                return await client.list_children(drive_id, cid)
+            except Exception:
+                return []
+    if step_type in CHILD_STEPS:
+        return await client.list_children(drive_id, cid)
+    return []
 
 
-def resolve_leaf_folders_by_chain(drive_id: str, start_folder_id: str, chain: List[Dict]) -> List[dict]:
-    current_ids = [start_folder_id]
+async def resolve_chain(client: AsyncGraphClient, drive_id: str, folder_id: str, chain: List[Dict]) -> List[dict]:
+    """Leaf-папки одного ланцюга; усі папки одного рівня читаються одночасно."""
+    current_ids = [folder_id]
+    next_items: List[dict] = []
 
     for step in chain:
-        step_type = step["type"]
-        value = step.get("value", "")
+        step_type, value = step["type"], step.get("value", "")
+        listings = await asyncio.gather(
+            *(_step_items(client, drive_id, cid, step_type, value) for cid in current_ids)
+        )
+        next_items = [it for items in listings for it in _step_matches(step_type, value, items or [])]
+        if not next_items:
+            return []
+        current_ids = [it["id"] for it in next_items]
 
-        next_items: List[dict] = []
+    return next_items
 
-        for cid in current_ids:
 
-            if step_type == "child_contains":
-                found = pick_child_folder_contains(drive_id, cid, value)
-                if found:
-                    next_items.append(found)
+async def fetch_folder_data(client: AsyncGraphClient, drive_id: str, folder: dict,
+                            chains: Dict[str, List[Dict]]) -> dict:
+    """Усі ланцюги папки проекту паралельно, потім файли всіх її leaf-папок."""
+    names = [name for name, chain in chains.items() if chain]
+    resolved = await asyncio.gather(
+        *(resolve_chain(client, drive_id, folder["id"], chains[name]) for name in names),
+        return_exceptions=True,
+    )
 
-            elif step_type == "child_all_contains":
-                next_items.extend(pick_child_folders_contains(drive_id, cid, value))
+    chain_leafs: Dict[str, List[dict]] = {}
+    chain_errors: List[str] = []
+    for name, result in zip(names, resolved):
+        if isinstance(result, BaseException):
+            if not isinstance(result, Exception):
+                raise result
+            chain_errors.append(f"{name}: {result}")
+        elif result:
+            chain_leafs[name] = result
+
+    leaf_ids = list(dict.fromkeys(leaf["id"] for leafs in chain_leafs.values() for leaf in leafs))
+    listings = await asyncio.gather(
+        *(client.list_children(drive_id, leaf_id) for leaf_id in leaf_ids),
+        return_exceptions=True,
+    )
 
-            elif step_type == "child_all":
-                # всі дочірні папки без фільтру
-                children = list_children(drive_id, cid) or []
-                next_items.extend([it for it in children if "folder" in it])
+    data = collect_folder_files(folder, chain_leafs, dict(zip(leaf_ids, listings)))
+    data["chain_errors"] = chain_errors
+    return data
 
-            elif step_type == "search_contains":
-                found = pick_search_folder_contains(drive_id, cid, value)
-                if found:
-                    next_items.append(found)
 
-            elif step_type == "search_all_contains":
-                next_items.extend(pick_search_folders_contains(drive_id, cid, value))
+async def fetch_folders(drive_id: str, folders: List[dict], chains: Dict[str, List[Dict]],
+                        folder_timeout: float = None) -> List[tuple]:
+    """
+    [(folder, дані | Exception)] у порядку folders — жодна папка не пропадає мовчки:
+    або дані, або помилка / TimeoutError, про які команда звітує.
+    Дедлайн рахується від старту папки, а не від старту всього обходу; одночасно в роботі
+    стільки папок, щоб заповнити батчами всю стелю вікна обмежувача.
+    """
+    async with AsyncGraphClient() as client:
+        slots = asyncio.Semaphore(client.max_in_flight * BATCH_LIMIT)
 
-        if not next_items:
-            return []
+        async def one(folder):
+            async with slots:
+                try:
+                    data = await asyncio.wait_for(
+                        fetch_folder_data(client, drive_id, folder, chains), timeout=folder_timeout or None,
+                    )
+                    return folder, data
+                except asyncio.TimeoutError:
+                    return folder, TimeoutError(f"no result in {folder_timeout}s")
+                except Exception as e:
+                    return folder, e
+
+        return await asyncio.gather(*(one(folder) for folder in folders))
+
+
+def projects_for_changes(drive_id: str, changes: List[dict], project_ids: Set[str], root_id: str = None,
+                         max_workers: int = None) -> Set[str]:
+    """
+    Папки проектів (діти кореня диска), яких стосуються змінені driveItem-и з delta.
+    delta не віддає parentReference.path, тож піднімаємось по parentReference.id;
+    предків, яких немає серед змін, дочитуємо через $batch (рівень за рівнем).
+    """
+    parent_of: Dict[str, str] = {}
+    root_ids: Set[str] = {root_id} if root_id else set()
+    for it in changes:
+        if "root" in it:
+            root_ids.add(it["id"])
+        else:
+            parent_of[it["id"]] = (it.get("parentReference") or {}).get("id")
+
+    affected: Set[str] = set()
+    unresolved = set(parent_of)
+    while unresolved:
+        missing, waiting = set(), set()
+        for item_id in unresolved:
+            cur, seen = item_id, set()
+            while cur in parent_of and cur not in project_ids and cur not in root_ids and cur not in seen:
+                seen.add(cur)
+                cur = parent_of[cur]
+            if cur in project_ids:
+                affected.add(cur)
+            elif cur is not None and cur not in root_ids and cur not in seen:
+                missing.add(cur)
+                waiting.add(item_id)
+
+        if not missing:
+            break
+        fetched = batch_get_items(drive_id, list(missing), select="id,root,parentReference", max_workers=max_workers)
+        for item_id, item in fetched.items():
+            if isinstance(item, GraphError):
+                parent_of[item_id] = None  # видалений предок — вже не в жодному проекті
+            elif "root" in item:
+                root_ids.add(item_id)
+            else:
+                parent_of[item_id] = (item.get("parentReference") or {}).get("id")
+        unresolved = waiting
 
-        current_ids = [it["id"] for it in next_items]
+    return affected
 
-    return next_items
 
+def collect_folder_files(folder: dict, chain_leafs: Dict[str, List[dict]], leaf_children: Dict[str, list]) -> dict:
+    """Файли й зображення з leaf-папок проекту; leaf_children — уже прочитані діти leaf-ів (або помилка)."""
+    seen_file_ids: Set[str] = set()
+    seen_image_ids: Set[str] = set()
+    new_files = []
+    new_images = []
 
-def iter_files_direct(drive_id: str, folder_id: str) -> Iterable[dict]:
-    for it in list_children(drive_id, folder_id) or []:
-        if "file" in it:
-            yield it
+    for leafs in chain_leafs.values():
+        for leaf in leafs:
+            children = leaf_children.get(leaf["id"]) or []
+            if isinstance(children, Exception):
+                raise children
+
+            for it in children:
+                if "file" not in it:
+                    continue
+                file_id = it["id"]
+                name = it.get("name", "")
+                entry = {"id": file_id, "name": name, "web": it.get("webUrl", ""), "size": it.get("size"),
+                         "version": _remote_version(it)}
+
+                if _is_image(name):
+                    seen_image_ids.add(file_id)
+                    new_images.append(entry)
+                else:
+                    if _is_our_pdf(name):
+                        continue
+                    seen_file_ids.add(file_id)
+                    new_files.append(entry)
+
+    return {
+        "folder": folder,
+        "folder_name": folder.get("name", ""),
+        "folder_url": folder.get("webUrl", ""),
+        "has_data": bool(chain_leafs),
+        "seen_file_ids": seen_file_ids,
+        "seen_image_ids": seen_image_ids,
+        "new_files": new_files,
+        "new_images": new_images,
+    }
 
 
 class Command(BaseCommand):
@@ -198,17 +342,67 @@ class Command(BaseCommand):
             action="store_true",
             help="Run sync in a loop",
         )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="Seconds between sync cycles of a site in --watch mode (default: M365_SYNC_INTERVAL; "
+                 "per-site overrides in M365_SYNC_SITE_INTERVALS)",
+        )
+        parser.add_argument(
+            "--jitter",
+            type=float,
+            default=None,
+            help="Random spread of the interval as a fraction, e.g. 0.1 = ±10%% (default: M365_SYNC_JITTER)",
+        )
         parser.add_argument(
             "--limit",
             type=int,
             default=0,
             help="Limit number of folders to process (for testing, 0 = no limit)",
         )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Re-sync only projects changed since the previous run (drive delta); "
+                 "falls back to a full sync when there is no or an expired delta token",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Walk every project folder, even those whose cTag has not changed since the last sync",
+        )
+        parser.add_argument(
+            "--max-folders",
+            type=int,
+            default=None,
+            help="Walk at most N project folders per run; the next run resumes the full sync from the "
+                 "checkpoints (default: M365_SYNC_MAX_FOLDERS, 0 = no limit)",
+        )
+        parser.add_argument(
+            "--time-budget",
+            type=float,
+            default=None,
+            help="Stop starting new folders after this many seconds; the next run resumes "
+                 "(default: M365_SYNC_TIME_BUDGET, 0 = no limit)",
+        )
+        parser.add_argument(
+            "--folder-timeout",
+            type=float,
+            default=None,
+            help="Seconds allowed per project folder (default: M365_FOLDER_TIMEOUT, 0 = no limit)",
+        )
 
-    def _sync_once(self, limit=0):
-        site_names = getattr(settings, "M365_SITE_DISPLAY_NAMES", None)
-        if not site_names:
-            site_names = [getattr(settings, "M365_SITE_DISPLAY_NAME", None)]
+    def _sync_once(self, limit=0, incremental=False, folder_timeout=None, full=False, site_names=None,
+                   max_folders=None, time_budget=None):
+        """{сайт: True — цикл вдалий (помилки не більше ніж у M365_SYNC_MAX_ERROR_RATIO папок)}."""
+        if max_folders is None:
+            max_folders = getattr(settings, "M365_SYNC_MAX_FOLDERS", 0)
+        if time_budget is None:
+            time_budget = getattr(settings, "M365_SYNC_TIME_BUDGET", 0)
+        # після дедлайну нові порції папок не починаються (поточна дописується)
+        deadline = time.monotonic() + time_budget if time_budget else None
+        site_names = site_names or self._site_names()
 
         drive_name = getattr(settings, "M365_DRIVE_NAME", None)
         chains = getattr(settings, "M365_SYNC_CHAINS", None)
@@ -222,250 +416,523 @@ class Command(BaseCommand):
         if not chains:
             raise CommandError("M365_SYNC_CHAINS missing")
 
-        created_orders = 0
-        deleted_orders = 0
-        deleted_files = 0
-        deleted_images = 0
-        created_files = 0
-        created_images = 0
-
-        # Паралельна обробка папок (обмежуємо пул, щоб не перевантажити Graph API)
-        max_workers = getattr(settings, "M365_SYNC_WORKERS", 4)
-
+        stats = Counter()
+        results = {}
+        limiter = get_limiter()
+        before = limiter.snapshot()
         for site_name in site_names:
+            results[site_name] = self._sync_site(
+                site_name, drive_name, chains, stats,
+                limit=limit, incremental=incremental, folder_timeout=folder_timeout, full=full,
+                max_folders=max_folders, deadline=deadline,
+            )
 
-            site = find_site_by_display_name(site_name)
-            if not site:
-                continue
+        self.stdout.write(self.style.SUCCESS(
+            f"Sync finished. "
+            f"created_orders={stats['created_orders']}, "
+            f"created_files={stats['created_files']}, "
+            f"created_images={stats['created_images']}, "
+            f"deleted_orders={stats['deleted_orders']}, "
+            f"deleted_files={stats['deleted_files']}, "
+            f"deleted_images={stats['deleted_images']}, "
+            f"updated_files={stats['updated_files']}, "
+            f"updated_images={stats['updated_images']}, "
+            f"moved_files={stats['moved_files']}, "
+            f"moved_images={stats['moved_images']}, "
+            f"unchanged_folders={stats['unchanged_folders']}, "
+            f"remaining_folders={stats['remaining_folders']}"
+        ))
 
-            drive = pick_drive(site["id"], drive_name)
-            if not drive:
-                continue
+        after = limiter.snapshot()
+        self.stdout.write(
+            f"Graph limiter: requests={after['requests'] - before['requests']}, "
+            f"throttled={after['throttled'] - before['throttled']}, "
+            f"waited={after['waited_s'] - before['waited_s']:.1f}s, "
+            f"rate={after['rate']}/{after['max_rate']} req/s, "
+            f"window={after['window']}/{after['max_concurrency']}, "
+            f"breaker={get_breaker().state}"
+        )
+        # метрики викликів Graph цього запуску — у M365GraphMetric (m365_stats, адмінка)
+        flush_metrics()
+        return results
 
-            drive_id = drive["id"]
+    @staticmethod
+    def _site_names():
+        site_names = getattr(settings, "M365_SITE_DISPLAY_NAMES", None)
+        if not site_names:
+            site_names = [getattr(settings, "M365_SITE_DISPLAY_NAME", None)]
+        return [name for name in site_names if name]
 
-            root_items = list_root_children(drive_id) or []
-            all_folders = [it for it in root_items if _is_folder(it)]
+    def _changed_projects(self, state, drive_id, root_items, project_ids, max_workers):
+        """
+        Папки проектів, змінені з моменту state.delta_link, і новий deltaLink.
+        None замість списку — токен протермінований (410), потрібна повна синхронізація.
+        """
+        try:
+            changes, delta_link = drive_delta(drive_id, state.delta_link)
+        except GraphError as e:
+            if e.status_code not in (404, 410):
+                raise
+            self.stderr.write(self.style.WARNING(
+                f"Delta token for '{state.site_name}' expired (HTTP {e.status_code}), running full sync"
+            ))
+            return None, None
+
+        root_id = next(
+            ((it.get("parentReference") or {}).get("id") for it in root_items if it.get("parentReference")),
+            None,
+        )
+        affected = projects_for_changes(drive_id, changes, project_ids, root_id=root_id, max_workers=max_workers)
+        self.stdout.write(f"Delta: {len(changes)} changed items in {len(affected)} project folders")
+        return affected, delta_link
 
-            # current_root_ids завжди з УСІХ папок — щоб не видалити зайвого
-            current_root_ids: Set[str] = {it["id"] for it in all_folders}
+    def _sync_site(self, site_name, drive_name, chains, stats, limit=0, incremental=False, folder_timeout=None,
+                   full=False, max_folders=0, deadline=None):
+        # Скільки $batch-запитів іде паралельно (обмежуємо, щоб не перевантажити Graph API)
+        max_workers = getattr(settings, "M365_SYNC_WORKERS", 4)
+        if folder_timeout is None:
+            folder_timeout = getattr(settings, "M365_FOLDER_TIMEOUT", 120)
+
+        site = find_site_by_display_name(site_name)
+        if not site:
+            self.stderr.write(self.style.ERROR(f"Site '{site_name}' not found"))
+            return False
+
+        drive = pick_drive(site["id"], drive_name)
+        if not drive:
+            self.stderr.write(self.style.ERROR(f"Drive '{drive_name}' not found on site '{site_name}'"))
+            return False
+
+        site_id = site["id"]
+        drive_id = drive["id"]
+        state, _ = M365DriveState.objects.get_or_create(
+            drive_id=drive_id,
+            defaults={"site_id": site_id, "site_name": site_name},
+        )
 
-            # limit тільки для тестування — обмежує кількість папок для обробки
-            if limit > 0:
-                project_folders = all_folders[:limit]
-                self.stdout.write(f"[DEBUG] Limiting to {limit} folders")
+        root_items = list_root_children(drive_id) or []
+        all_folders = [it for it in root_items if _is_folder(it)]
+
+        # current_root_ids завжди з УСІХ папок — щоб не видалити зайвого
+        current_root_ids: Set[str] = {it["id"] for it in all_folders}
+
+        # незавершений повний обхід продовжуємо з чекпойнтів (--full починає новий)
+        resuming = state.pass_started_at is not None and not full
+
+        affected = delta_link = None
+        if incremental and state.delta_link and not resuming:
+            affected, delta_link = self._changed_projects(state, drive_id, root_items, current_root_ids, max_workers)
+            if affected is not None and max_folders and len(affected) > max_folders:
+                self.stdout.write(
+                    f"Delta touches {len(affected)} project folders (> --max-folders), "
+                    f"switching to a resumable full sync"
+                )
+                affected = delta_link = None
+
+        if affected is not None:
+            # разом зі зміненими — папки, на яких попередні запуски впали
+            retry = set(state.folders.exclude(status="ok").values_list("folder_id", flat=True))
+            project_folders = [f for f in all_folders if f["id"] in affected or f["id"] in retry]
+        else:
+            if resuming:
+                self.stdout.write(
+                    f"Resuming full sync of '{site_name}' started at "
+                    f"{timezone.localtime(state.pass_started_at):%Y-%m-%d %H:%M}"
+                )
             else:
-                project_folders = all_folders
-
-            def fetch_folder_data(folder):
-                """Тільки запити до Graph API — без запису в БД."""
-                folder_id = folder["id"]
-                folder_name = folder.get("name", "")
-                folder_url = folder.get("webUrl", "")
-
-                chain_leafs = {}
-                # Резолвимо ланцюги послідовно — без вкладеного пулу
-                # (вкладений ThreadPoolExecutor блокує shutdown і висить)
-                for chain_name, chain in chains.items():
-                    try:
-                        leafs = resolve_leaf_folders_by_chain(drive_id, folder_id, chain)
-                        if leafs:
-                            chain_leafs[chain_name] = leafs
-                    except Exception as e:
-                        self.stderr.write(f"Chain resolve error for '{folder_name}': {e}")
-
-                # Збираємо всі файли з Teams
-                seen_file_ids: Set[str] = set()
-                seen_image_ids: Set[str] = set()
-                new_files = []
-                new_images = []
-
-                for leafs in chain_leafs.values():
-                    for leaf in leafs:
-                        for it in iter_files_direct(drive_id, leaf["id"]):
-                            file_id = it["id"]
-                            name = it.get("name", "")
-                            web = it.get("webUrl", "")
-
-                            if _is_image(name):
-                                seen_image_ids.add(file_id)
-                                new_images.append({"id": file_id, "name": name, "web": web})
-                            else:
-                                if _is_our_pdf(name):
-                                    continue
-                                seen_file_ids.add(file_id)
-                                new_files.append({"id": file_id, "name": name, "web": web})
-
-                return {
-                    "folder": folder,
-                    "folder_name": folder_name,
-                    "folder_url": folder_url,
-                    "has_data": bool(chain_leafs),
-                    "seen_file_ids": seen_file_ids,
-                    "seen_image_ids": seen_image_ids,
-                    "new_files": new_files,
-                    "new_images": new_images,
-                }
-
-            self.stdout.write(f"Found {len(project_folders)} folders to process")
-
-            # КРОК 1: паралельно збираємо дані з Graph API (без запису в БД)
-            folder_data_list = []
-            pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
-            futures = {pool.submit(fetch_folder_data, folder): folder for folder in project_folders}
-            try:
-                for future in concurrent.futures.as_completed(futures, timeout=90):
-                    try:
-                        folder_data_list.append(future.result(timeout=25))
-                    except concurrent.futures.TimeoutError:
-                        folder = futures[future]
-                        self.stderr.write(
-                            self.style.WARNING(f"Timeout fetching folder '{folder.get('name')}', skipping")
-                        )
-                    except Exception as e:
-                        folder = futures[future]
-                        self.stderr.write(
-                            self.style.ERROR(f"Error fetching folder '{folder.get('name')}': {e}")
-                        )
-            except concurrent.futures.TimeoutError:
-                self.stderr.write(self.style.WARNING("Global pool timeout (90s), proceeding with collected data"))
-            finally:
-                pool.shutdown(wait=False, cancel_futures=True)
-
-            self.stdout.write(f"Collected data for {len(folder_data_list)} folders, writing to DB...")
-
-            # КРОК 2: послідовно пишемо в БД (уникаємо database is locked)
-            for data in folder_data_list:
-                if not data["has_data"]:
+                # новий повний обхід; deltaLink беремо ДО обходу, щоб зміни під час обходу
+                # підхопив наступний --incremental
+                try:
+                    state.pass_delta_link = drive_delta_latest(drive_id)
+                except GraphError as e:
+                    self.stderr.write(self.style.WARNING(f"Cannot get delta token for '{site_name}': {e}"))
+                    state.pass_delta_link = ""
+                state.pass_started_at = timezone.now()
+                # --full і відкат з --incremental (немає/протух deltaLink, змін більше за
+                # --max-folders) обходять усе; продовження обходу успадковує його вид
+                state.pass_full = full or incremental
+                state.save(update_fields=["pass_started_at", "pass_delta_link", "pass_full", "updated_at"])
+            delta_link = state.pass_delta_link
+            project_folders = self._pending_folders(state, all_folders, state.pass_full, stats)
+
+        total = len(project_folders)
+        # limit тільки для тестування — обмежує кількість папок для обробки
+        if limit > 0:
+            project_folders = project_folders[:limit]
+            self.stdout.write(f"[DEBUG] Limiting to {limit} folders")
+        if affected is None and max_folders:
+            project_folders = project_folders[:max_folders]
+
+        self.stdout.write(f"Found {total} folders to process")
+
+        # папки йдуть порціями; після кожної — запис у БД і чекпойнти, тож обрив
+        # або вичерпаний --time-budget не губить уже зробленого.
+        # Невдалі папки стають у кінець черги, поки не вичерпають FOLDER_ATTEMPTS спроб
+        max_attempts = max(1, getattr(settings, "M365_SYNC_FOLDER_ATTEMPTS", 3))
+        chunk_size = max(1, get_limiter().max_concurrency * BATCH_LIMIT)
+        queue = list(project_folders)
+        tries: Counter = Counter()
+        failed: Dict[str, str] = {}
+        while queue:
+            if tries and affected is None and deadline and time.monotonic() >= deadline:
+                break
+            chunk, queue = queue[:chunk_size], queue[chunk_size:]
+            outcomes = self._sync_folders(
+                state, chunk, chains, site_id, drive_id, site_name, stats,
+                folder_timeout=folder_timeout,
+            )
+            for folder in chunk:
+                tries[folder["id"]] += 1
+                name, status, error = outcomes[folder["id"]]
+                if status == "ok":
+                    failed.pop(folder["id"], None)
                     continue
+                failed[folder["id"]] = f"{name}: {error}"
+                if tries[folder["id"]] < max_attempts:
+                    queue.append(folder)
+        errors = list(failed.values())
+
+        # не взяті в цей запуск (--max-folders / --limit) і ті, до яких не дійшла черга
+        remaining = total - len(project_folders) + len({f["id"] for f in queue})
+        if remaining:
+            stats["remaining_folders"] += remaining
+            self.stdout.write(self.style.WARNING(
+                f"Stopped with {remaining} of {total} folders left, the next run resumes from here"
+            ))
+
+        # ВИПРАВЛЕННЯ БАГ #2: видалення прив'язане до конкретного сайту + диску
+        stale_orders = Order.objects.filter(
+            source="m365",
+            remote_site_id=site_id,
+            remote_drive_id=drive_id,
+        ).exclude(
+            remote_folder_id__in=current_root_ids
+        )
 
-                folder = data["folder"]
-                folder_id = folder["id"]
-                folder_name = data["folder_name"]
-                folder_url = data["folder_url"]
+        _, deleted = stale_orders.delete()
+        stats["deleted_orders"] += deleted.get(Order._meta.label, 0)
+        state.folders.exclude(folder_id__in=current_root_ids).delete()
+
+        # невдалі папки лишаються в чекпойнтах (status != ok) і повторюються наступними запусками,
+        # тож deltaLink зсуваємо, щойно всі папки цього обходу/змін хоч раз спробували
+        now = timezone.now()
+        state.site_id, state.site_name = site_id, site_name
+        state.status = "error" if errors else "partial" if remaining else "ok"
+        state.last_error = errors[0] if errors else ""
+        if not remaining:
+            if affected is None:
+                state.last_full_sync_at = now
+                state.pass_started_at, state.pass_delta_link, state.pass_full = None, "", False
+            if delta_link:
+                state.delta_link = delta_link
+                state.last_delta_sync_at = now
+        state.save()
+
+        # окрема зламана папка не робить сайт невдалим (інакше розклад --watch відкладе весь сайт),
+        # а помилки більш як у MAX_ERROR_RATIO папок — робить
+        max_ratio = getattr(settings, "M365_SYNC_MAX_ERROR_RATIO", 0.1)
+        return len(errors) <= max_ratio * len(tries)
+
+    def _pending_folders(self, state, folders, full, stats):
+        """
+        Папки незавершеного повного обходу: ще не спробувані в ньому і ті, що в ньому впали
+        менше FOLDER_ATTEMPTS разів; спершу ті, яких ще не синхронізували, далі — найдавніше
+        синхронізовані. Без full незмінені за cTag/eTag пропускаються (див. folder_unchanged).
+        """
+        max_attempts = max(1, getattr(settings, "M365_SYNC_FOLDER_ATTEMPTS", 3))
+        checkpoints = {
+            folder_id: (synced_at, attempt_at, status, attempts)
+            for folder_id, synced_at, attempt_at, status, attempts in state.folders.filter(
+                folder_id__in=[f["id"] for f in folders],
+            ).values_list("folder_id", "last_synced_at", "last_attempt_at", "status", "attempts")
+        }
+
+        def pending_in_pass(folder):
+            if folder["id"] not in checkpoints:
+                return True
+            _, attempt_at, status, attempts = checkpoints[folder["id"]]
+            return attempt_at < state.pass_started_at or (status != "ok" and attempts < max_attempts)
+
+        pending = [f for f in folders if pending_in_pass(f)]
+        if len(pending) < len(folders):
+            self.stdout.write(f"{len(folders) - len(pending)} folders already synced in this pass")
+
+        # звичайний обхід не заходить у папки з тим самим cTag/eTag; full — обходимо всі
+        if not full:
+            versions = {
+                folder_id: (etag, ctag)
+                for folder_id, etag, ctag in Order.objects.filter(
+                    source="m365", remote_drive_id=state.drive_id,
+                    remote_folder_id__in=[f["id"] for f in pending],
+                ).values_list("remote_folder_id", "remote_etag", "remote_ctag")
+            }
+            changed = [f for f in pending if not folder_unchanged(f, versions.get(f["id"]))]
+            stats["unchanged_folders"] += len(pending) - len(changed)
+            pending = changed
+
+        def stale_first(folder):
+            synced_at = checkpoints.get(folder["id"], (None,))[0]
+            return synced_at is not None, synced_at.timestamp() if synced_at else 0.0
+
+        return sorted(pending, key=stale_first)
+
+    def _sync_folders(self, state, folders, chains, site_id, drive_id, site_name, stats, folder_timeout):
+        """Одна порція папок: дані з Graph, запис у БД, чекпойнти. {folder_id: (назва, статус, помилка)}."""
+        # КРОК 1: збираємо дані з Graph API — усі папки й рівні ланцюгів конкурентно,
+        # під вікном обмежувача на кількість одночасних запитів (без запису в БД)
+        fetched = asyncio.run(fetch_folders(drive_id, folders, chains, folder_timeout=folder_timeout))
+
+        outcomes = {}
+        folder_data_list = []
+        for folder, data in fetched:
+            name = folder.get("name", "")
+            if isinstance(data, TimeoutError):
+                self.stderr.write(self.style.WARNING(
+                    f"Timeout fetching folder '{name}' ({data}), will retry next run"
+                ))
+                outcomes[folder["id"]] = (name, "timeout", str(data))
+                continue
+            if isinstance(data, Exception):
+                self.stderr.write(
+                    self.style.ERROR(f"Error fetching folder '{name}': {data}")
+                )
+                outcomes[folder["id"]] = (name, "error", str(data) or type(data).__name__)
+                continue
+            for err in data["chain_errors"]:
+                self.stderr.write(f"Chain resolve error for '{data['folder_name']}': {err}")
+            outcomes[folder["id"]] = (name, "error", "; ".join(data["chain_errors"])) if data["chain_errors"] \
+                else (name, "ok", "")
+            folder_data_list.append(data)
 
-                try:
-                    with transaction.atomic():
-                        order = Order.objects.filter(
-                            source="m365",
-                            remote_folder_id=folder_id,
-                        ).first()
-
-                        expected_work_type = get_work_type(site_name)
-
-                        if order:
-                            changed = False
-                            if order.work_type != expected_work_type:
-                                order.work_type = expected_work_type
-                                changed = True
-                            if order.order_name != folder_name:
-                                order.order_name = folder_name
-                                changed = True
-                            if order.remote_web_url != folder_url:
-                                order.remote_web_url = folder_url
-                                changed = True
-                            if changed:
-                                order.save(update_fields=["work_type", "order_name", "remote_web_url"])
-                        else:
-                            order = Order.objects.create(
-                                order_name=folder_name,
-                                order_number=make_unique_order_number(folder, site_name),
-                                work_type=expected_work_type,
-                                source="m365",
-                                remote_site_id=site["id"],
-                                remote_drive_id=drive_id,
-                                remote_folder_id=folder_id,
-                                remote_web_url=folder_url,
-                            )
-                            created_orders += 1
-
-                        # Додаємо нові зображення
-                        for img in data["new_images"]:
-                            if not OrderImage.objects.filter(remote_item_id=img["id"]).exists():
-                                OrderImage.objects.create(
-                                    order=order,
-                                    remote_site_id=site["id"],
-                                    remote_drive_id=drive_id,
-                                    remote_item_id=img["id"],
-                                    remote_web_url=img["web"],
-                                    remote_name=img["name"],
-                                )
-                                created_images += 1
-
-                        # Додаємо нові файли
-                        for f in data["new_files"]:
-                            if not OrderFile.objects.filter(remote_item_id=f["id"]).exists():
-                                OrderFile.objects.create(
-                                    order=order,
-                                    source="m365",
-                                    remote_site_id=site["id"],
-                                    remote_drive_id=drive_id,
-                                    remote_item_id=f["id"],
-                                    remote_web_url=f["web"],
-                                    remote_name=f["name"],
-                                )
-                                created_files += 1
-
-                        # Видаляємо файли/зображення яких більше немає в Teams
-                        stale_files = OrderFile.objects.filter(
-                            order=order, source="m365"
-                        ).exclude(remote_item_id__in=data["seen_file_ids"])
-                        deleted_files += stale_files.count()
-                        stale_files.delete()
-
-                        stale_images = OrderImage.objects.filter(
-                            order=order
-                        ).exclude(remote_item_id__in=data["seen_image_ids"])
-                        deleted_images += stale_images.count()
-                        stale_images.delete()
+        self.stdout.write(f"Collected data for {len(folder_data_list)} folders, writing to DB...")
 
-                except Exception as e:
-                    self.stderr.write(
-                        self.style.ERROR(f"Error saving folder '{folder_name}': {e}")
-                    )
+        # КРОК 2: послідовно пишемо в БД (уникаємо database is locked)
+        for data in folder_data_list:
+            if not data["has_data"]:
+                continue
+            try:
+                self._write_folder(data, site_id, drive_id, site_name, stats)
+            except Exception as e:
+                self.stderr.write(
+                    self.style.ERROR(f"Error saving folder '{data['folder_name']}': {e}")
+                )
+                outcomes[data["folder"]["id"]] = (data["folder_name"], "error", str(e))
+
+        self._checkpoint(state, outcomes)
+        return outcomes
+
+    @staticmethod
+    def _checkpoint(state, outcomes):
+        """{folder_id: (назва, статус, помилка)} → M365FolderSyncState (одним INSERT і одним UPDATE)."""
+        if not outcomes:
+            return
+        now = timezone.now()
+        existing = {fs.folder_id: fs for fs in state.folders.filter(folder_id__in=list(outcomes))}
+
+        new_rows, changed_rows = [], []
+        for folder_id, (name, status, error) in outcomes.items():
+            fs = existing.get(folder_id)
+            if fs is None:
+                fs = M365FolderSyncState(drive=state, folder_id=folder_id)
+                new_rows.append(fs)
+            else:
+                changed_rows.append(fs)
+            fs.folder_name, fs.status, fs.error, fs.last_attempt_at = (name or "")[:255], status, error, now
+            if status == "ok":
+                fs.attempts, fs.last_synced_at = 0, now
+            else:
+                fs.attempts += 1
 
-            # ВИПРАВЛЕННЯ БАГ #2: видалення прив'язане до конкретного сайту + диску
-            stale_orders = Order.objects.filter(
+        M365FolderSyncState.objects.bulk_create(new_rows, ignore_conflicts=True)
+        M365FolderSyncState.objects.bulk_update(
+            changed_rows, ["folder_name", "status", "error", "attempts", "last_synced_at", "last_attempt_at"],
+        )
+
+    def _write_folder(self, data, site_id, drive_id, site_name, stats):
+        folder = data["folder"]
+        folder_id = folder["id"]
+        folder_name = data["folder_name"]
+        folder_url = data["folder_url"]
+        # з помилками ланцюгів версію папки не запамʼятовуємо — наступний запуск обійде її знову
+        version = _remote_version(folder) if not data.get("chain_errors") else {
+            "remote_etag": None, "remote_ctag": None, "remote_modified_at": None,
+        }
+
+        with transaction.atomic():
+            order = Order.objects.filter(
                 source="m365",
-                remote_site_id=site["id"],
-                remote_drive_id=drive_id,
-            ).exclude(
-                remote_folder_id__in=current_root_ids
-            )
+                remote_folder_id=folder_id,
+            ).first()
 
-            for order in stale_orders:
-                order.delete()
-                deleted_orders += 1
+            expected_work_type = get_work_type(site_name)
 
-        self.stdout.write(self.style.SUCCESS(
-            f"Sync finished. "
-            f"created_orders={created_orders}, "
-            f"created_files={created_files}, "
-            f"created_images={created_images}, "
-            f"deleted_orders={deleted_orders}, "
-            f"deleted_files={deleted_files}, "
-            f"deleted_images={deleted_images}"
-        ))
+            if order:
+                expected = {
+                    "work_type": expected_work_type,
+                    "order_name": folder_name,
+                    "remote_web_url": folder_url,
+                    **version,
+                }
+                changed = [f for f, v in expected.items() if getattr(order, f) != v]
+                for f in changed:
+                    setattr(order, f, expected[f])
+                if changed:
+                    order.save(update_fields=changed)
+            else:
+                order = Order.objects.create(
+                    order_name=folder_name,
+                    order_number=make_unique_order_number(folder, site_name),
+                    work_type=expected_work_type,
+                    source="m365",
+                    remote_site_id=site_id,
+                    remote_drive_id=drive_id,
+                    remote_folder_id=folder_id,
+                    remote_web_url=folder_url,
+                    **version,
+                )
+                stats["created_orders"] += 1
+
+            # одним запитом — які з побачених елементів уже є в БД; нові — одним INSERT
+            # (ignore_conflicts: унікальні обмеження страхують від паралельного запуску),
+            # наявні — одним UPDATE і лише ті, чий eTag змінився; перенесені з папки
+            # іншого замовлення — окремим UPDATE разом з order
+            created, updated, moved = self._upsert_items(OrderImage, data["new_images"], order, {
+                "remote_site_id": site_id, "remote_drive_id": drive_id,
+            })
+            stats["created_images"] += created
+            stats["updated_images"] += updated
+            stats["moved_images"] += moved
+
+            created, updated, moved = self._upsert_items(OrderFile, data["new_files"], order, {
+                "source": "m365", "remote_site_id": site_id, "remote_drive_id": drive_id,
+            })
+            stats["created_files"] += created
+            stats["updated_files"] += updated
+            stats["moved_files"] += moved
+
+            # Видаляємо файли/зображення яких більше немає в Teams — одним DELETE на модель
+            _, deleted = OrderFile.objects.filter(
+                order=order, source="m365"
+            ).exclude(remote_item_id__in=data["seen_file_ids"]).delete()
+            stats["deleted_files"] += deleted.get(OrderFile._meta.label, 0)
+
+            _, deleted = OrderImage.objects.filter(
+                order=order
+            ).exclude(remote_item_id__in=data["seen_image_ids"]).delete()
+            stats["deleted_images"] += deleted.get(OrderImage._meta.label, 0)
+
+    @staticmethod
+    def _upsert_items(model, items, order, defaults):
+        """
+        (створено, оновлено, перенесено) рядків model для файлів папки items.
+
+        Наявні рядки шукаються за ключем унікального обмеження (диск [+ source] + id
+        елемента), а не лише в order: елемент, який перенесли в папку іншого
+        замовлення, явно переноситься в order (рахується в "перенесено"), а не
+        оновлюється мовчки під старим замовленням.
+        """
+        items = list({it["id"]: it for it in items}.values())
+        key = {f: defaults[f] for f in ("source", "remote_drive_id") if f in defaults}
+        existing = {
+            remote_id: (pk, order_id, etag)
+            for pk, remote_id, order_id, etag in model.objects.filter(
+                remote_item_id__in=[it["id"] for it in items], **key,
+            ).values_list("pk", "remote_item_id", "order_id", "remote_etag")
+        }
+
+        new_rows, changed_rows, moved_rows = [], [], []
+        for it in items:
+            fields = {"remote_web_url": it["web"], "remote_name": it["name"], "remote_size": it["size"],
+                      **it["version"]}
+            if it["id"] not in existing:
+                new_rows.append(model(order=order, remote_item_id=it["id"], **defaults, **fields))
+                continue
+            pk, order_id, etag = existing[it["id"]]
+            if order_id != order.pk:
+                moved_rows.append(model(pk=pk, order=order, **fields))
+            elif etag != fields["remote_etag"]:
+                changed_rows.append(model(pk=pk, **fields))
+
+        if new_rows:
+            # ignore_conflicts страхує лише від паралельного запуску, що вставив той самий
+            # елемент між нашим SELECT і INSERT; створеними рахуємо ті, яких не було до INSERT
+            model.objects.bulk_create(new_rows, ignore_conflicts=True)
+        if changed_rows:
+            model.objects.bulk_update(changed_rows, ITEM_FIELDS)
+        if moved_rows:
+            model.objects.bulk_update(moved_rows, ["order", *ITEM_FIELDS])
+        return len(new_rows), len(changed_rows), len(moved_rows)
 
     def handle(self, *args, **options):
         watch = options.get("watch", False)
-        interval = options.get("interval", 5)
         limit = options.get("limit", 0)
-
-        if interval < 1:
-            interval = 1
+        incremental = options.get("incremental", False)
+        folder_timeout = options.get("folder_timeout")
+        full = options.get("full", False)
+        lock_path = getattr(settings, "M365_SYNC_LOCK_FILE", None)
+        sync_options = dict(
+            limit=limit, incremental=incremental, folder_timeout=folder_timeout, full=full,
+            max_folders=options.get("max_folders"), time_budget=options.get("time_budget"),
+        )
 
         if not watch:
-            self._sync_once(limit=limit)
+            with sync_lock(lock_path) as locked:
+                if not locked:
+                    self.stderr.write(self.style.WARNING("Another sync_m365_orders run is in progress, skipping"))
+                    return
+                self._sync_once(**sync_options)
             return
 
+        interval = options.get("interval")
+        if interval is None:
+            interval = getattr(settings, "M365_SYNC_INTERVAL", 300)
+        jitter = options.get("jitter")
+        if jitter is None:
+            jitter = getattr(settings, "M365_SYNC_JITTER", 0.1)
+
+        schedule = SiteSchedule(
+            self._site_names(),
+            interval=interval,
+            jitter=jitter,
+            max_backoff=getattr(settings, "M365_SYNC_MAX_BACKOFF", 3600),
+            site_intervals=getattr(settings, "M365_SYNC_SITE_INTERVALS", None),
+        )
+        if not schedule.next_run:
+            raise CommandError("M365 site not configured")
+
         self.stdout.write(self.style.WARNING(
-            f"Watch mode started. Interval={interval}s"
+            f"Watch mode started. Interval={schedule.interval:.0f}s, jitter=±{schedule.jitter:.0%}, "
+            f"sites={len(schedule.next_run)}"
         ))
 
         while True:
-            try:
-                self._sync_once(limit=limit)
-            except Exception as e:
-                self.stderr.write(self.style.ERROR(f"Sync error: {e}"))
-            time.sleep(interval)
\ No newline at end of file
+            time.sleep(schedule.sleep_for())
+            due = schedule.due()
+
+            with sync_lock(lock_path) as locked:
+                if not locked:
+                    for site_name in due:
+                        schedule.skip(site_name)
+                    self.stderr.write(self.style.WARNING(
+                        "Previous sync cycle is still running, skipping this one"
+                    ))
+                    continue
+
+                # кожен сайт окремо: помилка одного не зсуває розклад інших
+                for site_name in due:
+                    started = time.monotonic()
+                    try:
+                        ok = self._sync_once(site_names=[site_name], **sync_options).get(site_name, False)
+                    except Exception as e:
+                        ok = False
+                        self.stderr.write(self.style.ERROR(f"Sync error for '{site_name}': {e}"))
+
+                    elapsed = time.monotonic() - started
+                    delay = schedule.done(site_name, ok)
+                    line = f"Cycle '{site_name}' {'ok' if ok else 'failed'} in {elapsed:.1f}s, next in {delay:.0f}s"
+                    if ok:
+                        self.stdout.write(line)
+                    else:
+                        self.stderr.write(self.style.WARNING(
+                            f"{line} (failures in a row: {schedule.failures[site_name]})"
+                        ))
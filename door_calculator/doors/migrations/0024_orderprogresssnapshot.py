@@ -0,0 +1,89 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_snapshots(apps, schema_editor):
+    """Початкове заповнення знімків з наявних записів OrderProgress."""
+    Order = apps.get_model("doors", "Order")
+    OrderProgress = apps.get_model("doors", "OrderProgress")
+    OrderProgressSnapshot = apps.get_model("doors", "OrderProgressSnapshot")
+
+    order_ids = OrderProgress.objects.values_list("order_id", flat=True).distinct()
+    for order in Order.objects.filter(id__in=order_ids).iterator():
+        entries = list(
+            OrderProgress.objects.filter(order_id=order.id)
+            .order_by("date", "id")
+            .values_list("date", "percent")
+        )
+        by_day = dict(entries)  # останній запис за день перемагає
+        total_ks = Decimal(str(order.total_ks or 0))
+
+        rows = []
+        day, last_day, percent = entries[0][0], entries[-1][0], 0
+        while day <= last_day:
+            percent = by_day.get(day, percent)
+            rows.append(OrderProgressSnapshot(
+                order_id=order.id,
+                date=day,
+                percent=percent,
+                ks_done=(Decimal(percent) * total_ks / 100).quantize(Decimal("0.001")),
+            ))
+            day += timedelta(days=1)
+        OrderProgressSnapshot.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("doors", "0023_pdfsyncjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderProgressSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(db_index=True)),
+                ("percent", models.PositiveIntegerField(default=0)),
+                (
+                    "ks_done",
+                    models.DecimalField(
+                        decimal_places=3,
+                        default=0,
+                        max_digits=12,
+                        verbose_name="Виконано к/с",
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="progress_snapshots",
+                        to="doors.order",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Знімок прогресу замовлення",
+                "verbose_name_plural": "Знімки прогресу замовлень",
+                "ordering": ["order", "date"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("order", "date"), name="uniq_order_progress_snapshot"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
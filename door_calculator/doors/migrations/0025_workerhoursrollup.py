@@ -0,0 +1,105 @@
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+
+def backfill_rollups(apps, schema_editor):
+    """Початкове заповнення підсумків з наявних записів WorkLog."""
+    WorkLog = apps.get_model("doors", "WorkLog")
+    WorkerHoursRollup = apps.get_model("doors", "WorkerHoursRollup")
+
+    # у зафіксованих міграціях WorkLog ще може не мати work_hours —
+    # тоді їх дорахує manage.py rebuild_hours_rollups
+    has_work_hours = any(f.name == "work_hours" for f in WorkLog._meta.get_fields())
+    sums = {"hours": Sum("hours")}
+    if has_work_hours:
+        sums["work_hours"] = Sum("work_hours")
+
+    rows = []
+    for period, trunc in (("day", TruncDay), ("week", TruncWeek), ("month", TruncMonth)):
+        grouped = (
+            WorkLog.objects.annotate(start=trunc("date"))
+            .values("worker_id", "start")
+            .annotate(entries=Count("id"), **sums)
+            .order_by()
+        )
+        rows.extend(
+            WorkerHoursRollup(
+                worker_id=g["worker_id"],
+                period=period,
+                period_start=g["start"],
+                hours=g["hours"] or Decimal("0"),
+                work_hours=g.get("work_hours") or Decimal("0"),
+                entries=g["entries"],
+            )
+            for g in grouped
+        )
+    WorkerHoursRollup.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("doors", "0024_orderprogresssnapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WorkerHoursRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("day", "День"), ("week", "Тиждень"), ("month", "Місяць")],
+                        max_length=10,
+                    ),
+                ),
+                ("period_start", models.DateField()),
+                ("hours", models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                (
+                    "work_hours",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=10, verbose_name="Год роботи"
+                    ),
+                ),
+                ("entries", models.PositiveIntegerField(default=0)),
+                (
+                    "worker",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="hours_rollups",
+                        to="doors.worker",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Підсумок годин",
+                "verbose_name_plural": "Підсумки годин",
+                "ordering": ["period", "period_start"],
+                "indexes": [
+                    models.Index(
+                        fields=["period", "period_start"], name="worker_rollup_period_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("worker", "period", "period_start"),
+                        name="uniq_worker_hours_rollup",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("doors", "0025_workerhoursrollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportDataVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Версія даних звітів",
+                "verbose_name_plural": "Версія даних звітів",
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("doors", "0026_reportdataversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductionNorm",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("valid_from", models.DateField(unique=True, verbose_name="Діє з")),
+                (
+                    "hv",
+                    models.DecimalField(
+                        decimal_places=3, max_digits=6, verbose_name="Норма Hv, к/с за год"
+                    ),
+                ),
+                (
+                    "comment",
+                    models.CharField(
+                        blank=True, default="", max_length=255, verbose_name="Коментар"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Норма виробітку",
+                "verbose_name_plural": "Норми виробітку",
+                "ordering": ["-valid_from"],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("doors", "0028_m365accesstoken"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="M365DriveState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("site_id", models.CharField(max_length=255)),
+                ("site_name", models.CharField(blank=True, default="", max_length=255)),
+                ("drive_id", models.CharField(max_length=255, unique=True)),
+                ("delta_link", models.TextField(blank=True, default="")),
+                ("last_full_sync_at", models.DateTimeField(blank=True, null=True)),
+                ("last_delta_sync_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Стан синхронізації диска M365",
+                "verbose_name_plural": "Стан синхронізації дисків M365",
+            },
+        ),
+    ]
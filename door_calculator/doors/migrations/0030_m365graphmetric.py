@@ -0,0 +1,43 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("doors", "0029_m365drivestate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="M365GraphMetric",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("period_start", models.DateTimeField(db_index=True)),
+                ("source", models.CharField(max_length=64)),
+                ("endpoint", models.CharField(max_length=32)),
+                ("calls", models.PositiveIntegerField(default=0)),
+                ("errors", models.PositiveIntegerField(default=0)),
+                ("retries", models.PositiveIntegerField(default=0)),
+                ("throttled", models.PositiveIntegerField(default=0)),
+                ("bytes", models.BigIntegerField(default=0)),
+                ("total_ms", models.FloatField(default=0)),
+                ("max_ms", models.FloatField(default=0)),
+                ("latency_buckets", models.JSONField(blank=True, default=list)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Метрика викликів Graph",
+                "verbose_name_plural": "Метрики викликів Graph",
+                "ordering": ["-period_start", "source", "endpoint"],
+                "unique_together": {("period_start", "source", "endpoint")},
+            },
+        ),
+    ]
@@ -0,0 +1,81 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("doors", "0031_remote_version_fields"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="m365drivestate",
+            name="pass_started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="m365drivestate",
+            name="pass_delta_link",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="m365drivestate",
+            name="status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("ok", "Синхронізовано"),
+                    ("partial", "Обхід не завершено"),
+                    ("error", "З помилками"),
+                ],
+                default="",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="m365drivestate",
+            name="last_error",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.CreateModel(
+            name="M365FolderSyncState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("folder_id", models.CharField(max_length=255)),
+                ("folder_name", models.CharField(blank=True, default="", max_length=255)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("ok", "Синхронізовано"), ("error", "Помилка"), ("timeout", "Таймаут")],
+                        max_length=20,
+                    ),
+                ),
+                ("error", models.TextField(blank=True, default="")),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_synced_at", models.DateTimeField(blank=True, db_index=True, null=True)),
+                ("last_attempt_at", models.DateTimeField()),
+                (
+                    "drive",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="folders",
+                        to="doors.m365drivestate",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Стан синхронізації папки M365",
+                "verbose_name_plural": "Стан синхронізації папок M365",
+                "unique_together": {("drive", "folder_id")},
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("doors", "0032_m365foldersyncstate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="m365drivestate",
+            name="pass_full",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from decimal import Decimal, ROUND_HALF_UP
 from django.db import models
+from django.utils import timezone
 
 
 class OrderNameDirectory(models.Model):
@@ -308,6 +309,10 @@ class Order(models.Model):
     remote_drive_id = models.CharField(max_length=255, blank=True, null=True)
     remote_folder_id = models.CharField(max_length=255, blank=True, null=True)
     remote_web_url = models.URLField(blank=True, null=True)
+    # версія папки проекту на момент останньої синхронізації: незмінений cTag — обхід пропускається
+    remote_etag = models.CharField(max_length=255, blank=True, null=True)
+    remote_ctag = models.CharField(max_length=255, blank=True, null=True)
+    remote_modified_at = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
         return f"Замовлення №{self.order_number}, назва замовлення{self.order_name}"
@@ -470,6 +475,10 @@ class OrderImage(models.Model):
     remote_web_url = models.URLField(blank=True, null=True)
     remote_name = models.CharField(max_length=255, blank=True, null=True)
     remote_size = models.BigIntegerField(blank=True, null=True)
+    # версія елемента в M365: рядок оновлюється лише коли змінився eTag
+    remote_etag = models.CharField(max_length=255, blank=True, null=True)
+    remote_ctag = models.CharField(max_length=255, blank=True, null=True)
+    remote_modified_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         verbose_name = "Фото замовлення"
@@ -545,6 +554,10 @@ class OrderFile(models.Model):
     remote_web_url = models.URLField(blank=True, null=True)
     remote_name = models.CharField(max_length=255, blank=True, null=True)
     remote_size = models.BigIntegerField(blank=True, null=True)
+    # версія елемента в M365: рядок оновлюється лише коли змінився eTag
+    remote_etag = models.CharField(max_length=255, blank=True, null=True)
+    remote_ctag = models.CharField(max_length=255, blank=True, null=True)
+    remote_modified_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         verbose_name = "Файл замовлення"
@@ -584,6 +597,32 @@ class OrderProgress(models.Model):
         return f"{self.order.order_number} — {self.percent}%"
 
 
+class OrderProgressSnapshot(models.Model):
+    """
+    Щоденний знімок % виконання замовлення (без пропусків між першим і останнім
+    записом OrderProgress). Підтримується services.progress_snapshots.
+    """
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name="progress_snapshots",
+    )
+    date = models.DateField(db_index=True)
+    percent = models.PositiveIntegerField(default=0)
+    ks_done = models.DecimalField("Виконано к/с", max_digits=12, decimal_places=3, default=0)
+
+    class Meta:
+        verbose_name = "Знімок прогресу замовлення"
+        verbose_name_plural = "Знімки прогресу замовлень"
+        ordering = ["order", "date"]
+        constraints = [
+            models.UniqueConstraint(fields=["order", "date"], name="uniq_order_progress_snapshot"),
+        ]
+
+    def __str__(self):
+        return f"{self.order.order_number} — {self.date}: {self.percent}%"
+
+
 class AdditionItem(models.Model):
     order_item = models.ForeignKey(OrderItem, on_delete=models.CASCADE, related_name="addition_items")
     addition = models.ForeignKey(Addition, on_delete=models.CASCADE)
@@ -661,6 +700,40 @@ class WorkLog(models.Model):
         verbose_name_plural = "Журнали робіт"
         ordering = ["-date"]
 
+
+class WorkerHoursRollup(models.Model):
+    """
+    Години працівника, наперед підсумовані за день / тиждень (з понеділка) / місяць.
+    Оновлюється разом із WorkLog у services.hours_rollups.
+    """
+    PERIOD_CHOICES = [
+        ("day", "День"),
+        ("week", "Тиждень"),
+        ("month", "Місяць"),
+    ]
+
+    worker = models.ForeignKey(Worker, on_delete=models.CASCADE, related_name="hours_rollups")
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+
+    hours = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    work_hours = models.DecimalField("Год роботи", max_digits=10, decimal_places=2, default=0)
+    entries = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Підсумок годин"
+        verbose_name_plural = "Підсумки годин"
+        ordering = ["period", "period_start"]
+        constraints = [
+            models.UniqueConstraint(fields=["worker", "period", "period_start"], name="uniq_worker_hours_rollup"),
+        ]
+        indexes = [
+            models.Index(fields=["period", "period_start"], name="worker_rollup_period_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.worker.name} — {self.get_period_display()} {self.period_start}: {self.hours} год"
+
 class ItemProgress(models.Model):
     order_item = models.ForeignKey(OrderItem, on_delete=models.CASCADE, related_name="progress_history")
     date = models.DateField()
@@ -698,3 +771,209 @@ class CompanyInfo(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class PdfSyncJob(models.Model):
+    """
+    Фонова задача синхронізації PDF замовлення в Teams/SharePoint.
+    Ставиться в чергу з sync_internal_pdf, виконується командою run_pdf_sync_jobs.
+    """
+    STATUS_CHOICES = [
+        ("queued", "В черзі"),
+        ("running", "Виконується"),
+        ("done", "Готово"),
+        ("failed", "Помилка"),
+    ]
+    ACTIVE_STATUSES = ("queued", "running")
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="pdf_sync_jobs")
+    mode = models.CharField("Режим", max_length=20)
+    payload = models.JSONField("Параметри", default=dict, blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued", db_index=True)
+    progress_done = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(default=0)
+    progress_message = models.CharField(max_length=255, blank=True, default="")
+
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now, db_index=True)
+
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Синхронізація PDF"
+        verbose_name_plural = "Синхронізації PDF"
+        ordering = ["-created_at"]
+        constraints = [
+            # одна активна задача на (замовлення, режим) — повторні кліки не плодять дублі
+            models.UniqueConstraint(
+                fields=["order", "mode"],
+                condition=models.Q(status__in=["queued", "running"]),
+                name="uniq_active_pdf_sync_job",
+            )
+        ]
+
+    def __str__(self):
+        return f"PDF sync #{self.id} ({self.mode}) — {self.get_status_display()}"
+
+
+
+class ReportDataVersion(models.Model):
+    """
+    Лічильник змін даних, з яких будуються звіти. Сигнали (doors/signals.py)
+    збільшують його на кожен save/delete — і всі закешовані звіти стають неактуальними.
+    Зберігається в БД, щоб зміни з інших процесів (воркери, команди) теж скидали кеш.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Версія даних звітів"
+        verbose_name_plural = "Версія даних звітів"
+
+    def __str__(self):
+        return f"v{self.version}"
+
+
+class ProductionNorm(models.Model):
+    """
+    Норма виробітку Hv (к/с за годину), чинна з дати valid_from до наступної норми.
+    Якщо жодної норми немає — береться settings.PRODUCTION_HV_DEFAULT.
+    """
+    valid_from = models.DateField("Діє з", unique=True)
+    hv = models.DecimalField("Норма Hv, к/с за год", max_digits=6, decimal_places=3)
+    comment = models.CharField("Коментар", max_length=255, blank=True, default="")
+
+    class Meta:
+        verbose_name = "Норма виробітку"
+        verbose_name_plural = "Норми виробітку"
+        ordering = ["-valid_from"]
+
+    def __str__(self):
+        return f"з {self.valid_from}: {self.hv} к/с/год"
+
+
+class M365AccessToken(models.Model):
+    """
+    Спільний для всіх процесів (gunicorn-воркери, worker_m365) токен Graph.
+    Оновлюється заздалегідь до expires_at; одночасне оновлення серіалізується
+    через select_for_update рядка (doors/services/m365_token.py).
+    """
+    key = models.CharField(max_length=50, unique=True)
+    access_token = models.TextField(blank=True, default="")
+    expires_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Токен Microsoft 365"
+        verbose_name_plural = "Токени Microsoft 365"
+
+    def __str__(self):
+        return f"{self.key} (до {self.expires_at})"
+
+
+class M365DriveState(models.Model):
+    """
+    Стан синхронізації диска SharePoint (sync_m365_orders): deltaLink, з якого
+    --incremental читає лише зміни з моменту попереднього запуску.
+
+    Повний обхід може тривати кілька обмежених запусків (--max-folders, --time-budget):
+    pass_started_at / pass_delta_link — курсор незавершеного обходу; deltaLink
+    переходить у delta_link лише коли обійдено всі папки. pass_full — обхід без
+    пропуску незмінених за cTag (--full або відкат з --incremental).
+    """
+    STATUS_CHOICES = [
+        ("ok", "Синхронізовано"),
+        ("partial", "Обхід не завершено"),
+        ("error", "З помилками"),
+    ]
+
+    site_id = models.CharField(max_length=255)
+    site_name = models.CharField(max_length=255, blank=True, default="")
+    drive_id = models.CharField(max_length=255, unique=True)
+    delta_link = models.TextField(blank=True, default="")
+
+    pass_started_at = models.DateTimeField(null=True, blank=True)
+    pass_delta_link = models.TextField(blank=True, default="")
+    pass_full = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, blank=True, default="")
+    last_error = models.TextField(blank=True, default="")
+
+    last_full_sync_at = models.DateTimeField(null=True, blank=True)
+    last_delta_sync_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Стан синхронізації диска M365"
+        verbose_name_plural = "Стан синхронізації дисків M365"
+
+    def __str__(self):
+        return self.site_name or self.drive_id
+
+
+class M365FolderSyncState(models.Model):
+    """
+    Чекпойнт папки проекту в sync_m365_orders: коли востаннє синхронізована і чим
+    закінчилась остання спроба. Наступний запуск продовжує незавершений обхід
+    з папок, яких ще не було або які найдовше не синхронізувались.
+    """
+    STATUS_CHOICES = [
+        ("ok", "Синхронізовано"),
+        ("error", "Помилка"),
+        ("timeout", "Таймаут"),
+    ]
+
+    drive = models.ForeignKey(M365DriveState, on_delete=models.CASCADE, related_name="folders")
+    folder_id = models.CharField(max_length=255)
+    folder_name = models.CharField(max_length=255, blank=True, default="")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    error = models.TextField(blank=True, default="")
+    # невдалих спроб поспіль
+    attempts = models.PositiveIntegerField(default=0)
+
+    last_synced_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    last_attempt_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Стан синхронізації папки M365"
+        verbose_name_plural = "Стан синхронізації папок M365"
+        unique_together = ("drive", "folder_id")
+
+    def __str__(self):
+        return self.folder_name or self.folder_id
+
+
+class M365GraphMetric(models.Model):
+    """
+    Метрики викликів Graph (doors/services/m365_metrics.py): один рядок на
+    годину × процес (web, sync_m365_orders, ...) × клас endpoint-а.
+    latency_buckets — гістограма латентності з межами LATENCY_BUCKETS_MS.
+    """
+    period_start = models.DateTimeField(db_index=True)
+    source = models.CharField(max_length=64)
+    endpoint = models.CharField(max_length=32)
+
+    calls = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    retries = models.PositiveIntegerField(default=0)
+    throttled = models.PositiveIntegerField(default=0)
+    bytes = models.BigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    latency_buckets = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Метрика викликів Graph"
+        verbose_name_plural = "Метрики викликів Graph"
+        unique_together = ("period_start", "source", "endpoint")
+        ordering = ["-period_start", "source", "endpoint"]
+
+    def __str__(self):
+        return f"{self.period_start:%Y-%m-%d %H:00} {self.source} {self.endpoint}"
@@ -0,0 +1,127 @@
+"""
+Ефективність виробництва як часовий ряд з ковзними вікнами (7/30/90 днів).
+
+Для кожної точки ряду і вікна [d - W + 1, d] рахується те саме, що й у
+report_period_view за цей діапазон:
+    Vзаг   = Σ по замовленнях max(0, (%кін - %поч) * Vz / 100)
+    Tнорма = Vзаг / Hv   (Hv — норма, чинна на кінець вікна)
+    Tфакт  = Σ годин за вікно
+    E      = Tнорма / Tфакт * 100
+Дані (щоденні знімки прогресу і денні підсумки годин) читаються один раз на весь
+діапазон, далі — лише арифметика над масивами по днях, без повторного запуску звіту.
+Для freq=week години вікон беруться з тижневих підсумків (денні — лише на краях вікон).
+"""
+from bisect import bisect_right
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.conf import settings
+from django.db.models import Sum
+
+from doors.models import OrderProgressSnapshot, ProductionNorm, WorkerHoursRollup
+from doors.services.hours_rollups import range_hours
+from doors.services.period_report import forward_fill, period_days
+
+DEFAULT_WINDOWS = (7, 30, 90)
+ALLOWED_WINDOWS = (7, 30, 90)
+FREQUENCIES = ("day", "week")
+
+
+class NormTimeline:
+    """Норми Hv по датах: hv_on(d) — норма, чинна на дату d."""
+
+    def __init__(self):
+        norms = list(ProductionNorm.objects.order_by("valid_from").values_list("valid_from", "hv"))
+        self._dates = [d for d, _ in norms]
+        self._values = [hv for _, hv in norms]
+        self.default = Decimal(str(settings.PRODUCTION_HV_DEFAULT))
+
+    def hv_on(self, d: date) -> Decimal:
+        i = bisect_right(self._dates, d)
+        return self._values[i - 1] if i else self.default
+
+
+def _sample_days(days: list[date], start: date, freq: str) -> list[int]:
+    """Індекси днів, для яких віддаємо точки ряду: кожен день або кожна неділя (кінець тижня)."""
+    first = days.index(start)
+    if freq == "week":
+        return [i for i in range(first, len(days)) if days[i].weekday() == 6]
+    return list(range(first, len(days)))
+
+
+def efficiency_series(start: date, end: date, freq: str = "day", windows=DEFAULT_WINDOWS) -> dict:
+    windows = sorted(set(windows))
+    lo = start - timedelta(days=max(windows) - 1)
+    days = period_days(lo, end)
+    day_index = {d: i for i, d in enumerate(days)}
+
+    sample = _sample_days(days, start, freq)
+
+    # ---- години за вікна ----
+    if freq == "week":
+        # точки — неділі: повні тижні вікна з тижневих підсумків, денні лише для країв
+        spans = [(i, w) for i in sample for w in windows]
+        t_facts = dict(zip(spans, (
+            float(h) for h in range_hours([(days[i - w + 1], days[i]) for i, w in spans])
+        )))
+    else:
+        # денні підсумки → префіксні суми
+        hours = [0.0] * len(days)
+        for d, total in (
+            WorkerHoursRollup.objects
+            .filter(period="day", period_start__range=[lo, end])
+            .values("period_start")
+            .annotate(total=Sum("hours"))
+            .values_list("period_start", "total")
+        ):
+            hours[day_index[d]] = float(total or 0)
+        hours_prefix = [0.0] + list(accumulate(hours))
+        t_facts = {
+            (i, w): hours_prefix[i + 1] - hours_prefix[i - w + 1] for i in sample for w in windows
+        }
+
+    # ---- виконані к/с по замовленнях і днях (forward-fill знімків) ----
+    # замовленням, чий ряд закінчився до lo, приріст у вікнах завжди 0 — їх не читаємо
+    entries_by_order = {}
+    vz_by_order = {}
+    for order_id, d, percent, total_ks in (
+        OrderProgressSnapshot.objects
+        .filter(date__range=[lo, end])
+        .order_by("order_id", "date")
+        .values_list("order_id", "date", "percent", "order__total_ks")
+    ):
+        entries_by_order.setdefault(order_id, []).append((d, percent))
+        vz_by_order[order_id] = float(total_ks or 0)
+
+    ks_series = []
+    for order_id, entries in entries_by_order.items():
+        vz = vz_by_order[order_id] / 100
+        ks_series.append([float(p) * vz for p in forward_fill(entries, days)])
+
+    # ---- точки ряду ----
+    norms = NormTimeline()
+    points = []
+    for i in sample:
+        hv = norms.hv_on(days[i])
+        by_window = {}
+        for w in windows:
+            s = i - w + 1
+            vzag = sum(max(0.0, ks[i] - ks[s]) for ks in ks_series)
+            t_fact = t_facts[(i, w)]
+            t_norma = vzag / float(hv) if hv > 0 else 0.0
+            by_window[str(w)] = {
+                "vzag": round(vzag, 3),
+                "t_norma": round(t_norma, 2),
+                "t_fact": round(t_fact, 2),
+                "eff_percent": round(t_norma / t_fact * 100, 1) if t_fact > 0 else None,
+            }
+        points.append({"date": days[i].isoformat(), "hv": float(hv), "windows": by_window})
+
+    return {
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "freq": freq,
+        "windows": windows,
+        "points": points,
+    }
@@ -0,0 +1,194 @@
+"""
+Підсумки годин працівників по днях / тижнях / місяцях (WorkerHoursRollup).
+
+Обробники pre_save/post_save/post_delete WorkLog (doors/signals.py) змінюють
+підсумки на дельту запису в тій самій транзакції, що й WorkLog, — з views,
+адмінки чи ORM однаково. Звіти читають готові рядки: довгі періоди — місячні
+підсумки для повних місяців і денні лише для "хвостів" на краях діапазону;
+тижневий ряд ефективності — тижневі підсумки і денні лише на краях вікон.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q, Sum, Count
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from doors.models import WorkLog, WorkerHoursRollup
+
+PERIODS = ("day", "week", "month")
+
+_TRUNC = {"day": TruncDay, "week": TruncWeek, "month": TruncMonth}
+
+
+def period_start(period: str, d: date) -> date:
+    if period == "week":
+        return d - timedelta(days=d.weekday())
+    if period == "month":
+        return d.replace(day=1)
+    return d
+
+
+def _next_month(d: date) -> date:
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _dec(value) -> Decimal:
+    return Decimal(str(value or 0))
+
+
+def apply_worklog(worker_id: int, day: date, hours, work_hours, sign: int = 1) -> None:
+    """Додає (sign=1) або віднімає (sign=-1) один запис WorkLog у всіх трьох періодах."""
+    hours = _dec(hours) * sign
+    work_hours = _dec(work_hours) * sign
+
+    with transaction.atomic():
+        for period in PERIODS:
+            row, _ = WorkerHoursRollup.objects.get_or_create(
+                worker_id=worker_id,
+                period=period,
+                period_start=period_start(period, day),
+            )
+            WorkerHoursRollup.objects.filter(pk=row.pk).update(
+                hours=F("hours") + hours,
+                work_hours=F("work_hours") + work_hours,
+                entries=F("entries") + sign,
+            )
+
+        if sign < 0:
+            WorkerHoursRollup.objects.filter(
+                worker_id=worker_id,
+                period_start__in={period_start(p, day) for p in PERIODS},
+                entries=0,
+            ).delete()
+
+
+def rebuild_rollups(worker_ids=None) -> int:
+    """Повністю перераховує підсумки з WorkLog (для всіх або вказаних працівників)."""
+    logs = WorkLog.objects.all()
+    rollups = WorkerHoursRollup.objects.all()
+    if worker_ids:
+        logs = logs.filter(worker_id__in=worker_ids)
+        rollups = rollups.filter(worker_id__in=worker_ids)
+
+    rows = []
+    for period in PERIODS:
+        grouped = (
+            logs.annotate(start=_TRUNC[period]("date"))
+            .values("worker_id", "start")
+            .annotate(hours=Sum("hours"), work_hours=Sum("work_hours"), entries=Count("id"))
+            .order_by()
+        )
+        rows.extend(
+            WorkerHoursRollup(
+                worker_id=g["worker_id"],
+                period=period,
+                period_start=g["start"],
+                hours=_dec(g["hours"]),
+                work_hours=_dec(g["work_hours"]),
+                entries=g["entries"],
+            )
+            for g in grouped
+        )
+
+    with transaction.atomic():
+        rollups.delete()
+        WorkerHoursRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def range_q(start: date | None, end: date | None) -> Q:
+    """
+    Умова на WorkerHoursRollup, що покриває [start, end] без перекриттів:
+    повні місяці — місячними рядками, решта днів — денними.
+    Порожня межа означає "без обмеження".
+    """
+    month_lo = None if start is None else (start if start.day == 1 else _next_month(start))
+    month_hi = None if end is None else (
+        _next_month(end) if (end + timedelta(days=1)).day == 1 else end.replace(day=1)
+    )
+
+    if month_lo is not None and month_hi is not None and month_lo >= month_hi:
+        days = Q(period="day")
+        if start:
+            days &= Q(period_start__gte=start)
+        if end:
+            days &= Q(period_start__lte=end)
+        return days
+
+    q = Q(period="month")
+    if month_lo is not None:
+        q &= Q(period_start__gte=month_lo)
+    if month_hi is not None:
+        q &= Q(period_start__lt=month_hi)
+
+    if start is not None and start < month_lo:
+        q |= Q(period="day", period_start__gte=start, period_start__lt=month_lo)
+    if end is not None and month_hi <= end:
+        q |= Q(period="day", period_start__gte=month_hi, period_start__lte=end)
+    return q
+
+
+def worker_totals(start: date | None = None, end: date | None = None, worker_id=None):
+    """Підсумки по працівниках за період — ті самі ключі, що й агрегат по WorkLog у worklog_list."""
+    qs = WorkerHoursRollup.objects.filter(range_q(start, end))
+    if worker_id:
+        qs = qs.filter(worker_id=worker_id)
+    return (
+        qs.values("worker__name", "worker__position")
+        .annotate(total_hours=Sum("hours"), work_hours=Sum("work_hours"))
+        .order_by("worker__name")
+    )
+
+
+def daily_hours(start: date, end: date) -> dict[tuple[date, int], Decimal]:
+    """{(дата, worker_id): години} з денних підсумків."""
+    return {
+        (d, worker_id): hours
+        for d, worker_id, hours in WorkerHoursRollup.objects.filter(
+            period="day", period_start__range=[start, end]
+        ).values_list("period_start", "worker_id", "hours")
+    }
+
+
+def _split_weeks(start: date, end: date) -> tuple[list[date], list[date]]:
+    """[start, end] → (понеділки повних тижнів, решта днів на краях)."""
+    first_monday = start + timedelta(days=-start.weekday() % 7)
+    last_sunday = end - timedelta(days=(end.weekday() + 1) % 7)
+    if first_monday > last_sunday:
+        return [], [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+    weeks = [first_monday + timedelta(weeks=i) for i in range((last_sunday - first_monday).days // 7 + 1)]
+    days = [start + timedelta(days=i) for i in range((first_monday - start).days)]
+    days += [last_sunday + timedelta(days=i) for i in range(1, (end - last_sunday).days + 1)]
+    return weeks, days
+
+
+def range_hours(ranges: list[tuple[date, date]]) -> list[Decimal]:
+    """
+    Сума годин усіх працівників за кожен діапазон [start, end] (включно).
+    Повні тижні — з тижневих підсумків, денні рядки читаються лише для днів на
+    краях діапазонів; два запити на весь список.
+    """
+    splits = [_split_weeks(start, end) for start, end in ranges]
+    week_starts = {w for weeks, _ in splits for w in weeks}
+    edge_days = {d for _, days in splits for d in days}
+
+    totals = {}
+    for period, starts in (("week", week_starts), ("day", edge_days)):
+        if not starts:
+            continue
+        totals.update(
+            ((period, s), total)
+            for s, total in WorkerHoursRollup.objects
+            .filter(period=period, period_start__in=starts)
+            .values("period_start")
+            .annotate(total=Sum("hours"))
+            .values_list("period_start", "total")
+        )
+
+    return [
+        sum((_dec(totals.get(("week", w))) for w in weeks), Decimal("0"))
+        + sum((_dec(totals.get(("day", d))) for d in days), Decimal("0"))
+        for weeks, days in splits
+    ]
@@ -0,0 +1,172 @@
+"""
+Асинхронний клієнт Graph для обходу папок (sync_m365_orders).
+
+Корутини (по одній на папку проекту / ланцюг / рівень) просять GET-и у клієнта;
+клієнт складає запити, що прийшли майже одночасно, у $batch по 20 і віддає їх
+потокам пулу. Кожен $batch — блокуючий виклик requests (спільна keep-alive сесія),
+бо aiohttp/httpx у залежностях немає, а ретраї, обмежувач і метрики живуть
+у синхронному graph().
+
+Скільки запитів реально в дорозі, вирішує не пул, а вікно AIMD процесного
+обмежувача (m365_limiter): воно росте на успіхах і вдвічі падає на 429/503/504.
+Пул потоків має розмір стелі цього вікна (max_concurrency, M365_MAX_CONCURRENCY),
+тож ніколи не обмежує раніше за обмежувач: потоки понад поточне вікно чекають
+у limiter.acquire(), а не в черзі пулу. M365_SYNC_WORKERS на обхід не впливає.
+Скільки папок іде паралельно, вирішує кількість корутин, тож дедлайни й
+скасування працюють для кожної папки окремо.
+"""
+import asyncio
+import concurrent.futures
+
+from django.db import connections
+
+from doors.services.m365_graph import (
+    BATCH_LIMIT,
+    ITEM_SELECT,
+    _relative_url,
+    batch_get,
+    children_path,
+    graph,
+    search_path,
+)
+from doors.services.m365_limiter import get_limiter
+
+# скільки чекати, поки назбирається батч (секунди)
+BATCH_WINDOW = 0.01
+
+
+def _in_thread(fn, *args, **kwargs):
+    """
+    Виконує fn у потоці пулу і закриває зʼєднання з БД цього потоку: токен (m365_token)
+    і скидання метрик ходять у БД, а потоки пулу Django сам не прибирає.
+    """
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        connections.close_all()
+
+
+class AsyncGraphClient:
+    """
+    async with AsyncGraphClient() as client:
+        items = await client.get_all_pages(f"/drives/{drive_id}/items/{item_id}/children")
+
+    Однакові шляхи в межах одного клієнта читаються один раз (in-flight і готові результати).
+    max_in_flight — скільки батчів можуть бути в потоках одночасно; за замовчуванням
+    стеля вікна обмежувача, а поточну межу задає саме вікно.
+    """
+
+    def __init__(self, max_in_flight: int = None, batch_window: float = BATCH_WINDOW):
+        self.max_in_flight = max(1, int(max_in_flight or get_limiter().max_concurrency))
+        self.batch_window = batch_window
+        self.requests_sent = 0
+        self.batches_sent = 0
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_in_flight, thread_name_prefix="m365-async",
+        )
+        self._semaphore = None
+        self._queue: list[tuple[str, asyncio.Future]] = []
+        self._flush_handle = None
+        self._pages: dict[str, asyncio.Task] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def __aenter__(self):
+        # батчі понад кількість потоків чекають тут, а не в черзі пулу: скасовані
+        # (дедлайн папки) відсіюються перед самою відправкою
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._flush_handle:
+            self._flush_handle.cancel()
+        tasks = list(self._tasks) + list(self._pages.values())
+        for task in tasks:
+            task.cancel()
+        # забираємо результати/помилки, щоб asyncio не скаржився на "never retrieved"
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # потоки з незавершеними HTTP не чекаємо — їхні результати вже нікому не потрібні
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- батчинг ----------
+    async def get(self, path: str) -> dict:
+        """Тіло відповіді GET path (відносно /v1.0); помилка — GraphError."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((path, future))
+
+        if len(self._queue) >= BATCH_LIMIT:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        # скасовані (дедлайн папки) до відправки не потрапляють у батч
+        pending = [(path, f) for path, f in self._queue if not f.done()]
+        self._queue = []
+        for i in range(0, len(pending), BATCH_LIMIT):
+            task = asyncio.get_running_loop().create_task(self._send(pending[i:i + BATCH_LIMIT]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        async with self._semaphore:
+            batch = [(path, f) for path, f in batch if not f.done()]
+            if not batch:
+                return
+            self.batches_sent += 1
+            self.requests_sent += len(batch)
+            loop = asyncio.get_running_loop()
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, lambda: _in_thread(batch_get, [path for path, _ in batch], max_workers=1),
+                )
+            except Exception as e:
+                results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    # ---------- колекції ----------
+    async def get_all_pages(self, path: str) -> list:
+        """Усі сторінки колекції; однаковий path у межах клієнта читається один раз."""
+        task = self._pages.get(path)
+        if task is None:
+            task = asyncio.ensure_future(self._read_pages(path))
+            self._pages[path] = task
+        # shield: скасування однієї папки не скасовує спільне читання для інших
+        return await asyncio.shield(task)
+
+    async def _read_pages(self, path: str) -> list:
+        items = []
+        url = path
+        while url:
+            body = await self.get(url)
+            items.extend(body.get("value", []))
+            next_link = body.get("@odata.nextLink")
+            url = _relative_url(next_link) if next_link else None
+            if next_link and url is None:
+                # чужий хост у nextLink — дочитуємо звичайними запитами
+                loop = asyncio.get_running_loop()
+                while next_link:
+                    page = await loop.run_in_executor(self._executor, _in_thread, graph, "GET", next_link)
+                    items.extend(page.get("value", []))
+                    next_link = page.get("@odata.nextLink")
+        return items
+
+    async def list_children(self, drive_id: str, item_id: str, select: str = ITEM_SELECT) -> list:
+        return await self.get_all_pages(children_path(drive_id, item_id, select))
+
+    async def search_in_folder(self, drive_id: str, folder_id: str, q: str, select: str = ITEM_SELECT) -> list:
+        return await self.get_all_pages(search_path(drive_id, folder_id, q, select))
+
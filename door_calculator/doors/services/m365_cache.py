@@ -0,0 +1,144 @@
+"""
+Кеш переліків дітей папок SharePoint у памʼяті процесу.
+
+Ключ — (drive_id, item_id). Свіжий запис (молодший за TTL) віддається без Graph;
+протермінований перевіряється дешевим GET метаданих папки: якщо cTag не змінився —
+перелік лишається, інакше читається заново (див. m365_graph.list_children).
+eTag для цього не годиться — він не змінюється від змін дітей, тож запис папки без
+cTag (SharePoint його часто не віддає) просто протерміновується і читається заново.
+
+Памʼять обмежена: не більше max_entries папок і max_items елементів сумарно (LRU).
+Мітки дочірніх папок, побачені в переліках, запамʼятовуються окремо (seen_tag) —
+так новий запис одразу має з чим порівнювати, без зайвого запиту метаданих.
+Після наших власних завантажень у папку — invalidate().
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+def item_tag(item: dict) -> str | None:
+    """cTag (зміна вмісту); без нього перелік папки перевірити нема чим — None."""
+    if not item:
+        return None
+    return item.get("cTag")
+
+
+class _Entry:
+    __slots__ = ("items", "tag", "expires_at")
+
+    def __init__(self, items: list, tag: str | None, expires_at: float):
+        self.items = items
+        self.tag = tag
+        self.expires_at = expires_at
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+class ChildrenCache:
+    def __init__(self, ttl: float = 120, max_entries: int = 1000, max_items: int = 50000):
+        self.ttl = float(ttl)
+        self.max_entries = max(1, int(max_entries))
+        self.max_items = max(1, int(max_items))
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._tags: OrderedDict[tuple, str] = OrderedDict()
+        self._items = 0
+        self._lock = threading.Lock()
+
+    def get(self, drive_id: str, item_id: str) -> _Entry | None:
+        key = (drive_id, item_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, drive_id: str, item_id: str, items: list, tag: str = None):
+        key = (drive_id, item_id)
+        items = list(items)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._items -= len(old.items)
+            self._entries[key] = _Entry(items, tag, time.monotonic() + self.ttl)
+            self._items += len(items)
+
+            for it in items:
+                tag_ = item_tag(it)
+                if it.get("folder") and tag_:
+                    self._tags[(drive_id, it["id"])] = tag_
+                    self._tags.move_to_end((drive_id, it["id"]))
+
+            self._evict()
+
+    def refresh(self, drive_id: str, item_id: str):
+        """cTag папки не змінився — перелік живе ще один TTL."""
+        with self._lock:
+            entry = self._entries.get((drive_id, item_id))
+            if entry is not None:
+                entry.expires_at = time.monotonic() + self.ttl
+
+    def note(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def seen_tag(self, drive_id: str, item_id: str) -> str | None:
+        with self._lock:
+            return self._tags.get((drive_id, item_id))
+
+    def invalidate(self, drive_id: str, item_id: str):
+        key = (drive_id, item_id)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._items -= len(entry.items)
+            self._tags.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._items = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "items": self._items,
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+            }
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._items > self.max_items):
+            _, entry = self._entries.popitem(last=False)
+            self._items -= len(entry.items)
+        while len(self._tags) > self.max_items:
+            self._tags.popitem(last=False)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_children_cache() -> ChildrenCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ChildrenCache(
+                    ttl=getattr(settings, "M365_CHILDREN_CACHE_TTL", 120),
+                    max_entries=getattr(settings, "M365_CHILDREN_CACHE_SIZE", 1000),
+                    max_items=getattr(settings, "M365_CHILDREN_CACHE_MAX_ITEMS", 50000),
+                )
+    return _cache
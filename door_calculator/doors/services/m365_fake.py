@@ -0,0 +1,537 @@
+"""
+Локальна заглушка Microsoft Graph для тестів і бенчмарків без реального тенанта.
+
+    with FakeGraphServer() as fake:
+        with mock.patch.object(m365_graph, "GRAPH_BASE", fake.graph_base):
+            ...
+
+Підтримує прості завантаження (PUT .../content) та upload sessions
+(createUploadSession + шматки з Content-Range + статус nextExpectedRanges),
+з можливістю зламати окремі шматки, щоб перевірити відновлення; пошук сайтів,
+диски сайту, читання дітей папок посторінково, пошук у папці, метадані
+елементів, вміст і мініатюри файлів, delta диска і JSON $batch (з $select/$top); штучну
+затримку мережі і 429 з Retry-After (для всіх запитів або окремих підзапитів).
+
+Дерево папок для бенчмарків — generate_project_tree() (структура під M365_SYNC_CHAINS).
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeGraph/1.0"
+    protocol_version = "HTTP/1.1"
+
+    # (method, regex по path без query, імʼя методу FakeGraphServer)
+    routes = [
+        ("POST", re.compile(r"^/v1\.0/drives/(?P<drive>[^/]+)/items/(?P<folder>[^/:]+):/(?P<name>.+):/createUploadSession$"),
+         "handle_create_session"),
+        ("PUT", re.compile(r"^/v1\.0/drives/(?P<drive>[^/]+)/items/(?P<folder>[^/:]+):/(?P<name>.+):/content$"),
+         "handle_simple_upload"),
+        ("PUT", re.compile(r"^/upload/(?P<session>[0-9a-f]+)$"), "handle_session_chunk"),
+        ("GET", re.compile(r"^/upload/(?P<session>[0-9a-f]+)$"), "handle_session_status"),
+        ("GET", re.compile(r"^/v1\.0/drives/(?P<drive>[^/]+)/items/(?P<item>[^/]+)/children$"), "handle_children"),
+        ("GET", re.compile(r"^/v1\.0/drives/(?P<drive>[^/]+)/root/children$"), "handle_root_children"),
+        ("GET", re.compile(r"^/v1\.0/drives/(?P<drive>[^/]+)/root/delta$"), "handle_delta"),
+        ("GET", re.compile(r"^/v1\.0/drives/(?P<drive>[^/]+)/items/(?P<item>[^/:]+)$"), "handle_item"),
+        ("GET", re.compile(r"^/v1\.0/drives/(?P<drive>[^/]+)/items/(?P<item>[^/]+)/content$"), "handle_content"),
+        ("GET", re.compile(
+            r"^/v1\.0/drives/(?P<drive>[^/]+)/items/(?P<item>[^/]+)/thumbnails/\d+/(?P<size>\w+)/content$"
+        ), "handle_thumbnail"),
+        ("GET", re.compile(r"^/v1\.0/drives/(?P<drive>[^/]+)/items/(?P<item>[^/]+)/search\(q='(?P<q>.*)'\)$"),
+         "handle_search"),
+        ("GET", re.compile(r"^/v1\.0/sites$"), "handle_sites"),
+        ("GET", re.compile(r"^/v1\.0/sites/(?P<site>[^/]+)/drives$"), "handle_drives"),
+        ("POST", re.compile(r"^/v1\.0/\$batch$"), "handle_batch"),
+    ]
+
+    def log_message(self, format, *args):  # noqa: A002 — тиша в stderr
+        pass
+
+    def _dispatch(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        fake: FakeGraphServer = self.server.fake
+        fake.record("http_requests", 0)
+        if fake.latency:
+            time.sleep(fake.latency)
+        status, payload, headers = fake.route(method, self.path, self.headers, body)
+        return self._send(status, payload, headers)
+
+    def _send(self, status: int, payload, headers: dict = None):
+        if isinstance(payload, (bytes, bytearray)):
+            data = bytes(payload)
+            content_type = "application/octet-stream"
+        else:
+            data = json.dumps(payload).encode("utf-8") if payload is not None else b""
+            content_type = "application/json"
+
+        self.server.fake.record_out(len(data))
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+
+ROOT_ID = "root"
+
+
+class FakeGraphServer:
+    """
+    files: {(drive_id, folder_id, name): bytes} — все, що було завантажено.
+    fail_chunks: {номер_PUT_у_сесії: "error" | "partial"} — один раз ламає вказаний шматок:
+        "error"   — 503 без збереження даних,
+        "partial" — зберігає половину шматка і повертає 500 (обрив посеред передачі).
+    broken_status: скільки разів запит стану сесії отримає HTML замість JSON (проксі, 5xx-сторінка).
+    children: {(drive_id, item_id): [driveItem]} — що віддавати на .../children (по page_size);
+        корінь диска — item_id ROOT_ID.
+    touch(drive_id, item) — записати зміну в delta-журнал диска;
+    delta_floor: {drive_id: n} — delta-токени, менші за n, протерміновані (410).
+    throttle_paths: {шлях: n} — n разів 429 з Retry-After: 0 для підзапиту $batch з цим шляхом.
+    throttle_every: кожен n-й запит (HTTP чи підзапит $batch) — 429 з Retry-After: retry_after.
+    sites: {site_id: {"displayName": ..., "drives": {drive_id: назва}}}.
+    latency: штучна затримка кожного HTTP-запиту, секунди.
+    calls["http_requests"] — кількість реальних HTTP-запитів (підзапити $batch окремо в calls);
+    bytes_out — скільки байтів тіл відповідей віддано.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, page_size: int = 200):
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.files: dict[tuple, bytes] = {}
+        self.sessions: dict[str, dict] = {}
+        self.fail_chunks: dict[int, str] = {}
+        self.broken_status = 0
+        self.calls = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+        # дерево папок: {(drive_id, item_id): [driveItem дітей]}
+        self.children: dict[tuple, list] = {}
+        self.page_size = page_size
+        # {шлях підзапиту $batch: скільки разів відповісти 429}
+        self.throttle_paths: dict[str, int] = {}
+        self.delta_log: dict[str, list] = {}
+        self.delta_floor: dict[str, int] = {}
+
+        self.sites: dict[str, dict] = {}
+        self.latency = 0.0
+        self.throttle_every = 0
+        self.retry_after = "0"
+        self._routed = 0
+
+    # ---------- lifecycle ----------
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def graph_base(self) -> str:
+        return f"{self.base_url}/v1.0"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-graph", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def touch(self, drive_id: str, item: dict):
+        """Зміна в delta-журнал; як у OneDrive, cTag усіх папок-предків теж змінюється."""
+        with self._lock:
+            self.delta_log.setdefault(drive_id, []).append(item)
+            parent_id = (item.get("parentReference") or {}).get("id")
+            while parent_id and parent_id != ROOT_ID:
+                found = self._locate(drive_id, parent_id)
+                if found is None:
+                    break
+                parent_id, folder = found
+                folder["cTag"] = f'"c:{folder["id"]},{len(self.delta_log[drive_id]) + 1}"'
+
+    def _locate(self, drive_id: str, item_id: str):
+        """(id батька, сам driveItem у дереві) або None."""
+        for (drive, parent_id), items in self.children.items():
+            if drive != drive_id:
+                continue
+            for it in items:
+                if it["id"] == item_id:
+                    return parent_id, it
+        return None
+
+    def _find_item(self, drive_id: str, item_id: str):
+        found = self._locate(drive_id, item_id)
+        if found is None:
+            return None
+        parent_id, it = found
+        return dict(it, parentReference={"driveId": drive_id, "id": parent_id})
+
+    def record(self, handler_name: str, size: int):
+        with self._lock:
+            self.calls[handler_name] += 1
+            self.bytes_in += size
+
+    def record_out(self, size: int):
+        with self._lock:
+            self.bytes_out += size
+
+    def route(self, method: str, raw_path: str, headers, body: bytes):
+        parts = urlsplit(raw_path)
+        path = unquote(parts.path)
+
+        if self.throttle_every and not path.endswith("/$batch"):
+            with self._lock:
+                self._routed += 1
+                throttled = self._routed % self.throttle_every == 0
+            if throttled:
+                self.record("throttled", 0)
+                return 429, {"error": {"code": "TooManyRequests"}}, {"Retry-After": self.retry_after}
+        for route_method, pattern, handler_name in _Handler.routes:
+            if route_method != method:
+                continue
+            m = pattern.match(path)
+            if m:
+                self.record(handler_name, len(body))
+                return getattr(self, handler_name)(
+                    groups=m.groupdict(), query=parts.query, headers=headers, body=body,
+                )
+
+        self.record("not_found", len(body))
+        return 404, {"error": {"code": "itemNotFound", "message": path}}, None
+
+    # ---------- handlers ----------
+    def _drive_item(self, drive_id, folder_id, name, data: bytes) -> dict:
+        return {
+            "id": f"item-{uuid.uuid5(uuid.NAMESPACE_URL, f'{drive_id}/{folder_id}/{name}').hex[:16]}",
+            "name": name,
+            "size": len(data),
+            "file": {"mimeType": "application/octet-stream"},
+            "parentReference": {"driveId": drive_id, "id": folder_id},
+        }
+
+    def handle_simple_upload(self, groups, query, headers, body):
+        key = (groups["drive"], groups["folder"], groups["name"])
+        with self._lock:
+            self.files[key] = body
+        return 201, self._drive_item(*key, body), None
+
+    def handle_create_session(self, groups, query, headers, body):
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self.sessions[session_id] = {
+                "key": (groups["drive"], groups["folder"], groups["name"]),
+                "data": bytearray(),
+                "puts": 0,
+            }
+        expires = datetime.now(dt_timezone.utc) + timedelta(hours=1)
+        return 200, {
+            "uploadUrl": f"{self.base_url}/upload/{session_id}",
+            "expirationDateTime": expires.isoformat(),
+            "nextExpectedRanges": ["0-"],
+        }, None
+
+    def handle_session_status(self, groups, query, headers, body):
+        session = self.sessions.get(groups["session"])
+        if not session:
+            return 404, {"error": {"code": "itemNotFound"}}, None
+        with self._lock:
+            broken, self.broken_status = self.broken_status > 0, max(0, self.broken_status - 1)
+        if broken:
+            return 200, b"<html><body>Bad gateway</body></html>", None
+        return 200, {"nextExpectedRanges": [f"{len(session['data'])}-"]}, None
+
+    def handle_session_chunk(self, groups, query, headers, body):
+        session = self.sessions.get(groups["session"])
+        if not session:
+            return 404, {"error": {"code": "itemNotFound"}}, None
+
+        m = re.match(r"bytes (\d+)-(\d+)/(\d+)", headers.get("Content-Range") or "")
+        if not m:
+            return 400, {"error": {"code": "invalidRange"}}, None
+        start, end, total = (int(x) for x in m.groups())
+
+        with self._lock:
+            session["puts"] += 1
+            fault = self.fail_chunks.pop(session["puts"], None)
+            received = len(session["data"])
+
+            if start != received or end - start + 1 != len(body):
+                return 416, {
+                    "error": {"code": "invalidRange"},
+                    "nextExpectedRanges": [f"{received}-"],
+                }, None
+
+            if fault == "error":
+                return 503, {"error": {"code": "serviceNotAvailable"}}, {"Retry-After": "0"}
+            if fault == "partial":
+                session["data"].extend(body[: len(body) // 2])
+                return 500, {"error": {"code": "generalException"}}, None
+
+            session["data"].extend(body)
+            if len(session["data"]) < total:
+                return 202, {"nextExpectedRanges": [f"{len(session['data'])}-"]}, None
+
+            key = session["key"]
+            data = bytes(session["data"])
+            self.files[key] = data
+            del self.sessions[groups["session"]]
+        return 201, self._drive_item(*key, data), None
+
+    def handle_children(self, groups, query, headers, body):
+        key = (groups["drive"], groups["item"])
+        if key not in self.children:
+            return 404, {"error": {"code": "itemNotFound"}}, None
+
+        return 200, self._page(self.children[key], query, f"/drives/{key[0]}/items/{key[1]}/children"), None
+
+    def _page(self, items: list, query: str, path: str) -> dict:
+        qs = parse_qs(query)
+        skip = int((qs.pop("$skiptoken", None) or ["0"])[0])
+        size = min(int((qs.get("$top") or [self.page_size])[0]), self.page_size)
+        page = {"value": [_project(it, query) for it in items[skip:skip + size]]}
+        if skip + size < len(items):
+            # як і Graph: nextLink зберігає $select/$top
+            qs["$skiptoken"] = [str(skip + size)]
+            page["@odata.nextLink"] = f"{self.graph_base}{path}?{urlencode(qs, doseq=True, safe='$,')}"
+        return page
+
+    def handle_batch(self, groups, query, headers, body):
+        requests = json.loads(body or b"{}").get("requests", [])
+        if len(requests) > 20:
+            return 400, {"error": {"code": "invalidRequest", "message": "too many requests"}}, None
+
+        responses = []
+        for sub in requests:
+            url = sub["url"]
+            with self._lock:
+                throttled = self.throttle_paths.get(url, 0)
+                if throttled:
+                    self.throttle_paths[url] = throttled - 1
+            if throttled:
+                self.record("batch_throttled", 0)
+                status, payload, sub_headers = 429, {"error": {"code": "TooManyRequests"}}, {"Retry-After": "0"}
+            else:
+                status, payload, sub_headers = self.route(sub.get("method", "GET"), "/v1.0" + url, {}, b"")
+            responses.append({
+                "id": sub["id"],
+                "status": status,
+                "headers": dict(sub_headers or {}),
+                "body": payload,
+            })
+        return 200, {"responses": responses}, None
+
+    def handle_root_children(self, groups, query, headers, body):
+        return self.handle_children({"drive": groups["drive"], "item": ROOT_ID}, query, headers, body)
+
+    def handle_item(self, groups, query, headers, body):
+        if groups["item"] == ROOT_ID:
+            return 200, {"id": ROOT_ID, "root": {}, "folder": {}}, None
+        item = self._find_item(groups["drive"], groups["item"])
+        if item is None:
+            return 404, {"error": {"code": "itemNotFound"}}, None
+        return 200, _project(item, query), None
+
+    def handle_delta(self, groups, query, headers, body):
+        drive_id = groups["drive"]
+        log = self.delta_log.get(drive_id, [])
+        token = (parse_qs(query).get("token") or [None])[0]
+        link = f"{self.graph_base}/drives/{drive_id}/root/delta?token="
+
+        if token == "latest":
+            return 200, {"value": [], "@odata.deltaLink": f"{link}{len(log)}"}, None
+        if token is None:
+            items = [
+                _project(dict(it, parentReference={"driveId": drive_id, "id": parent_id}), query)
+                for (drive, parent_id), children in self.children.items() if drive == drive_id
+                for it in children
+            ]
+            return 200, {"value": items, "@odata.deltaLink": f"{link}{len(log)}"}, None
+
+        start = int(token)
+        if start < self.delta_floor.get(drive_id, 0):
+            return 410, {"error": {"code": "resyncRequired"}}, None
+        end = min(start + self.page_size, len(log))
+        page = {"value": log[start:end]}
+        page["@odata.nextLink" if end < len(log) else "@odata.deltaLink"] = f"{link}{end}"
+        return 200, page, None
+
+    def handle_sites(self, groups, query, headers, body):
+        return 200, {
+            "value": [{"id": site_id, "displayName": site["displayName"]} for site_id, site in self.sites.items()],
+        }, None
+
+    def handle_drives(self, groups, query, headers, body):
+        site = self.sites.get(groups["site"])
+        if site is None:
+            return 404, {"error": {"code": "itemNotFound"}}, None
+        return 200, {
+            "value": [{"id": drive_id, "name": name} for drive_id, name in site["drives"].items()],
+        }, None
+
+    def handle_search(self, groups, query, headers, body):
+        drive_id, needle = groups["drive"], groups["q"].lower()
+        found, stack = [], [groups["item"]]
+        while stack:
+            for it in self.children.get((drive_id, stack.pop()), []):
+                if needle in (it.get("name") or "").lower():
+                    found.append(it)
+                if "folder" in it:
+                    stack.append(it["id"])
+        path = f"/drives/{drive_id}/items/{groups['item']}/search(q='{groups['q']}')"
+        return 200, self._page(found, query, path), None
+
+    def handle_content(self, groups, query, headers, body):
+        item = self._find_item(groups["drive"], groups["item"])
+        if item is None or "file" not in item:
+            return 404, {"error": {"code": "itemNotFound"}}, None
+        return 200, _content_bytes(item["id"], item.get("size") or 1024), None
+
+    def handle_thumbnail(self, groups, query, headers, body):
+        item = self._find_item(groups["drive"], groups["item"])
+        if item is None or "file" not in item:
+            return 404, {"error": {"code": "itemNotFound"}}, None
+        sizes = {"small": 512, "medium": 4096, "large": 16384}
+        return 200, _content_bytes(f"{item['id']}/thumb", sizes.get(groups["size"], 4096)), None
+
+
+def _project(item: dict, query: str) -> dict:
+    """$select: лише перелічені поля (id — завжди)."""
+    select = (parse_qs(query).get("$select") or [""])[0]
+    if not select:
+        return item
+    fields = set(select.split(",")) | {"id"}
+    return {k: v for k, v in item.items() if k in fields}
+
+
+def _content_bytes(seed: str, size: int) -> bytes:
+    """Детерміновані "вміст" файлу: однаковий для того самого елемента."""
+    unit = uuid.uuid5(uuid.NAMESPACE_URL, seed).bytes
+    return (unit * (size // len(unit) + 1))[:size]
+
+
+# ---------------------------------------------------------------------------
+# Генерація дерева проектів під M365_SYNC_CHAINS
+# ---------------------------------------------------------------------------
+
+_FILE_NAMES = ("креслення.dwg", "специфікація.xlsx", "фото.jpg", "схема.png", "кошторис.pdf")
+
+
+def generate_project_tree(fake: FakeGraphServer, drive_id: str, projects: int, files_per_leaf: int = 5,
+                          seed: int = 42, site_id: str = "site-1", site_name: str = "Проекти",
+                          drive_name: str = "Документи") -> int:
+    """
+    Корінь диска з projects папок проектів; у кожній — гілки під усі ланцюги
+    (КП, В роботу, переробки) з кількома "Для КС" і files_per_leaf файлами в кожній.
+    Реєструє сайт і диск у fake.sites. Повертає кількість створених елементів.
+    """
+    rnd = random.Random(seed)
+    counter = 0
+
+    user = {"user": {"email": "designer@fake.local", "id": str(uuid.UUID(int=seed)), "displayName": "Конструктор"}}
+
+    def item(parent_id: str, name: str, folder: bool) -> dict:
+        nonlocal counter
+        counter += 1
+        created = datetime(2026, 1, 1, tzinfo=dt_timezone.utc) + timedelta(hours=counter)
+        created_s = created.isoformat().replace("+00:00", "Z")
+        # поля, які реальний Graph віддає без $select: з ними видно, скільки економить проекція
+        it = {
+            "id": f"{drive_id}-{counter:07d}",
+            "name": name,
+            "webUrl": f"https://fake.sharepoint.local/{drive_id}/{counter}",
+            "createdDateTime": created_s,
+            "lastModifiedDateTime": created_s,
+            "eTag": f'"{counter},1"',
+            "cTag": f'"c:{counter},1"',
+            "createdBy": user,
+            "lastModifiedBy": user,
+            "fileSystemInfo": {"createdDateTime": created_s, "lastModifiedDateTime": created_s},
+            "parentReference": {
+                "driveType": "documentLibrary", "driveId": drive_id, "id": parent_id, "siteId": site_id,
+            },
+        }
+        if folder:
+            it["folder"] = {"childCount": 0}
+        else:
+            it["file"] = {
+                "mimeType": "application/octet-stream",
+                "hashes": {"quickXorHash": f"{counter:028x}"},
+            }
+            it["size"] = rnd.randint(10, 2000) * 1024
+            it["@microsoft.graph.downloadUrl"] = (
+                f"https://fake.sharepoint.local/_layouts/15/download.aspx?UniqueId={uuid.UUID(int=counter)}"
+                f"&Translate=false&tempauth={'x' * 120}&ApiVersion=2.0"
+            )
+        return it
+
+    def folder(parent_id: str, name: str) -> dict:
+        it = item(parent_id, name, folder=True)
+        fake.children.setdefault((drive_id, parent_id), []).append(it)
+        fake.children.setdefault((drive_id, it["id"]), [])
+        return it
+
+    def leaf(parent_id: str, name: str):
+        ks = folder(parent_id, name)
+        for n in range(files_per_leaf):
+            name = _FILE_NAMES[n % len(_FILE_NAMES)]
+            fake.children[(drive_id, ks["id"])].append(item(ks["id"], f"{n + 1}_{name}", folder=False))
+
+    fake.children.setdefault((drive_id, ROOT_ID), [])
+    for p in range(1, projects + 1):
+        project = folder(ROOT_ID, f"Проект {p:04d}")
+        folder(project["id"], "1 Документи")
+
+        offer = folder(project["id"], "2-Комерційна пропозиція")
+        for k in range(1, rnd.randint(1, 3) + 1):
+            kp = folder(offer["id"], f"КП {k}")
+            calc = folder(kp["id"], "1 Розрахунок матеріалів")
+            leaf(calc["id"], "Для КС 1")
+
+        design = folder(project["id"], "4-Проектування")
+        folder(design["id"], "1 Ескізи")
+        in_work = folder(design["id"], "2 В роботу")
+        for k in range(1, rnd.randint(1, 3) + 1):
+            sub = folder(in_work["id"], f"Проект {k}")
+            leaf(sub["id"], "Для КС")
+
+        if p % 4 == 0:
+            leaf(folder(project["id"], "1 Креслення попередні")["id"], "Для КС")
+            leaf(folder(project["id"], "3 Креслення в роботу")["id"], "Для КС")
+
+    fake.sites.setdefault(site_id, {"displayName": site_name, "drives": {}})["drives"][drive_id] = drive_name
+    return counter
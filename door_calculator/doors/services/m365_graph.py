@@ -1,45 +1,142 @@
+import concurrent.futures
+import os
+import threading
 import requests
-import msal
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 from urllib.parse import quote
 import time
 import random
-GRAPH_BASE = "https://graph.microsoft.com/v1.0"
-
-_app = None
-
-
-def _get_app():
-    global _app
-    if _app is None:
-        _app = msal.ConfidentialClientApplication(
-            client_id=settings.M365_CLIENT_ID,
-            authority=settings.M365_AUTHORITY,
-            client_credential=settings.M365_CLIENT_SECRET,
-        )
-    return _app
-
-
-def get_app_token() -> str:
-    app = _get_app()
 
-    # cache -> client credentials
-    result = app.acquire_token_silent(settings.M365_SCOPE, account=None)
-    if not result:
-        result = app.acquire_token_for_client(scopes=settings.M365_SCOPE)
+from doors.services.m365_cache import get_children_cache, item_tag
+from doors.services.m365_limiter import get_breaker, get_limiter, parse_retry_after
+from doors.services.m365_metrics import endpoint_class, get_metrics
+from doors.services.m365_token import get_app_token, refresh_app_token
 
-    if "access_token" not in result:
-        raise RuntimeError(result)
-
-    return result["access_token"]
+GRAPH_BASE = "https://graph.microsoft.com/v1.0"
 
 RETRY_STATUS = {429, 503, 504}
-
-def graph(method: str, url_or_path: str, *, token: str = None, headers=None, params=None, data=None, json=None, timeout=20):
+# скільки веб-проксі файлів чекає на слот обмежувача, перш ніж здатися
+STREAM_WAIT = 10
+
+# ---------------------------------------------------------------------------
+# Спільний HTTP-транспорт: один requests.Session з пулом keep-alive зʼєднань
+# на процес, щоб кожен виклик Graph не робив новий TCP + TLS handshake.
+# ---------------------------------------------------------------------------
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _pool_size() -> int:
+    # стільки ж, скільки запитів обмежувач узагалі пускає в дорогу (стеля вікна AIMD)
+    return get_limiter().max_concurrency
+
+
+def get_session() -> requests.Session:
+    """Спільна сесія для Graph і uploadUrl; ретраї робить graph(), не адаптер."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                size = _pool_size()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=size, max_retries=0)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                _session = s
+    return _session
+
+
+class GraphError(RuntimeError):
+    """Помилка відповіді Graph; status_code — HTTP-код (None, якщо відповіді не було)."""
+
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class GraphUnavailable(GraphError):
+    """Запобіжник відкритий: Graph останнім часом не відповідав — запит навіть не відправлявся."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Graph is unavailable, retry in {retry_after:.0f}s", status_code=503)
+        self.retry_after = retry_after
+
+
+def _send(method: str, url: str, *, cost: int = 1, wait: float = None, **kwargs) -> requests.Response:
+    """
+    Один HTTP-запит до Graph (або uploadUrl): запобіжник → слот обмежувача → метрики.
+    wait — скільки максимум чекати на слот; не дочекались — GraphError(429).
+    """
+    retry_in = get_breaker().allow()
+    if retry_in:
+        raise GraphUnavailable(retry_in)
+
+    limiter = get_limiter()
+    if not limiter.acquire(cost, timeout=wait):
+        get_breaker().abandon()
+        raise GraphError("Graph is throttling requests, try again later", status_code=429)
+
+    r = None
+    started = time.perf_counter()
+    try:
+        r = get_session().request(method, url, **kwargs)
+        return r
+    finally:
+        status = r.status_code if r is not None else None
+        limiter.release(status, parse_retry_after(r.headers.get("Retry-After")) if r is not None else None)
+
+        if status is None or status >= 500:
+            get_breaker().failure()
+        elif status == 429:
+            get_breaker().abandon()
+        else:
+            get_breaker().success()
+
+        size = len(kwargs["data"]) if isinstance(kwargs.get("data"), (bytes, bytearray)) else 0
+        if r is not None:
+            # тіло стріму не читаємо — беремо Content-Length
+            size += int(r.headers.get("Content-Length") or 0) if kwargs.get("stream") else len(r.content)
+        get_metrics().record(endpoint_class(method, url), (time.perf_counter() - started) * 1000, status, size)
+
+
+def graph_stream(url: str, token: str = None, *, timeout=60, headers=None, **kwargs) -> requests.Response:
+    """
+    GET зі stream=True через спільну сесію (вміст файлів, мініатюри).
+    token=None — без Authorization (pre-authenticated downloadUrl).
+    Відповідь треба дочитати або закрити, щоб зʼєднання повернулося в пул.
+    Слот обмежувача тримається лише до заголовків; якщо Graph тротлить довше за
+    STREAM_WAIT — GraphError(429), якщо відкритий запобіжник — GraphUnavailable.
+    """
+    h = dict(headers or {})
+    if token:
+        h["Authorization"] = f"Bearer {token}"
+    return _send("GET", url, wait=STREAM_WAIT, headers=h, stream=True, timeout=timeout, **kwargs)
+
+
+def iter_response(r: requests.Response, chunk_size: int = 1024 * 256):
+    """Віддає тіло відповіді шматками і завжди закриває її (навіть якщо клієнт відвалився)."""
+    try:
+        for chunk in r.iter_content(chunk_size=chunk_size):
+            if chunk:
+                yield chunk
+    finally:
+        r.close()
+
+
+def graph(method: str, url_or_path: str, *, token: str = None, headers=None, params=None, data=None, json=None,
+          timeout=20, cost: int = 1):
+    """
+    Запит до Graph через спільний обмежувач (m365_limiter) з повторами на 429/503/504.
+    cost — скільки запитів Graph зарахує (для $batch — кількість підзапитів).
+    """
     url = url_or_path if url_or_path.startswith("http") else (GRAPH_BASE + url_or_path)
 
-    if token is None:
-        token = get_app_token()  # <-- твоя функція
+    # спільний токен застосунку можна оновити після 401; переданий ззовні — ні
+    own_token = token is None
+    if own_token:
+        token = get_app_token()
 
     if not token or not str(token).strip():
         raise RuntimeError("M365 Graph token is empty. Check get_app_token() and app credentials.")
@@ -52,36 +149,81 @@ def graph(method: str, url_or_path: str, *, token: str = None, headers=None, par
     base_delay = 1.0
 
     for attempt in range(1, max_attempts + 1):
-        r = requests.request(method, url, headers=h, params=params, data=data, json=json, timeout=timeout)
+        r = _send(method, url, cost=cost, headers=h, params=params, data=data, json=json, timeout=timeout)
 
         if r.status_code in RETRY_STATUS:
-            retry_after = r.headers.get("Retry-After")
-            if retry_after:
-                try:
-                    delay = float(retry_after)
-                except Exception:
-                    delay = base_delay
-            else:
-                delay = min(base_delay * (2 ** (attempt - 1)), 30.0) + random.uniform(0, 0.5)
-
             if attempt == max_attempts:
-                raise RuntimeError(f"HTTP {r.status_code}: {r.text}")
+                raise GraphError(f"HTTP {r.status_code}: {r.text}", status_code=r.status_code)
 
-            time.sleep(delay)
+            get_metrics().record_retry(endpoint_class(method, url))
+            # Retry-After обмежувач витримує для всіх потоків — наступний _send() і так зачекає
+            if parse_retry_after(r.headers.get("Retry-After")) is None:
+                time.sleep(min(base_delay * (2 ** (attempt - 1)), 30.0) + random.uniform(0, 0.5))
+            continue
+
+        if r.status_code == 401 and own_token:
+            # токен відкликали/протух раніше expires_at — беремо новий один раз
+            own_token = False
+            token = refresh_app_token(rejected=token)
+            h["Authorization"] = f"Bearer {token}"
             continue
 
         if r.status_code >= 400:
-            raise RuntimeError(f"HTTP {r.status_code}: {r.text}")
+            raise GraphError(f"HTTP {r.status_code}: {r.text}", status_code=r.status_code)
 
         if not r.text:
             return {}
         return r.json()
 
+
+def item_content_url(drive_id: str, item_id: str) -> str:
+    return f"{GRAPH_BASE}/drives/{drive_id}/items/{item_id}/content"
+
+
+def item_thumbnail_url(drive_id: str, item_id: str, size: str = "medium") -> str:
+    return f"{GRAPH_BASE}/drives/{drive_id}/items/{item_id}/thumbnails/0/{size}/content"
+
+
 def graph_get(path: str, **kwargs):
     # path типу: "/sites?search=*"
     return graph("GET", f"{GRAPH_BASE}{path}", **kwargs)
 
 
+# ---------------------------------------------------------------------------
+# Проекції ($select) і розмір сторінки ($top): тягнемо лише поля, які читає код
+# ---------------------------------------------------------------------------
+
+# обхід папок (sync), резолвери у views і кеш дітей: тип, назва, посилання, мітки змін
+ITEM_SELECT = "id,name,folder,file,size,webUrl,createdDateTime,lastModifiedDateTime,eTag,cTag,parentReference"
+# delta: те саме + ознака видалення
+DELTA_SELECT = ITEM_SELECT + ",deleted"
+
+
+def page_size() -> int | None:
+    """$top для колекцій (M365_PAGE_SIZE); 0 — розмір сторінки за замовчуванням Graph."""
+    return int(getattr(settings, "M365_PAGE_SIZE", 0) or 0) or None
+
+
+def with_query(path: str, select: str = None, top: int = None) -> str:
+    """Додає $select/$top до шляху (у т.ч. до підзапиту $batch)."""
+    params = []
+    if select:
+        params.append(f"$select={select}")
+    if top:
+        params.append(f"$top={int(top)}")
+    if not params:
+        return path
+    return path + ("&" if "?" in path else "?") + "&".join(params)
+
+
+def children_path(drive_id: str, item_id: str, select: str = ITEM_SELECT, top: int = None) -> str:
+    return with_query(f"/drives/{drive_id}/items/{item_id}/children", select, top or page_size())
+
+
+def search_path(drive_id: str, folder_id: str, q: str, select: str = ITEM_SELECT, top: int = None) -> str:
+    return with_query(f"/drives/{drive_id}/items/{folder_id}/search(q='{quote(q)}')", select, top or page_size())
+
+
 def graph_get_all_pages(path: str) -> list:
     items = []
     url = f"{GRAPH_BASE}{path}"
@@ -110,17 +252,276 @@ def pick_drive(site_id: str, drive_name: str) -> dict:
     return drives[0]
 
 
-def list_children(drive_id: str, item_id: str) -> list:
-    return graph_get_all_pages(f"/drives/{drive_id}/items/{item_id}/children")
+# метадані папки для перевірки кешу дітей
+TAG_SELECT = "id,eTag,cTag"
+
+
+def list_children(drive_id: str, item_id: str, *, select: str = ITEM_SELECT, use_cache: bool = True) -> list:
+    """
+    Діти папки (поля select; None — повні driveItem-и). Зі стандартною проекцією і use_cache —
+    через кеш процесу (m365_cache): свіжий запис без Graph, протермінований — лише GET мітки
+    папки, якщо вона не змінилася.
+    """
+    path = children_path(drive_id, item_id, select)
+    cache = get_children_cache()
+    if not use_cache or select != ITEM_SELECT or cache.ttl <= 0:
+        return graph_get_all_pages(path)
+
+    entry = cache.get(drive_id, item_id)
+    tag = cache.seen_tag(drive_id, item_id)
+    if entry is not None:
+        if entry.fresh:
+            cache.note("hits")
+            return list(entry.items)
+        if entry.tag:
+            try:
+                tag = item_tag(graph_get(f"/drives/{drive_id}/items/{item_id}?$select={TAG_SELECT}"))
+            except GraphError:
+                tag = None
+            if tag == entry.tag:
+                cache.refresh(drive_id, item_id)
+                cache.note("revalidated")
+                return list(entry.items)
+
+    cache.note("misses")
+    items = graph_get_all_pages(path)
+    # мітка, побачена ДО читання: якщо папка змінилася посередині — наступна перевірка перечитає
+    cache.put(drive_id, item_id, items, tag)
+    return items
 
 
-def list_root_children(drive_id: str) -> list:
-    return graph_get_all_pages(f"/drives/{drive_id}/root/children")
+def list_root_children(drive_id: str, *, select: str = ITEM_SELECT) -> list:
+    return graph_get_all_pages(with_query(f"/drives/{drive_id}/root/children", select, page_size()))
+
+
+def search_in_folder(drive_id: str, folder_id: str, q: str, *, select: str = ITEM_SELECT) -> list:
+    return graph_get_all_pages(search_path(drive_id, folder_id, q, select))
+
+
+# ---------------------------------------------------------------------------
+# JSON $batch: до 20 незалежних GET в одному HTTP-запиті
+# ---------------------------------------------------------------------------
+
+BATCH_LIMIT = 20
+BATCH_MAX_ATTEMPTS = 6
+
+
+def _relative_url(url: str) -> str | None:
+    """Підзапит $batch приймає шлях відносно /v1.0; чужий хост — None."""
+    if url.startswith(GRAPH_BASE):
+        return url[len(GRAPH_BASE):]
+    if url.startswith("/"):
+        return url
+    return None
+
+
+def graph_batch(paths: list[str], *, token: str = None) -> list[dict]:
+    """
+    Один POST /$batch для ≤ BATCH_LIMIT GET-запитів.
+    Повертає відповіді в порядку paths: {"status": int, "headers": dict, "body": dict}.
+    Повтори (throttling самого $batch) — як у graph(); 429 окремих підзапитів — на рівні вище.
+    """
+    if len(paths) > BATCH_LIMIT:
+        raise ValueError(f"Graph $batch accepts at most {BATCH_LIMIT} requests")
+
+    payload = {"requests": [{"id": str(i), "method": "GET", "url": p} for i, p in enumerate(paths)]}
+    # Graph рахує кожен підзапит $batch як окремий запит
+    data = graph("POST", f"{GRAPH_BASE}/$batch", token=token, json=payload, timeout=60, cost=len(paths))
+
+    out = [{"status": 599, "headers": {}, "body": {}} for _ in paths]
+    for resp in data.get("responses", []):
+        out[int(resp["id"])] = {
+            "status": int(resp.get("status") or 0),
+            "headers": resp.get("headers") or {},
+            "body": resp.get("body") or {},
+        }
+    return out
+
+
+def _sub_retry_delay(resp: dict, attempt: int) -> float:
+    retry_after = {k.lower(): v for k, v in resp["headers"].items()}.get("retry-after")
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return min(2 ** (attempt - 1), 30.0) + random.uniform(0, 0.5)
+
+
+def batch_get(paths: list[str], *, token: str = None, max_workers: int = None) -> list:
+    """
+    GET кожного шляху з paths через $batch (по BATCH_LIMIT у батчі).
+    Підзапити з 429/503/504 повторюються наступним раундом; Retry-After (або бекоф)
+    ставить на паузу спільний обмежувач, тож чекають усі потоки, а не лише цей.
+    Батчі одного раунду йдуть паралельно (max_workers, за замовчуванням M365_SYNC_WORKERS).
+    Повертає список у порядку paths: тіло відповіді (dict) або GraphError для невдалого шляху.
+    """
+    if max_workers is None:
+        max_workers = getattr(settings, "M365_SYNC_WORKERS", 4)
+
+    results: list = [None] * len(paths)
+    # (індекс шляху, спроба)
+    pending = [(i, 1) for i in range(len(paths))]
+
+    while pending:
+        chunks = [pending[i:i + BATCH_LIMIT] for i in range(0, len(pending), BATCH_LIMIT)]
+        responses = []
+
+        def collect(chunk, get_result):
+            try:
+                responses.extend(zip(chunk, get_result()))
+            except GraphError as e:
+                for idx, _ in chunk:
+                    results[idx] = e
+
+        if max_workers <= 1 or len(chunks) == 1:
+            # один батч (або виклик з потоку AsyncGraphClient) — у поточному потоці, без пулу
+            for chunk in chunks:
+                collect(chunk, lambda: graph_batch([paths[idx] for idx, _ in chunk], token=token))
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+                futures = [pool.submit(graph_batch, [paths[idx] for idx, _ in chunk], token=token) for chunk in chunks]
+                for chunk, future in zip(chunks, futures):
+                    collect(chunk, future.result)
+
+        pending = []
+        for (idx, attempt), resp in responses:
+            status, body = resp["status"], resp["body"]
+
+            if status in RETRY_STATUS and attempt < BATCH_MAX_ATTEMPTS:
+                get_limiter().throttle(_sub_retry_delay(resp, attempt))
+                get_metrics().record_retry("batch", throttled=status == 429)
+                pending.append((idx, attempt + 1))
+            elif status >= 400:
+                results[idx] = GraphError(f"HTTP {status}: {body}", status_code=status)
+            else:
+                results[idx] = body
+
+    return results
+
+
+def batch_get_all_pages(paths: list[str], *, token: str = None, max_workers: int = None) -> list:
+    """
+    Усі сторінки для кожного шляху з paths через $batch: продовження (@odata.nextLink)
+    потрапляють у наступні раунди разом з іншими запитами.
+    Повертає список у порядку paths: list елементів або GraphError для невдалого шляху.
+    """
+    results: list = [[] for _ in paths]
+    pending = list(enumerate(paths))
+
+    while pending:
+        bodies = batch_get([url for _, url in pending], token=token, max_workers=max_workers)
+        next_pending = []
+        for (idx, _), body in zip(pending, bodies):
+            if isinstance(body, GraphError):
+                results[idx] = body
+                continue
+
+            results[idx].extend(body.get("value", []))
+            next_link = body.get("@odata.nextLink")
+            if not next_link:
+                continue
+
+            rel = _relative_url(next_link)
+            if rel is not None:
+                next_pending.append((idx, rel))
+                continue
+            try:
+                while next_link:
+                    page = graph("GET", next_link, token=token)
+                    results[idx].extend(page.get("value", []))
+                    next_link = page.get("@odata.nextLink")
+            except GraphError as e:
+                results[idx] = e
+        pending = next_pending
+
+    return results
+
+
+def batch_list_children(drive_id: str, item_ids: list[str], *, select: str = ITEM_SELECT,
+                        use_cache: bool = True, **kwargs) -> dict:
+    """
+    {item_id: [діти] або GraphError} для багатьох папок одним-кількома $batch.
+    Кеш — як у list_children: мітки протермінованих записів перевіряються одним $batch.
+    """
+    ids = list(dict.fromkeys(item_ids))
+    cache = get_children_cache()
+    if not use_cache or select != ITEM_SELECT or cache.ttl <= 0:
+        pages = batch_get_all_pages([children_path(drive_id, i, select) for i in ids], **kwargs)
+        return dict(zip(ids, pages))
+
+    out = {}
+    tags = {}
+    stale = {}
+    for i in ids:
+        entry = cache.get(drive_id, i)
+        tags[i] = cache.seen_tag(drive_id, i)
+        if entry is not None and entry.fresh:
+            cache.note("hits")
+            out[i] = list(entry.items)
+        elif entry is not None and entry.tag:
+            stale[i] = entry
+
+    if stale:
+        metas = batch_get_items(drive_id, list(stale), select=TAG_SELECT, **kwargs)
+        for i, entry in stale.items():
+            meta = metas.get(i)
+            tags[i] = None if isinstance(meta, GraphError) else item_tag(meta)
+            if tags[i] == entry.tag:
+                cache.refresh(drive_id, i)
+                cache.note("revalidated")
+                out[i] = list(entry.items)
+
+    missing = [i for i in ids if i not in out]
+    if missing:
+        pages = batch_get_all_pages([children_path(drive_id, i) for i in missing], **kwargs)
+        for i, page in zip(missing, pages):
+            cache.note("misses")
+            if not isinstance(page, GraphError):
+                cache.put(drive_id, i, page, tags[i])
+            out[i] = page
+
+    return {i: out[i] for i in ids}
+
+
+def batch_get_items(drive_id: str, item_ids: list[str], select: str = None, **kwargs) -> dict:
+    """{item_id: driveItem або GraphError} — метадані багатьох елементів через $batch."""
+    ids = list(dict.fromkeys(item_ids))
+    query = f"?$select={select}" if select else ""
+    return dict(zip(ids, batch_get([f"/drives/{drive_id}/items/{i}{query}" for i in ids], **kwargs)))
+
+
+def batch_search_in_folder(drive_id: str, queries: list[tuple[str, str]], *, select: str = ITEM_SELECT,
+                           **kwargs) -> dict:
+    """{(folder_id, q): [результати] або GraphError} — search_in_folder для багатьох пар."""
+    keys = list(dict.fromkeys(queries))
+    paths = [search_path(drive_id, folder_id, q, select) for folder_id, q in keys]
+    return dict(zip(keys, batch_get_all_pages(paths, **kwargs)))
+
+
+# ---------------------------------------------------------------------------
+# Delta: зміни на диску з моменту попереднього deltaLink
+# ---------------------------------------------------------------------------
+
+def drive_delta(drive_id: str, delta_link: str = None, select: str = DELTA_SELECT) -> tuple[list, str]:
+    """
+    Змінені driveItem-и диска з моменту delta_link (без нього — весь диск) і новий deltaLink.
+    select діє лише на перший запит — nextLink/deltaLink Graph повертає вже з ним.
+    Протермінований токен Graph повертає 410 → GraphError(status_code=410).
+    """
+    url = delta_link or (GRAPH_BASE + with_query(f"/drives/{drive_id}/root/delta", select, page_size()))
+    items = []
+    while True:
+        data = graph("GET", url, timeout=60)
+        items.extend(data.get("value", []))
+        if data.get("@odata.nextLink"):
+            url = data["@odata.nextLink"]
+            continue
+        return items, data.get("@odata.deltaLink")
 
 
-def search_in_folder(drive_id: str, folder_id: str, q: str) -> list:
-    q_enc = quote(q)
-    return graph_get_all_pages(f"/drives/{drive_id}/items/{folder_id}/search(q='{q_enc}')")
+def drive_delta_latest(drive_id: str) -> str:
+    """deltaLink на "зараз" без переліку всього диска — точка відліку після повної синхронізації."""
+    data = graph("GET", GRAPH_BASE + with_query(f"/drives/{drive_id}/root/delta?token=latest", DELTA_SELECT))
+    return data.get("@odata.deltaLink")
 
 
 def graph_put(path: str, **kwargs):
@@ -128,10 +529,282 @@ def graph_put(path: str, **kwargs):
     return graph("PUT", f"{GRAPH_BASE}{path}", **kwargs)
 
 
+def _safe_upload_name(filename: str) -> str:
+    return filename.replace("\\", "_").replace("/", "_")
+
+
+def _upload_path(drive_id: str, folder_id: str, filename: str, action: str) -> str:
+    """.../items/{folder}:/{імʼя}:/{action}; імʼя з # % ? інакше зламало б URL."""
+    return f"/drives/{drive_id}/items/{folder_id}:/{quote(_safe_upload_name(filename))}:/{action}"
+
+
+def _json_or_none(r) -> dict | None:
+    """Тіло відповіді як JSON; HTML/порожнє тіло від проксі чи 5xx — None."""
+    try:
+        return r.json() if r.text else None
+    except ValueError:
+        return None
+
+
 def upload_bytes_to_folder(drive_id: str, folder_id: str, filename: str, content: bytes,
                            content_type="application/pdf"):
-    # overwrite/upload
-    safe_name = filename.replace("\\", "_").replace("/", "_")
-    path = f"/drives/{drive_id}/items/{folder_id}:/{safe_name}:/content"
+    # overwrite/upload; великі файли — через upload session
+    if len(content) > SIMPLE_UPLOAD_LIMIT:
+        return upload_stream_to_folder(drive_id, folder_id, filename, content, size=len(content))
+
+    path = _upload_path(drive_id, folder_id, filename, "content")
     headers = {"Content-Type": content_type}
-    return graph_put(path, data=content, headers=headers)
+    try:
+        return graph_put(path, data=content, headers=headers)
+    finally:
+        # навіть після помилки файл міг зʼявитися — перелік папки більше не довіряємо
+        get_children_cache().invalidate(drive_id, folder_id)
+
+
+# ---------------------------------------------------------------------------
+# Upload sessions (великі файли шматками)
+# ---------------------------------------------------------------------------
+
+# простий PUT .../content Graph приймає лише до 4 МБ
+SIMPLE_UPLOAD_LIMIT = 4 * 1024 * 1024
+# розмір шматка в upload session має бути кратним 320 KiB
+UPLOAD_CHUNK_UNIT = 320 * 1024
+DEFAULT_UPLOAD_CHUNK = UPLOAD_CHUNK_UNIT * 16  # 5 MiB
+
+
+def create_upload_session(drive_id: str, folder_id: str, filename: str,
+                          conflict_behavior: str = "replace", token: str = None) -> dict:
+    path = _upload_path(drive_id, folder_id, filename, "createUploadSession")
+    body = {"item": {"@microsoft.graph.conflictBehavior": conflict_behavior}}
+    return graph("POST", f"{GRAPH_BASE}{path}", token=token, json=body)
+
+
+def _source_size(source) -> int | None:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    if hasattr(source, "seek") and hasattr(source, "tell"):
+        try:
+            pos = source.tell()
+            source.seek(0, 2)
+            end = source.tell()
+            source.seek(pos)
+            return end - pos
+        except (OSError, ValueError):
+            return None
+    return None
+
+
+class _ChunkReader:
+    """
+    Віддає джерело (bytes / файл / генератор шматків) порціями chunk_size.
+    У памʼяті тримається тільки поточна порція.
+    """
+
+    def __init__(self, source, chunk_size: int):
+        self.chunk_size = chunk_size
+        self._buf = bytearray()
+        self._fh = None
+        self._it = None
+        self._start = 0
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._data = memoryview(source)
+        else:
+            self._data = None
+            if hasattr(source, "read"):
+                self._fh = source
+                self._start = source.tell() if hasattr(source, "tell") else 0
+            else:
+                self._it = iter(source)
+
+    @property
+    def seekable(self) -> bool:
+        if self._data is not None:
+            return True
+        return bool(self._fh is not None and getattr(self._fh, "seekable", lambda: False)())
+
+    def read_at(self, offset: int) -> bytes:
+        """Порція, що починається з offset (для bytes/файлів — довільний offset)."""
+        if self._data is not None:
+            return bytes(self._data[offset:offset + self.chunk_size])
+        if self._fh is not None:
+            if self.seekable:
+                self._fh.seek(self._start + offset)
+            return self._fh.read(self.chunk_size) or b""
+
+        # генератор: лише послідовно
+        while len(self._buf) < self.chunk_size:
+            try:
+                piece = next(self._it)
+            except StopIteration:
+                break
+            if piece:
+                self._buf.extend(piece)
+        out = bytes(self._buf[:self.chunk_size])
+        del self._buf[:self.chunk_size]
+        return out
+
+
+def _next_expected_offset(status: dict) -> int | None:
+    ranges = (status or {}).get("nextExpectedRanges") or []
+    if not ranges:
+        return None
+    try:
+        return int(str(ranges[0]).split("-")[0])
+    except ValueError:
+        return None
+
+
+def upload_stream_to_folder(drive_id: str, folder_id: str, filename: str, source, size: int = None,
+                            chunk_size: int = DEFAULT_UPLOAD_CHUNK, max_retries: int = 5,
+                            retry_delay: float = 1.0, token: str = None, on_progress=None) -> dict:
+    """
+    Завантаження через Graph upload session шматками фіксованого розміру.
+
+    source: bytes, файловий обʼєкт (rb) або ітератор/генератор шматків bytes.
+    size: обовʼязковий для генераторів і не-seekable потоків.
+    Після тимчасового збою (мережа, 5xx, 429) питаємо в сесії nextExpectedRanges
+    і продовжуємо з потрібного байта, а не з початку.
+    on_progress(uploaded_bytes, total_bytes) — необовʼязковий колбек.
+    Повертає driveItem створеного файлу.
+    """
+    try:
+        return _upload_stream(drive_id, folder_id, filename, source, size, chunk_size,
+                              max_retries, retry_delay, token, on_progress)
+    finally:
+        get_children_cache().invalidate(drive_id, folder_id)
+
+
+def _upload_stream(drive_id, folder_id, filename, source, size, chunk_size, max_retries, retry_delay,
+                   token, on_progress) -> dict:
+    total = size if size is not None else _source_size(source)
+    if total is None:
+        raise ValueError("size is required for generators and non-seekable streams")
+
+    if total == 0:
+        # порожній файл сесією не завантажити — звичайний PUT
+        return graph_put(_upload_path(drive_id, folder_id, filename, "content"), data=b"", token=token)
+
+    chunk_size = max(UPLOAD_CHUNK_UNIT, (chunk_size // UPLOAD_CHUNK_UNIT) * UPLOAD_CHUNK_UNIT)
+    reader = _ChunkReader(source, chunk_size)
+
+    session = create_upload_session(drive_id, folder_id, filename, token=token)
+    upload_url = session["uploadUrl"]
+
+    offset = 0
+    chunk = reader.read_at(0)
+    chunk_offset = 0
+    failures = 0
+
+    while True:
+        piece = chunk[offset - chunk_offset:]
+        if not piece and total > 0:
+            raise GraphError(f"Upload source ended at {offset} of {total} bytes")
+        end = offset + len(piece) - 1
+
+        try:
+            # uploadUrl вже містить авторизацію — Authorization не передаємо
+            r = _send(
+                "PUT",
+                upload_url,
+                data=piece,
+                headers={
+                    "Content-Length": str(len(piece)),
+                    "Content-Range": f"bytes {offset}-{end}/{total}",
+                },
+                timeout=120,
+            )
+            transient = r.status_code in RETRY_STATUS or r.status_code >= 500
+            error = None if not transient else f"HTTP {r.status_code}: {r.text}"
+        except requests.RequestException as e:
+            r = None
+            transient = True
+            error = str(e)
+
+        if not transient:
+            if r.status_code >= 400:
+                raise GraphError(f"HTTP {r.status_code}: {r.text}", status_code=r.status_code)
+
+            failures = 0
+            if r.status_code in (200, 201):
+                if on_progress:
+                    on_progress(total, total)
+                return r.json() if r.text else {}
+
+            next_offset = _next_expected_offset(_json_or_none(r))
+            if next_offset is None:
+                next_offset = end + 1
+        else:
+            failures += 1
+            if failures > max_retries:
+                raise GraphError(f"Upload of '{filename}' failed at byte {offset}: {error}",
+                                 status_code=getattr(r, "status_code", None))
+
+            # Retry-After вже витримує обмежувач (пауза для всіх потоків)
+            if r is None or parse_retry_after(r.headers.get("Retry-After")) is None:
+                time.sleep(retry_delay * (2 ** (failures - 1)))
+
+            # скільки сервер реально прийняв; не-JSON відповідь — зсув невідомий
+            try:
+                status = _send("GET", upload_url, timeout=30)
+                next_offset = _next_expected_offset(_json_or_none(status)) if status.ok else None
+            except requests.RequestException:
+                next_offset = None
+            if next_offset is None:
+                next_offset = offset
+
+        if on_progress:
+            on_progress(next_offset, total)
+
+        chunk_end = chunk_offset + len(chunk)
+        if chunk_offset <= next_offset < chunk_end:
+            offset = next_offset
+            continue
+
+        if next_offset < chunk_offset and not reader.seekable:
+            raise GraphError(f"Cannot resume '{filename}' from byte {next_offset}: source is not seekable")
+
+        if next_offset != chunk_end and not reader.seekable:
+            raise GraphError(f"Unexpected resume offset {next_offset} for '{filename}'")
+
+        chunk = reader.read_at(next_offset)
+        chunk_offset = offset = next_offset
+
+
+def upload_file_to_folder(drive_id: str, folder_id: str, path: str, filename: str = None, **kwargs) -> dict:
+    """Локальний файл у папку; читається шматками, без завантаження в памʼять цілком."""
+    with open(path, "rb") as fh:
+        return upload_stream_to_folder(drive_id, folder_id, filename or os.path.basename(path), fh, **kwargs)
+
+
+def upload_many_to_folder(uploads: list[dict], max_workers: int = None) -> list[dict]:
+    """
+    Паралельне завантаження кількох файлів.
+    uploads: [{"drive_id", "folder_id", "filename", "source" | "path", "size"?}, ...]
+    Повертає driveItem-и в тому ж порядку; якщо щось не вдалося — GraphError після
+    завершення решти завантажень.
+    """
+    if max_workers is None:
+        max_workers = getattr(settings, "M365_SYNC_WORKERS", 4)
+
+    def _one(u: dict) -> dict:
+        kwargs = {k: v for k, v in u.items() if k not in ("drive_id", "folder_id", "filename", "source", "path")}
+        if u.get("path"):
+            return upload_file_to_folder(u["drive_id"], u["folder_id"], u["path"], u.get("filename"), **kwargs)
+        return upload_stream_to_folder(u["drive_id"], u["folder_id"], u["filename"], u["source"], **kwargs)
+
+    results = [None] * len(uploads)
+    errors = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {pool.submit(_one, u): idx for idx, u in enumerate(uploads)}
+        for future in concurrent.futures.as_completed(futures):
+            idx = futures[future]
+            try:
+                results[idx] = future.result()
+            except Exception as e:
+                name = uploads[idx].get("filename") or uploads[idx].get("path")
+                errors.append(f"{name}: {e}")
+
+    if errors:
+        raise GraphError("Upload failed: " + "; ".join(errors))
+    return results
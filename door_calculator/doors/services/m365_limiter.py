@@ -0,0 +1,236 @@
+"""
+Спільний для всього процесу адаптивний обмежувач викликів Graph.
+
+Кожен HTTP-запит до Graph (graph(), $batch, шматки upload, проксі файлів) спершу
+бере слот тут:
+  - token bucket — не більше rate запитів/с (з запасом burst; rate=0 — без межі);
+  - вікно конкурентності (AIMD) — скільки запитів одночасно "в дорозі":
+    успіх розширює вікно на 1/window (і rate на rate_step), 429/503/504 —
+    урізає вікно й rate вдвічі (не частіше за раз на DECREASE_INTERVAL);
+  - Retry-After ставить на паузу ВСІ потоки, а не лише той, що отримав 429.
+Так воркери не "добивають" Graph, поки інші чекають, а швидкість сама
+підлаштовується під межі тенанта. snapshot() — поточний стан і лічильники.
+
+Тут же CircuitBreaker — запобіжник на випадок, коли Graph/SharePoint деградує.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+THROTTLE_STATUS = {429, 503, 504}
+# кілька 429 від запитів, що вже були в дорозі, — це одна подія перевантаження
+DECREASE_INTERVAL = 1.0
+
+
+class AdaptiveLimiter:
+    def __init__(self, rate: float, burst: float = None, max_concurrency: int = 8,
+                 min_rate: float = 0.5, rate_step: float = None):
+        self.max_rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.rate = self.max_rate
+        self.rate_step = float(rate_step) if rate_step else self.max_rate / 100
+        self.burst = float(burst or max(1.0, self.max_rate))
+        self.max_concurrency = max(1, int(max_concurrency))
+
+        self.window = float(self.max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    # ---------- слот ----------
+    def acquire(self, cost: float = 1, timeout: float = None) -> bool:
+        """Чекає на слот; cost — скільки токенів (підзапити $batch рахуються окремо)."""
+        cost = min(float(cost), self.burst)
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.in_flight >= max(1, int(self.window)):
+                    wait = None  # до release()
+                elif self.max_rate and self._tokens < cost:
+                    wait = (cost - self._tokens) / self.rate
+                else:
+                    if self.max_rate:
+                        self._tokens -= cost
+                    self.in_flight += 1
+                    self.requests += 1
+                    self.waited += now - started
+                    return True
+
+                if deadline is not None:
+                    left = deadline - now
+                    if left <= 0:
+                        return False
+                    wait = left if wait is None else min(wait, left)
+                self._cond.wait(wait)
+
+    def release(self, status: int = None, retry_after: float = None):
+        """Повертає слот; status/retry_after — результат запиту (None — мережева помилка)."""
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            if status in THROTTLE_STATUS:
+                self._on_throttle(retry_after)
+            elif status is not None and status < 400:
+                self.window = min(float(self.max_concurrency), self.window + 1 / max(self.window, 1.0))
+                self.rate = min(self.max_rate, self.rate + self.rate_step)
+            self._cond.notify_all()
+
+    def throttle(self, retry_after: float = None):
+        """429 без окремого слоту (підзапит усередині $batch)."""
+        with self._cond:
+            self._on_throttle(retry_after)
+            self._cond.notify_all()
+
+    # ---------- стан ----------
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "rate": round(self.rate, 2),
+                "max_rate": self.max_rate,
+                "window": round(self.window, 2),
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 2),
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "waited_s": round(self.waited, 2),
+            }
+
+    # ---------- внутрішнє ----------
+    def _refill(self, now: float):
+        if not self.max_rate:
+            return
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _on_throttle(self, retry_after):
+        now = time.monotonic()
+        self.throttled += 1
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + float(retry_after))
+        if now - self._last_decrease >= DECREASE_INTERVAL:
+            self._last_decrease = now
+            self.window = max(1.0, self.window / 2)
+            self.rate = max(self.min_rate, self.rate / 2)
+
+
+class CircuitBreaker:
+    """
+    Запобіжник: після threshold поспіль невдалих запитів (мережа, таймаут, 5xx)
+    на cooldown секунд усі виклики Graph одразу отримують відмову замість того,
+    щоб висіти на таймаутах (веб-воркери не накопичуються, поки SharePoint лежить).
+    Після cooldown пропускається один пробний запит: успіх закриває, невдача — знову cooldown.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30):
+        self.threshold = max(1, int(threshold))
+        self.cooldown = float(cooldown)
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> float:
+        """0 — можна йти в Graph; інакше — скільки секунд лишилося до наступної спроби."""
+        with self._lock:
+            if self.failures < self.threshold:
+                return 0.0
+            left = self._open_until - time.monotonic()
+            if left > 0 or self._probing:
+                self.rejected += 1
+                return max(left, 1.0)
+            self._probing = True
+            return 0.0
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.threshold:
+                if self._open_until <= time.monotonic():
+                    self.opened += 1
+                self._open_until = time.monotonic() + self.cooldown
+
+    def abandon(self):
+        """Запит не відбувся / нічого не сказав про стан Graph (наприклад, 429)."""
+        with self._lock:
+            self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.failures < self.threshold:
+                return "closed"
+            return "open" if self._open_until > time.monotonic() else "half-open"
+
+    def snapshot(self) -> dict:
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "failures": self.failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "open_for": round(max(0.0, self._open_until - time.monotonic()), 1),
+            }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+_breaker = None
+
+
+def get_limiter() -> AdaptiveLimiter:
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = AdaptiveLimiter(
+                    rate=getattr(settings, "M365_RATE_LIMIT", 50),
+                    burst=getattr(settings, "M365_RATE_BURST", None),
+                    # як пул зʼєднань сесії: воркери синхронізації + веб-проксі
+                    max_concurrency=getattr(settings, "M365_MAX_CONCURRENCY", None)
+                    or int(getattr(settings, "M365_SYNC_WORKERS", 4) or 1) + 4,
+                )
+    return _limiter
+
+
+def get_breaker() -> CircuitBreaker:
+    global _breaker
+    if _breaker is None:
+        with _limiter_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    threshold=getattr(settings, "M365_BREAKER_THRESHOLD", 5),
+                    cooldown=getattr(settings, "M365_BREAKER_COOLDOWN", 30),
+                )
+    return _breaker
+
+
+def parse_retry_after(value) -> float | None:
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
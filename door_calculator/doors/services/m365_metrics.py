@@ -0,0 +1,239 @@
+"""
+Метрики викликів Microsoft Graph за класами endpoint-ів (children, search, batch, upload, ...).
+
+Кожен HTTP-запит до Graph (m365_graph._send) пише сюди кількість, латентність
+(гістограма з фіксованими межами), помилки, 429, повтори й байти. У памʼяті процесу
+лише приріст з моменту останнього скидання; flush_metrics() додає його до
+M365GraphMetric (рядок на годину × процес × endpoint), тож m365_stats і адмінка
+бачать і веб, і worker_m365. Скидання — раз на FLUSH_INTERVAL у фоновому потоці
+та наприкінці sync_m365_orders.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from doors.models import M365GraphMetric
+
+logger = logging.getLogger(__name__)
+
+# верхні межі кошиків латентності, мс; останній кошик — усе, що довше
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+FLUSH_INTERVAL = float(getattr(settings, "M365_METRICS_FLUSH_INTERVAL", 60))
+
+_ENDPOINTS = [
+    ("batch", re.compile(r"/\$batch$")),
+    ("delta", re.compile(r"/delta(\?|$)")),
+    ("search", re.compile(r"/search\(")),
+    ("children", re.compile(r"/children(\?|$)")),
+    ("thumbnail", re.compile(r"/thumbnails/")),
+    ("upload", re.compile(r":/(content|createUploadSession)$")),
+    ("content", re.compile(r"/content(\?|$)")),
+    ("item", re.compile(r"/(items/[^/?]+|root)(\?|$)")),
+    ("sites", re.compile(r"/(sites|drives)(\?|$|/)")),
+]
+
+
+def endpoint_class(method: str, url: str) -> str:
+    """Клас endpoint-а за URL; uploadUrl сесії (інший хост) — upload."""
+    path = url.split("?", 1)[0]
+    if "graph" not in path and "/v1.0/" not in path:
+        return "upload"
+    for name, pattern in _ENDPOINTS:
+        if pattern.search(path):
+            return name
+    return "other"
+
+
+def _empty() -> dict:
+    return {
+        "calls": 0, "errors": 0, "retries": 0, "throttled": 0, "bytes": 0,
+        "total_ms": 0.0, "max_ms": 0.0, "latency_buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+    }
+
+
+def _bucket(ms: float) -> int:
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if ms <= bound:
+            return i
+    return len(LATENCY_BUCKETS_MS)
+
+
+def percentile(buckets: list, q: float) -> float | None:
+    """q-перцентиль (0..1) з гістограми — верхня межа кошика, в який він потрапляє."""
+    total = sum(buckets or [])
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, n in enumerate(buckets):
+        seen += n
+        if seen >= rank:
+            return float(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else float("inf")
+    return float("inf")
+
+
+def _default_source() -> str:
+    argv = sys.argv or [""]
+    if os.path.basename(argv[0]) == "manage.py" and len(argv) > 1:
+        return argv[1]
+    return "web"
+
+
+class GraphMetrics:
+    def __init__(self, source: str = None):
+        self.source = source or getattr(settings, "M365_METRICS_SOURCE", "") or _default_source()
+        self._stats: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+        self._flush_pending = False
+
+    def _stat(self, endpoint: str) -> dict:
+        stat = self._stats.get(endpoint)
+        if stat is None:
+            stat = self._stats[endpoint] = _empty()
+        return stat
+
+    def record(self, endpoint: str, ms: float, status: int | None, size: int = 0):
+        """Один HTTP-запит; status=None — відповіді не було (мережа, таймаут)."""
+        with self._lock:
+            stat = self._stat(endpoint)
+            stat["calls"] += 1
+            stat["bytes"] += size
+            stat["total_ms"] += ms
+            stat["max_ms"] = max(stat["max_ms"], ms)
+            stat["latency_buckets"][_bucket(ms)] += 1
+            if status == 429:
+                stat["throttled"] += 1
+            elif status is None or status >= 500:
+                stat["errors"] += 1
+        self._maybe_flush()
+
+    def record_retry(self, endpoint: str, throttled: bool = False):
+        """Повтор запиту; throttled — 429 підзапиту $batch (сам HTTP-запит успішний)."""
+        with self._lock:
+            stat = self._stat(endpoint)
+            stat["retries"] += 1
+            if throttled:
+                stat["throttled"] += 1
+
+    def snapshot(self) -> dict:
+        """Ще не скинутий у БД приріст: {endpoint: лічильники}."""
+        with self._lock:
+            return {k: dict(v, latency_buckets=list(v["latency_buckets"])) for k, v in self._stats.items()}
+
+    def drain(self) -> dict:
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            return stats
+
+    def restore(self, stats: dict):
+        """Не вдалося записати — повертаємо приріст, щоб не загубити."""
+        with self._lock:
+            for endpoint, add in stats.items():
+                _merge(self._stat(endpoint), add)
+
+    # ---------- запис у БД ----------
+    def flush(self):
+        with self._flush_lock:
+            self._flushed_at = time.monotonic()
+            stats = self.drain()
+            if not stats:
+                return
+            period = timezone.now().replace(minute=0, second=0, microsecond=0)
+            try:
+                with transaction.atomic():
+                    for endpoint, add in stats.items():
+                        row, _ = M365GraphMetric.objects.select_for_update().get_or_create(
+                            period_start=period, source=self.source, endpoint=endpoint,
+                        )
+                        values = {f: getattr(row, f) for f in _empty()}
+                        _merge(values, add)
+                        for f, v in values.items():
+                            setattr(row, f, v)
+                        row.save()
+            except DatabaseError:
+                logger.warning("Could not store M365 Graph metrics", exc_info=True)
+                self.restore(stats)
+
+    def _maybe_flush(self):
+        if FLUSH_INTERVAL <= 0:
+            return
+        with self._lock:
+            if self._flush_pending or time.monotonic() - self._flushed_at < FLUSH_INTERVAL:
+                return
+            self._flush_pending = True
+
+        def run():
+            try:
+                self.flush()
+            finally:
+                self._flush_pending = False
+                connection.close()
+
+        threading.Thread(target=run, name="m365-metrics-flush", daemon=True).start()
+
+
+def _merge(into: dict, add: dict):
+    for f in ("calls", "errors", "retries", "throttled", "bytes", "total_ms"):
+        into[f] = (into.get(f) or 0) + add.get(f, 0)
+    into["max_ms"] = max(into.get("max_ms") or 0.0, add.get("max_ms", 0.0))
+    a, b = list(into.get("latency_buckets") or []), list(add.get("latency_buckets") or [])
+    size = max(len(a), len(b))
+    into["latency_buckets"] = [x + y for x, y in zip(a + [0] * (size - len(a)), b + [0] * (size - len(b)))]
+
+
+def capped_percentile(buckets: list, q: float, max_ms: float) -> float | None:
+    """percentile(), але не більше за найдовший реальний виклик (межа кошика може бути вищою)."""
+    value = percentile(buckets, q)
+    return None if value is None else round(min(value, max_ms), 1)
+
+
+def summarize(rows) -> dict:
+    """{endpoint: зведення} з рядків M365GraphMetric або dict-ів: сума лічильників, avg, p50/p95/p99."""
+    totals: dict[str, dict] = {}
+    for row in rows:
+        values = row if isinstance(row, dict) else {f: getattr(row, f) for f in _empty()}
+        endpoint = values.get("endpoint") or getattr(row, "endpoint", "other")
+        _merge(totals.setdefault(endpoint, _empty()), values)
+
+    out = {}
+    for endpoint, t in sorted(totals.items()):
+        buckets = t["latency_buckets"]
+        out[endpoint] = {
+            "calls": t["calls"],
+            "errors": t["errors"],
+            "retries": t["retries"],
+            "throttled": t["throttled"],
+            "bytes": t["bytes"],
+            "avg_ms": round(t["total_ms"] / t["calls"], 1) if t["calls"] else None,
+            "p50_ms": capped_percentile(buckets, 0.50, t["max_ms"]),
+            "p95_ms": capped_percentile(buckets, 0.95, t["max_ms"]),
+            "p99_ms": capped_percentile(buckets, 0.99, t["max_ms"]),
+            "max_ms": round(t["max_ms"], 1),
+        }
+    return out
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> GraphMetrics:
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = GraphMetrics()
+    return _metrics
+
+
+def flush_metrics():
+    get_metrics().flush()
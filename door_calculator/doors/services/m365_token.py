@@ -0,0 +1,126 @@
+"""
+Токен застосунку для Microsoft Graph, спільний для всіх процесів.
+
+Кеш MSAL живе в памʼяті одного процесу, тож кожен gunicorn-воркер і worker_m365
+брали токен окремо. Тепер токен з терміном дії лежить у M365AccessToken:
+  - у процесі — копія в памʼяті, поки до кінця дії більше REFRESH_MARGIN;
+  - у "вікні" перед закінченням віддаємо ще чинний токен, а оновлюємо у фоні;
+  - оновлення single-flight: у процесі — _refresh_lock, між процесами —
+    select_for_update рядка (хто перший — той і ходить у login.microsoftonline.com,
+    решта беруть уже оновлений рядок).
+"""
+import logging
+import threading
+from datetime import timedelta
+
+import msal
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from doors.models import M365AccessToken
+
+logger = logging.getLogger(__name__)
+
+TOKEN_KEY = "graph_app"
+# за скільки секунд до закінчення дії починаємо оновлювати
+REFRESH_MARGIN = int(getattr(settings, "M365_TOKEN_REFRESH_MARGIN", 300))
+# менше цього — токен вважаємо непридатним і оновлюємо синхронно
+MIN_VALIDITY = 30
+
+_app = None
+_cached = {"token": None, "expires_at": None}
+_refresh_lock = threading.Lock()
+_background_lock = threading.Lock()
+
+
+def _get_app():
+    global _app
+    if _app is None:
+        _app = msal.ConfidentialClientApplication(
+            client_id=settings.M365_CLIENT_ID,
+            authority=settings.M365_AUTHORITY,
+            client_credential=settings.M365_CLIENT_SECRET,
+        )
+    return _app
+
+
+def _acquire_from_msal():
+    result = _get_app().acquire_token_for_client(scopes=settings.M365_SCOPE)
+    if "access_token" not in result:
+        raise RuntimeError(result)
+    expires_at = timezone.now() + timedelta(seconds=int(result.get("expires_in") or 3599))
+    return result["access_token"], expires_at
+
+
+def _seconds_left(expires_at) -> float:
+    if expires_at is None:
+        return 0
+    return (expires_at - timezone.now()).total_seconds()
+
+
+def _remember(token: str, expires_at) -> str:
+    _cached["token"], _cached["expires_at"] = token, expires_at
+    return token
+
+
+def _refresh(rejected: str = None) -> str:
+    """
+    Оновлює токен (single-flight). rejected — токен, який Graph щойно не прийняв:
+    його не повертаємо, навіть якщо за терміном він ще чинний.
+    """
+    with _refresh_lock:
+        # поки чекали на lock, інший потік міг уже оновити
+        token = _cached["token"]
+        if token and token != rejected and _seconds_left(_cached["expires_at"]) > REFRESH_MARGIN:
+            return token
+
+        try:
+            with transaction.atomic():
+                row, _ = M365AccessToken.objects.select_for_update().get_or_create(key=TOKEN_KEY)
+                if (
+                    row.access_token
+                    and row.access_token != rejected
+                    and _seconds_left(row.expires_at) > REFRESH_MARGIN
+                ):
+                    return _remember(row.access_token, row.expires_at)
+
+                token, expires_at = _acquire_from_msal()
+                row.access_token, row.expires_at = token, expires_at
+                row.save(update_fields=["access_token", "expires_at", "updated_at"])
+                return _remember(token, expires_at)
+        except DatabaseError:
+            # без таблиці (міграції ще не застосовані) — працюємо як раніше, лише через MSAL
+            logger.warning("M365 token store unavailable, acquiring token directly", exc_info=True)
+            return _remember(*_acquire_from_msal())
+
+
+def _refresh_in_background() -> None:
+    if not _background_lock.acquire(blocking=False):
+        return  # уже оновлюється
+
+    def run():
+        try:
+            _refresh()
+        except Exception:
+            logger.exception("Background M365 token refresh failed")
+        finally:
+            connection.close()
+            _background_lock.release()
+
+    threading.Thread(target=run, name="m365-token-refresh", daemon=True).start()
+
+
+def get_app_token() -> str:
+    token, left = _cached["token"], _seconds_left(_cached["expires_at"])
+    if token and left > REFRESH_MARGIN:
+        return token
+    if token and left > MIN_VALIDITY:
+        _refresh_in_background()
+        return token
+    return _refresh()
+
+
+def refresh_app_token(rejected: str) -> str:
+    """Новий токен після 401 від Graph (інші процеси теж отримають саме його)."""
+    return _refresh(rejected=rejected)
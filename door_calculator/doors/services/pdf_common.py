@@ -0,0 +1,85 @@
+"""
+Спільне для PDF-звітів: шрифт з кирилицею, стилі клітинок, стиль таблиць.
+Використовується generate_pdf і PDF звіту виробітку за період.
+"""
+import os
+
+from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_LEFT
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+PDF_FONT_NAME = "DejaVuSerif"
+PDF_HEADER_COLOR = colors.HexColor("#0d6efd")
+PDF_TOTAL_ROW_COLOR = colors.HexColor("#f2f2f2")
+
+
+def pdf_base_font() -> str:
+    """Реєструє DejaVuSerif (один раз на процес); без файлу шрифту — Helvetica."""
+    if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT_NAME
+
+    font_path = os.path.join(settings.BASE_DIR, "doors", "static", "fonts", "DejaVuSerif.ttf")
+    if os.path.exists(font_path):
+        pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, font_path))
+        return PDF_FONT_NAME
+    return "Helvetica"
+
+
+def pdf_cell_styles(base_font: str) -> dict[str, ParagraphStyle]:
+    """cell / cell_center / cell_right / formula — стилі клітинок таблиць."""
+    styles = getSampleStyleSheet()
+
+    cell = ParagraphStyle(
+        name="CellStyle",
+        parent=styles["Normal"],
+        fontName=base_font,
+        fontSize=9,
+        leading=11,
+        alignment=TA_LEFT,
+        wordWrap="CJK",
+    )
+    return {
+        "cell": cell,
+        "cell_center": ParagraphStyle(name="CellCenterStyle", parent=cell, alignment=1),
+        "cell_right": ParagraphStyle(name="CellRightStyle", parent=cell, alignment=2),
+        "formula": ParagraphStyle(
+            name="FormulaStyle",
+            parent=styles["Normal"],
+            fontName=base_font,
+            fontSize=8,
+            leading=10,
+            alignment=TA_LEFT,
+            wordWrap="CJK",
+        ),
+    }
+
+
+def grid_table_style(
+    base_font: str,
+    font_size: int = 8,
+    header_rows: int = 1,
+    header_background=PDF_HEADER_COLOR,
+    header_text_color=colors.white,
+    valign: str = "MIDDLE",
+    padding: int = 3,
+) -> list:
+    """
+    Команди TableStyle: сітка, шрифт, шапка (за замовчуванням синя з білим текстом).
+    Клієнтська КП передає білу шапку з чорним текстом; додаткові команди
+    (LEADING, фон рядка "Разом" тощо) дописуються до списку на місці.
+    """
+    last_header = header_rows - 1
+    return [
+        ("GRID", (0, 0), (-1, -1), 0.6, colors.black),
+        ("FONTNAME", (0, 0), (-1, -1), base_font),
+        ("FONTSIZE", (0, 0), (-1, -1), font_size),
+        ("BACKGROUND", (0, 0), (-1, last_header), header_background),
+        ("TEXTCOLOR", (0, 0), (-1, last_header), header_text_color),
+        ("ALIGN", (0, 0), (-1, last_header), "CENTER"),
+        ("VALIGN", (0, 0), (-1, -1), valign),
+        ("TOPPADDING", (0, 0), (-1, -1), padding),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), padding),
+    ]
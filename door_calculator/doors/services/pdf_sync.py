@@ -0,0 +1,337 @@
+"""
+Фонова синхронізація PDF замовлення в Teams/SharePoint.
+
+sync_internal_pdf лише ставить PdfSyncJob в чергу, а резолв папок, рендер PDF
+і завантаження виконує воркер (manage.py run_pdf_sync_jobs).
+"""
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+
+from doors.models import PdfSyncJob
+from doors.services.m365_graph import upload_bytes_to_folder
+
+logger = logging.getLogger(__name__)
+
+# затримка перед повтором: 30с, 60с, 120с...
+RETRY_BASE_DELAY = 30
+# "running" довше за це — воркер, найімовірніше, впав посеред задачі
+STALE_RUNNING_AFTER = timedelta(minutes=15)
+
+
+class PdfSyncError(Exception):
+    """
+    Помилка, яку повтор не виправить (немає папки, треба обрати папку тощо).
+    extra потрапляє у result задачі (наприклад, candidates для вибору папки).
+    """
+
+    def __init__(self, message: str, **extra):
+        super().__init__(message)
+        self.extra = extra
+
+
+def enqueue_pdf_sync(order, mode: str, payload: dict) -> tuple[PdfSyncJob, bool]:
+    """
+    Ставить синхронізацію в чергу. Якщо для (order, mode) вже є активна задача —
+    повертає її (created=False). Для задачі, що ще чекає в черзі, оновлюємо параметри,
+    щоб повторний клік з іншою націнкою/папкою не загубився.
+    """
+    active = (
+        PdfSyncJob.objects
+        .filter(order=order, mode=mode, status__in=PdfSyncJob.ACTIVE_STATUSES)
+        .first()
+    )
+    if active:
+        if active.status == "queued" and active.payload != payload:
+            # уже завантажене попередньою спробою — зі старими параметрами, тож скидаємо
+            # result/прогрес, інакше _execute пропустить ці файли і в Teams лишаться старі PDF
+            PdfSyncJob.objects.filter(id=active.id, status="queued").update(
+                payload=payload, result=None, progress_done=0, updated_at=timezone.now()
+            )
+            active.refresh_from_db()
+        return active, False
+
+    try:
+        with transaction.atomic():
+            job = PdfSyncJob.objects.create(
+                order=order,
+                mode=mode,
+                payload=payload,
+                progress_message="В черзі",
+            )
+        return job, True
+    except IntegrityError:
+        # паралельний запит встиг створити задачу першим (uniq_active_pdf_sync_job)
+        job = PdfSyncJob.objects.get(order=order, mode=mode, status__in=PdfSyncJob.ACTIVE_STATUSES)
+        return job, False
+
+
+def job_status_payload(job: PdfSyncJob) -> dict:
+    return {
+        "ok": True,
+        "job_id": job.id,
+        "order_id": job.order_id,
+        "mode": job.mode,
+        "status": job.status,
+        "progress": {
+            "done": job.progress_done,
+            "total": job.progress_total,
+            "message": job.progress_message,
+        },
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "result": job.result,
+        "error": job.error,
+    }
+
+
+def requeue_stale_jobs() -> int:
+    """
+    Повертає в чергу задачі, які зависли в running (воркер впав/перезапустився).
+    Задачі з вичерпаними спробами (claim_next_job рахує кожне захоплення) — failed:
+    інакше задача, що валить сам воркер (OOM під час рендеру), крутилася б вічно.
+    """
+    now = timezone.now()
+    stale = PdfSyncJob.objects.filter(status="running", updated_at__lt=now - STALE_RUNNING_AFTER)
+
+    exhausted = stale.filter(attempts__gte=F("max_attempts")).update(
+        status="failed",
+        error="Воркер аварійно завершився під час виконання задачі",
+        finished_at=now,
+        updated_at=now,
+        progress_message="Помилка синхронізації",
+    )
+    if exhausted:
+        logger.warning("Marked %s stale PDF sync job(s) as failed: attempts exhausted", exhausted)
+
+    return stale.filter(attempts__lt=F("max_attempts")).update(
+        status="queued",
+        run_after=now,
+        progress_message="Повторний запуск після збою воркера",
+    )
+
+
+def claim_next_job() -> PdfSyncJob | None:
+    """
+    Забирає наступну задачу з черги. Захоплення — умовний UPDATE по статусу,
+    тому кілька воркерів не візьмуть одну задачу двічі (працює і в SQLite, і в Postgres).
+    """
+    now = timezone.now()
+    candidate_ids = list(
+        PdfSyncJob.objects
+        .filter(status="queued", run_after__lte=now)
+        .order_by("run_after", "id")
+        .values_list("id", flat=True)[:10]
+    )
+    for job_id in candidate_ids:
+        claimed = PdfSyncJob.objects.filter(id=job_id, status="queued").update(
+            status="running",
+            started_at=now,
+            updated_at=now,
+            attempts=F("attempts") + 1,
+            progress_message="Виконується",
+        )
+        if claimed:
+            return PdfSyncJob.objects.select_related("order").get(id=job_id)
+    return None
+
+
+def run_pdf_sync_job(job: PdfSyncJob) -> PdfSyncJob:
+    """Виконує задачу і фіксує результат: done / failed / назад у чергу для повтору."""
+    try:
+        result = _execute(job)
+    except PdfSyncError as e:
+        job.status = "failed"
+        job.error = str(e)
+        job.result = {**(job.result or {}), "ok": False, "error": str(e), **e.extra}
+        job.finished_at = timezone.now()
+        job.progress_message = str(e)[:255]
+    except Exception as e:
+        logger.exception("PDF sync job #%s failed (attempt %s)", job.id, job.attempts)
+        job.error = str(e)
+        if job.attempts < job.max_attempts:
+            delay = RETRY_BASE_DELAY * (2 ** max(job.attempts - 1, 0))
+            job.status = "queued"
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+            job.progress_message = f"Помилка, повтор через {delay} с"
+        else:
+            job.status = "failed"
+            job.result = {**(job.result or {}), "ok": False, "error": str(e)}
+            job.finished_at = timezone.now()
+            job.progress_message = "Помилка синхронізації"
+    else:
+        job.status = "done"
+        job.error = None
+        job.result = result
+        job.finished_at = timezone.now()
+        job.progress_message = f"Готово: {result['uploaded_to']} папок"
+
+    job.save(update_fields=[
+        "status", "error", "result", "run_after", "finished_at", "progress_message", "updated_at",
+    ])
+    return job
+
+
+def _render_pdf_bytes(order_id: int, get_params: dict) -> bytes:
+    """Рендерить PDF тим самим generate_pdf, що й UI, без HTTP-запиту."""
+    from doors.views import generate_pdf  # views імпортують цей модуль — тому імпорт тут
+
+    request = HttpRequest()
+    request.method = "GET"
+    q = QueryDict(mutable=True)
+    for k, v in get_params.items():
+        q[k] = str(v)
+    request.GET = q
+
+    resp = generate_pdf(request, order_id)
+    content = getattr(resp, "content", None)
+    if content is None:
+        content = b"".join(resp.streaming_content)
+    return content or b""
+
+
+def _resolve_target_folders(order, mode: str, payload: dict) -> list[dict]:
+    from doors.views import resolve_rework_destination_folder, resolve_target_folders_for_normal_project
+
+    if order.work_type == "rework":
+        try:
+            dest = resolve_rework_destination_folder(
+                drive_id=order.remote_drive_id,
+                project_folder_id=order.remote_folder_id,
+                is_final=(mode == "final"),
+            )
+        except RuntimeError as e:
+            raise PdfSyncError(str(e))
+        target_folders = [dest]
+    else:
+        target_folders = resolve_target_folders_for_normal_project(order, mode)
+        chosen_id = (payload.get("target_folder_id") or "").strip()
+
+        if len(target_folders) > 1 and not chosen_id:
+            raise PdfSyncError(
+                "Multiple target folders found. Please choose one.",
+                candidates=[
+                    {"id": x.get("id"), "name": x.get("name"), "webUrl": x.get("webUrl")}
+                    for x in target_folders
+                    if x and x.get("id")
+                ],
+            )
+
+        if chosen_id:
+            by_id = {x["id"]: x for x in target_folders if x and x.get("id")}
+            if chosen_id not in by_id:
+                raise PdfSyncError("target_folder_id is not among candidates")
+            target_folders = [by_id[chosen_id]]
+
+    if not target_folders:
+        raise PdfSyncError("Не знайдено цільових папок для синхронізації.")
+
+    valid = [folder for folder in target_folders if folder and folder.get("id")]
+    if not valid:
+        raise PdfSyncError("Цільові папки знайдені, але не містять коректного folder_id.")
+    return valid
+
+
+def _planned_uploads(order, mode: str, payload: dict, folders: list[dict]) -> list[tuple]:
+    from doors.views import build_pdf_number
+
+    base_params = {
+        "markup": payload.get("markup", 0),
+        "delivery": payload.get("delivery", 0),
+        "packing": payload.get("packing", 0),
+    }
+    mode_label = "Попередній" if mode == "precalc" else "Фінальний"
+
+    planned = []
+    for folder in folders:
+        pdf_number = build_pdf_number(order, mode, folder)
+        pdfs = [
+            (
+                "internal",
+                {**base_params, "internal": 1, "pdf_number": pdf_number},
+                f"{mode_label}_Внутрішній_розрахунок_{pdf_number}.pdf",
+            ),
+        ]
+        if order.work_type == "rework":
+            pdfs = [
+                (
+                    "detailed",
+                    {**base_params, "pdf_number": pdf_number},
+                    f"{mode_label}_Детальний_{pdf_number}.pdf",
+                ),
+                (
+                    "offer",
+                    {**base_params, "simple": 1, "pdf_number": pdf_number},
+                    f"{mode_label}_Комерційна_пропозиція_{pdf_number}.pdf",
+                ),
+            ] + pdfs
+
+        for label, params, filename in pdfs:
+            planned.append((folder["id"], label, params, filename))
+    return planned
+
+
+def _execute(job: PdfSyncJob) -> dict:
+    order = job.order
+    mode = job.mode
+    payload = job.payload or {}
+
+    if order.source != "m365" or not order.remote_drive_id or not order.remote_folder_id:
+        raise PdfSyncError("Order is not linked to M365 project folder")
+
+    job.progress_message = "Пошук папок у Teams"
+    job.save(update_fields=["progress_message", "updated_at"])
+
+    folders = _resolve_target_folders(order, mode, payload)
+    planned = _planned_uploads(order, mode, payload, folders)
+
+    # після збою повтор не перезаливає вже завантажені файли
+    uploaded = list((job.result or {}).get("uploaded", []))
+    job.progress_total = len(planned)
+    job.progress_done = len(uploaded)
+    job.save(update_fields=["progress_total", "progress_done", "updated_at"])
+
+    uploaded_folders = set()
+    uploaded_files = []
+
+    for folder_id, label, params, filename in planned:
+        key = f"{folder_id}/{filename}"
+        if key not in uploaded:
+            job.progress_message = f"Завантаження: {filename}"
+            job.save(update_fields=["progress_message", "updated_at"])
+
+            pdf_bytes = _render_pdf_bytes(order.id, params)
+            if not pdf_bytes:
+                raise PdfSyncError(f"Failed to render PDF: {label}")
+
+            upload_bytes_to_folder(
+                drive_id=order.remote_drive_id,
+                folder_id=folder_id,
+                filename=filename,
+                content=pdf_bytes,
+                content_type="application/pdf",
+            )
+
+            uploaded.append(key)
+            job.progress_done = len(uploaded)
+            job.result = {"uploaded": uploaded}
+            job.save(update_fields=["progress_done", "result", "updated_at"])
+
+        uploaded_folders.add(folder_id)
+        uploaded_files.append(filename)
+
+    if not uploaded_folders:
+        raise PdfSyncError("PDF не було завантажено в жодну папку.")
+
+    return {
+        "ok": True,
+        "mode": mode,
+        "work_type": order.work_type,
+        "uploaded_to": len(uploaded_folders),
+        "files": uploaded_files,
+        "uploaded": uploaded,
+    }
@@ -0,0 +1,89 @@
+"""
+Допоміжні розрахунки для звіту виробітку за період (report_period_view).
+"""
+from bisect import bisect_right
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.template.defaultfilters import floatformat
+
+
+def period_days(start_date: date, end_date: date) -> list[date]:
+    return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+
+def forward_fill(entries: list[tuple[date, Decimal]], days: list[date]) -> list[Decimal]:
+    """
+    entries — відсортовані за датою (date, percent) одного замовлення.
+    Повертає % станом на кожен день з days (останній запис <= дня, або 0).
+    Один прохід по днях і записах: O(days + entries).
+    """
+    if not days:
+        return []
+
+    dates = [d for d, _ in entries]
+    # усе, що було до початку періоду, — стартове значення
+    i = bisect_right(dates, days[0])
+    last = entries[i - 1][1] if i else Decimal("0")
+
+    filled = []
+    for day in days:
+        while i < len(entries) and dates[i] <= day:
+            last = entries[i][1]
+            i += 1
+        filled.append(last)
+    return filled
+
+
+def progress_matrix(
+    progress_by_order: dict[str, list[tuple[date, Decimal]]],
+    order_numbers: list[str],
+    days: list[date],
+) -> dict[str, list[Decimal]]:
+    """Щільна матриця замовлення × дні: {order_number: [% на days[0], ..., % на days[-1]]}."""
+    return {num: forward_fill(progress_by_order.get(num, []), days) for num in order_numbers}
+
+
+class CellFormatter:
+    """
+    Те саме, що |floatformat у шаблоні, але з памʼяттю: у матриці % і годин
+    багато однакових значень, тож кожне форматуємо лише раз, а шаблон
+    просто виводить готові рядки без фільтрів на кожну клітинку.
+    """
+
+    def __init__(self, decimal_pos: int = 1):
+        self.decimal_pos = decimal_pos
+        self._cache = {}
+
+    def __call__(self, value) -> str:
+        text = self._cache.get(value)
+        if text is None:
+            text = floatformat(value, self.decimal_pos)
+            self._cache[value] = text
+        return text
+
+
+def iter_period_rows(days: list[date], snapshots, hours, order_ids: list, worker_ids: list):
+    """
+    Рядки матриці по днях без побудови всієї матриці — для потокового експорту.
+    snapshots — (date, order_id, percent), hours — (date, worker_id, hours), обидва
+    відсортовані за датою (зазвичай курсори .iterator()). Повертає
+    (день, [% по order_ids], [години по worker_ids]); % — як у forward_fill:
+    останній знімок <= дня, до першого знімка в періоді — 0.
+    """
+    last = dict.fromkeys(order_ids, Decimal("0"))
+    snapshots, hours = iter(snapshots), iter(hours)
+    snap, hour = next(snapshots, None), next(hours, None)
+
+    for day in days:
+        while snap is not None and snap[0] <= day:
+            last[snap[1]] = snap[2]
+            snap = next(snapshots, None)
+
+        day_hours = {}
+        while hour is not None and hour[0] <= day:
+            if hour[0] == day:
+                day_hours[hour[1]] = hour[2]
+            hour = next(hours, None)
+
+        yield day, [last[o] for o in order_ids], [day_hours.get(w, Decimal("0")) for w in worker_ids]
@@ -0,0 +1,116 @@
+"""
+PDF звіту виробітку за період (report_period_view, ?export=pdf).
+
+Будується з того самого контексту, що й HTML (готові order_cells / worker_cells
+кожного рядка), тож нічого не перераховується. Широкий звіт ділиться на групи
+стовпців: кожна група — окрема таблиця на альбомних сторінках, стовпці "Дата"
+і "Σ год" повторюються в кожній, шапка повторюється при переносі рядків.
+"""
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.units import mm
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from doors.services.pdf_common import PDF_TOTAL_ROW_COLOR, grid_table_style, pdf_base_font, pdf_cell_styles
+from doors.services.period_report import CellFormatter
+
+PAGE_SIZE = landscape(A4)
+MARGIN = 12 * mm
+DATE_COL_WIDTH = 16 * mm
+TOTAL_COL_WIDTH = 18 * mm
+MIN_DATA_COL_WIDTH = 17 * mm
+DATA_ROW_HEIGHT = 4.2 * mm
+
+
+def _column_groups(count: int, per_page: int) -> list[range]:
+    return [range(i, min(i + per_page, count)) for i in range(0, count, per_page)] or [range(0)]
+
+
+def render_period_report_pdf(context: dict) -> bytes:
+    base_font = pdf_base_font()
+    styles = pdf_cell_styles(base_font)
+    head_style = styles["cell_center"].clone("PeriodHead", fontSize=7, leading=8)
+    title_style = styles["cell"].clone("PeriodTitle", fontSize=13, leading=16, alignment=1)
+    text_style = styles["cell"].clone("PeriodText", fontSize=10, leading=13)
+    fmt = CellFormatter(1)
+
+    orders, workers, table = context["orders"], context["workers"], context["table"]
+
+    # усі змінні стовпці: спочатку замовлення (%), потім працівники (год)
+    headers = (
+        [f"№{escape(o['number'] or '')}<br/>{escape(o['name'] or '')}<br/>(%)" for o in orders]
+        + [f"{escape(w['name'] or '')}<br/>(год)" for w in workers]
+    )
+    totals = (
+        [f"{fmt(context['totals_orders'][o['number']])}%" for o in orders]
+        + [fmt(context["totals_workers"][w["id"]]) for w in workers]
+    )
+    body = [row["order_cells"] + row["worker_cells"] for row in table]
+
+    usable_width = PAGE_SIZE[0] - 2 * MARGIN - DATE_COL_WIDTH - TOTAL_COL_WIDTH
+    per_page = max(1, int(usable_width // MIN_DATA_COL_WIDTH))
+    groups = _column_groups(len(headers), per_page)
+
+    start, end = context["start_date"], context["end_date"]
+    story = [
+        Paragraph(f"Звіт виробітку за період {start:%d.%m.%Y} – {end:%d.%m.%Y}", title_style),
+        Spacer(1, 4 * mm),
+    ]
+
+    for n, cols in enumerate(groups, start=1):
+        if len(groups) > 1:
+            story.append(Paragraph(f"Частина {n} з {len(groups)}", text_style))
+            story.append(Spacer(1, 2 * mm))
+
+        data = [
+            [Paragraph("Дата", head_style)]
+            + [Paragraph(headers[i], head_style) for i in cols]
+            + [Paragraph("Σ год за день", head_style)]
+        ]
+        for row, cells in zip(table, body):
+            data.append([f"{row['date']:%d.%m}"] + [cells[i] for i in cols] + [fmt(row["total"])])
+        data.append(["Σ"] + [totals[i] for i in cols] + [fmt(context["total_all"])])
+
+        col_width = usable_width / max(len(cols), 1)
+        tbl = Table(
+            data,
+            colWidths=[DATE_COL_WIDTH] + [col_width] * len(cols) + [TOTAL_COL_WIDTH],
+            # фіксована висота рядків даних — reportlab не міряє кожну клітинку
+            rowHeights=[None] + [DATA_ROW_HEIGHT] * (len(data) - 1),
+            repeatRows=1,
+        )
+        tbl.setStyle(TableStyle(grid_table_style(base_font, font_size=7) + [
+            ("ALIGN", (0, 1), (-1, -1), "CENTER"),
+            ("BACKGROUND", (0, -1), (-1, -1), PDF_TOTAL_ROW_COLOR),
+            ("BACKGROUND", (-1, 1), (-1, -2), PDF_TOTAL_ROW_COLOR),
+        ]))
+        story.append(tbl)
+        story.append(PageBreak())
+
+    story += [
+        Paragraph("Підсумкові розрахунки (по методичці)", title_style),
+        Spacer(1, 3 * mm),
+        Paragraph(f"Період: {start:%d.%m.%Y} – {end:%d.%m.%Y} ({context['work_days']} днів)", text_style),
+        Paragraph(f"Всього виконано за період (Vзаг): {context['vzag']:.2f} к/с", text_style),
+        Paragraph(
+            f"Нормативний час (Tнорма = Vзаг / Hv, Hv = {context['hv']}): {context['t_norma']:.1f} год",
+            text_style,
+        ),
+        Paragraph(f"Фактичний час (Tфакт): {context['t_fact']:.1f} год", text_style),
+        Paragraph(f"Ефективність (E = Tнорма / Tфакт × 100%): {context['eff_percent']:.1f}%", text_style),
+    ]
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=PAGE_SIZE,
+        leftMargin=MARGIN,
+        rightMargin=MARGIN,
+        topMargin=MARGIN,
+        bottomMargin=MARGIN,
+        title=f"Звіт виробітку {start:%d.%m.%Y} – {end:%d.%m.%Y}",
+    )
+    doc.build(story)
+    return buffer.getvalue()
@@ -0,0 +1,88 @@
+"""
+Щоденні знімки % виконання замовлень (OrderProgressSnapshot).
+
+OrderProgress — розріджені записи "на дату D стало N%". Знімки розгортають їх
+у щільний ряд по днях (від першого до останнього запису), тож звіт за період
+читає % на будь-яку дату одним запитом по діапазону дат.
+
+Перебудову викликають обробники post_save/post_delete у doors/signals.py, тож
+правки з адмінки й ORM теж потрапляють у знімки.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+
+from doors.models import Order, OrderProgress, OrderProgressSnapshot
+from doors.services.period_report import forward_fill, period_days
+
+
+def ks_done_for(percent, total_ks) -> Decimal:
+    return (Decimal(percent) * Decimal(str(total_ks or 0)) / Decimal("100")).quantize(Decimal("0.001"))
+
+
+def rebuild_order_snapshots(order: Order, since: date | None = None) -> int:
+    """
+    Перебудовує знімки замовлення, починаючи з since (за замовчуванням — увесь ряд).
+    Знімки до since не змінюються: нові/видалені записи прогресу впливають лише на
+    дні від своєї дати і далі. Повертає кількість записаних знімків.
+    """
+    entries = [
+        (d, Decimal(p))
+        for d, p in (
+            OrderProgress.objects
+            .filter(order=order)
+            .order_by("date", "id")
+            .values_list("date", "percent")
+        )
+    ]
+
+    with transaction.atomic():
+        snapshots = OrderProgressSnapshot.objects.filter(order=order)
+        if not entries:
+            snapshots.delete()
+            return 0
+
+        first, last = entries[0][0], entries[-1][0]
+        since = max(since or first, first)
+        snapshots.filter(date__lt=first).delete()
+
+        # новий запис може бути через кілька днів після останнього знімка —
+        # дні між ними теж треба заповнити
+        covered_until = snapshots.filter(date__lt=since).order_by("-date").values_list("date", flat=True).first()
+        if covered_until is None:
+            since = first
+        elif covered_until < since - timedelta(days=1):
+            since = covered_until + timedelta(days=1)
+
+        snapshots.filter(date__gte=since).delete()
+        if since > last:
+            return 0
+
+        days = period_days(since, last)
+        percents = forward_fill(entries, days)
+        OrderProgressSnapshot.objects.bulk_create(
+            [
+                OrderProgressSnapshot(
+                    order=order,
+                    date=day,
+                    percent=int(percent),
+                    ks_done=ks_done_for(percent, order.total_ks),
+                )
+                for day, percent in zip(days, percents)
+            ],
+            batch_size=1000,
+        )
+    return len(days)
+
+
+def refresh_snapshot_ks(order: Order) -> int:
+    """Після зміни total_ks перераховує ks_done у всіх знімках замовлення одним UPDATE."""
+    factor = Decimal(str(order.total_ks or 0)) / Decimal("100")
+    return OrderProgressSnapshot.objects.filter(order=order).update(
+        ks_done=ExpressionWrapper(
+            F("percent") * Value(factor),
+            output_field=DecimalField(max_digits=12, decimal_places=3),
+        )
+    )
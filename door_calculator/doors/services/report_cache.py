@@ -0,0 +1,58 @@
+"""
+Кеш результатів звітів (report_view, report_period_view).
+
+Ключ = імʼя звіту + нормалізовані параметри + версія даних (ReportDataVersion).
+Будь-який save/delete WorkLog / OrderProgress / Worker / ProductionNorm, а для Order —
+зміна полів, що потрапляють у звіти (doors/signals.py), збільшує версію,
+тож старі записи просто перестають читатися і з часом витісняються
+(локальний кеш з обмеженою кількістю записів, див. CACHES["reports"]).
+Кешуються обчислені дані, а не HTML.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+from doors.models import ReportDataVersion
+
+REPORT_CACHE_ALIAS = getattr(settings, "REPORT_CACHE_ALIAS", "reports")
+
+_VERSION_PK = 1
+
+
+def data_version() -> int:
+    return ReportDataVersion.objects.filter(pk=_VERSION_PK).values_list("version", flat=True).first() or 0
+
+
+def bump_data_version() -> None:
+    """Позначає всі закешовані звіти як застарілі."""
+    updated = ReportDataVersion.objects.filter(pk=_VERSION_PK).update(version=F("version") + 1)
+    if not updated:
+        with transaction.atomic():
+            obj, created = ReportDataVersion.objects.get_or_create(pk=_VERSION_PK, defaults={"version": 1})
+        if not created:
+            ReportDataVersion.objects.filter(pk=_VERSION_PK).update(version=F("version") + 1)
+
+
+def report_cache_key(name: str, params: dict, version: int) -> str:
+    normalized = json.dumps(params, sort_keys=True, default=str)
+    digest = hashlib.md5(normalized.encode("utf-8")).hexdigest()
+    return f"report:{name}:v{version}:{digest}"
+
+
+def cached_report(name: str, params: dict, compute):
+    """
+    Повертає закешований результат compute() для (name, params) на поточній версії даних.
+    Результат має бути picklable (dict/list/моделі), оскільки кеш зберігає копію.
+    """
+    cache = caches[REPORT_CACHE_ALIAS]
+    key = report_cache_key(name, params, data_version())
+
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result)
+    return result
@@ -0,0 +1,84 @@
+"""
+Розклад sync_m365_orders --watch.
+
+Кожен сайт має власний час наступного циклу: після успіху — через interval
+(або свій з M365_SYNC_SITE_INTERVALS), після помилок — interval · 2^n до max_backoff
+(n — помилок поспіль). До паузи додається випадковий розкид ±jitter, щоб кілька
+воркерів і сайтів не били в Graph одночасно.
+
+sync_lock() — блокування файлом (fcntl): якщо попередній запуск (інший процес,
+cron, другий контейнер) ще триває, цикл пропускається замість паралельного обходу.
+"""
+import contextlib
+import random
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows (локальна розробка) — без міжпроцесного блокування
+    fcntl = None
+
+
+class SiteSchedule:
+    def __init__(self, sites, interval: float, jitter: float = 0.1, max_backoff: float = 3600,
+                 site_intervals: dict = None, rnd: random.Random = None, clock=time.monotonic):
+        self.interval = max(1.0, float(interval))
+        self.jitter = min(max(float(jitter), 0.0), 1.0)
+        self.max_backoff = float(max_backoff)
+        self.site_intervals = site_intervals or {}
+        self.failures = {site: 0 for site in sites}
+
+        self._rnd = rnd or random.Random()
+        self._clock = clock
+        # перший цикл — одразу для всіх сайтів
+        now = clock()
+        self.next_run = {site: now for site in sites}
+
+    def interval_for(self, site: str) -> float:
+        return max(1.0, float(self.site_intervals.get(site) or self.interval))
+
+    def due(self) -> list:
+        now = self._clock()
+        return [site for site, at in self.next_run.items() if at <= now]
+
+    def sleep_for(self) -> float:
+        """Скільки чекати до найближчого циклу."""
+        return max(0.0, min(self.next_run.values()) - self._clock()) if self.next_run else self.interval
+
+    def done(self, site: str, ok: bool) -> float:
+        """Результат циклу сайту; повертає паузу до наступного."""
+        base = self.interval_for(site)
+        if ok:
+            self.failures[site] = 0
+            return self._schedule(site, base)
+        self.failures[site] += 1
+        return self._schedule(site, min(max(base, self.max_backoff), base * 2 ** self.failures[site]))
+
+    def skip(self, site: str) -> float:
+        """Цикл пропущено (попередній ще триває) — звичайна пауза, лічильник помилок не чіпаємо."""
+        return self._schedule(site, self.interval_for(site))
+
+    def _schedule(self, site: str, delay: float) -> float:
+        if self.jitter:
+            delay *= 1 + self._rnd.uniform(-self.jitter, self.jitter)
+        self.next_run[site] = self._clock() + delay
+        return delay
+
+
+@contextlib.contextmanager
+def sync_lock(path: str):
+    """with sync_lock(path) as locked: locked=False — блокування тримає інший запуск."""
+    if fcntl is None or not path:
+        yield True
+        return
+
+    with open(path, "a") as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
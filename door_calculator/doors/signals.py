@@ -0,0 +1,101 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from doors.models import Order, OrderProgress, ProductionNorm, WorkLog, Worker
+from doors.services.hours_rollups import apply_worklog
+from doors.services.progress_snapshots import rebuild_order_snapshots, refresh_snapshot_ks
+from doors.services.report_cache import bump_data_version
+
+# будь-яка зміна цих моделей впливає на звіти — скидаємо кеш звітів
+REPORT_SOURCE_MODELS = (WorkLog, OrderProgress, Worker, ProductionNorm)
+
+# поля Order, які потрапляють у звіти; remote_* / eTag-и синхронізації M365 — ні
+REPORT_ORDER_FIELDS = frozenset({
+    "order_number", "order_name", "status", "total_ks", "total_cost", "completion_percent", "created_at",
+})
+
+
+def invalidate_report_cache(sender, **kwargs):
+    bump_data_version()
+
+
+for _model in REPORT_SOURCE_MODELS:
+    post_save.connect(invalidate_report_cache, sender=_model)
+    post_delete.connect(invalidate_report_cache, sender=_model)
+post_delete.connect(invalidate_report_cache, sender=Order)
+
+
+@receiver(pre_save, sender=Order)
+def order_before_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None:
+        instance._report_changed = not REPORT_ORDER_FIELDS.isdisjoint(update_fields)
+        return
+    old = Order.objects.filter(pk=instance.pk).values(*REPORT_ORDER_FIELDS).first() if instance.pk else None
+    instance._report_changed = old is None or any(getattr(instance, f) != v for f, v in old.items())
+
+
+@receiver(post_save, sender=Order)
+def order_report_cache(sender, instance, created, **kwargs):
+    if created or getattr(instance, "_report_changed", True):
+        bump_data_version()
+
+
+def _origin_model(origin):
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+# ---- щоденні знімки % (OrderProgressSnapshot) ----
+# Підтримуються тут, а не у views, щоб зміни з адмінки / shell / команд теж потрапляли у звіт
+
+@receiver(post_save, sender=OrderProgress)
+def progress_saved(sender, instance, created, **kwargs):
+    # при редагуванні дата могла зсунутися назад — перебудовуємо ряд цілком
+    rebuild_order_snapshots(instance.order, since=instance.date if created else None)
+
+
+@receiver(post_delete, sender=OrderProgress)
+def progress_deleted(sender, instance, origin=None, **kwargs):
+    # каскад від видалення Order — знімки видаляються разом із замовленням
+    if _origin_model(origin) is Order:
+        return
+    order = Order.objects.filter(pk=instance.order_id).first()
+    if order is not None:
+        rebuild_order_snapshots(order, since=instance.date)
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, update_fields=None, **kwargs):
+    # ks_done у знімках залежить від total_ks
+    if not created and (update_fields is None or "total_ks" in update_fields):
+        refresh_snapshot_ks(instance)
+
+
+# ---- підсумки годин (WorkerHoursRollup) ----
+# Редагування = відняти старий запис і додати новий: змінитись могли години, дата чи працівник
+
+@receiver(pre_save, sender=WorkLog)
+def worklog_before_save(sender, instance, **kwargs):
+    instance._rollup_old = (
+        WorkLog.objects.filter(pk=instance.pk).values_list("worker_id", "date", "hours", "work_hours").first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=WorkLog)
+def worklog_saved(sender, instance, **kwargs):
+    old = getattr(instance, "_rollup_old", None)
+    with transaction.atomic():
+        if old:
+            apply_worklog(*old, sign=-1)
+        apply_worklog(instance.worker_id, instance.date, instance.hours, instance.work_hours)
+    instance._rollup_old = None
+
+
+@receiver(post_delete, sender=WorkLog)
+def worklog_deleted(sender, instance, origin=None, **kwargs):
+    # каскад від видалення Worker — його підсумки видаляються разом із ним
+    if _origin_model(origin) is Worker:
+        return
+    apply_worklog(instance.worker_id, instance.date, instance.hours, instance.work_hours, sign=-1)
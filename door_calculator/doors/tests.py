@@ -1,3 +1,1446 @@
-from django.test import TestCase
+import contextlib
+import io
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from doors.services import m365_cache, m365_graph, m365_limiter, m365_metrics, sync_schedule
+from doors.services.m365_fake import FakeGraphServer, generate_project_tree
+
+CHUNK = m365_graph.UPLOAD_CHUNK_UNIT
+
+
+def _isolated_graph_state(test):
+    """
+    Свіжі обмежувач (без стелі rate), запобіжник, кеш дітей і метрики (без скидання в БД):
+    стан процесу не переходить між тестами.
+    """
+    for module, name, value in (
+        (m365_limiter, "_limiter", m365_limiter.AdaptiveLimiter(rate=0, max_concurrency=16)),
+        (m365_limiter, "_breaker", m365_limiter.CircuitBreaker(threshold=5, cooldown=30)),
+        (m365_cache, "_cache", m365_cache.ChildrenCache(ttl=60)),
+        (m365_metrics, "_metrics", m365_metrics.GraphMetrics(source="test")),
+        (m365_metrics, "FLUSH_INTERVAL", 0),
+    ):
+        patcher = mock.patch.object(module, name, value)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+class UploadSessionTests(SimpleTestCase):
+    """Завантаження в SharePoint шматками — проти локальної заглушки Graph."""
+
+    def setUp(self):
+        self.fake = FakeGraphServer().start()
+        self.addCleanup(self.fake.stop)
+
+        for target, value in (
+            ("GRAPH_BASE", self.fake.graph_base),
+            ("get_app_token", lambda: "test-token"),
+        ):
+            patcher = mock.patch.object(m365_graph, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        _isolated_graph_state(self)
+
+    @staticmethod
+    def _payload(size: int) -> bytes:
+        return bytes((i * 7) % 251 for i in range(size))
+
+    def _stored(self, name: str) -> bytes:
+        return self.fake.files[("drive", "folder", name)]
+
+    def test_bytes_are_uploaded_in_fixed_size_chunks(self):
+        data = self._payload(CHUNK * 3 + 1234)
+
+        item = m365_graph.upload_stream_to_folder("drive", "folder", "big.pdf", data, chunk_size=CHUNK)
+
+        self.assertEqual(item["size"], len(data))
+        self.assertEqual(self._stored("big.pdf"), data)
+        self.assertEqual(self.fake.calls["handle_create_session"], 1)
+        self.assertEqual(self.fake.calls["handle_session_chunk"], 4)
+
+    def test_generator_source_is_streamed(self):
+        data = self._payload(CHUNK * 2 + 10)
+        pieces = (data[i:i + 1000] for i in range(0, len(data), 1000))
+
+        m365_graph.upload_stream_to_folder(
+            "drive", "folder", "gen.bin", pieces, size=len(data), chunk_size=CHUNK,
+        )
+
+        self.assertEqual(self._stored("gen.bin"), data)
+
+    def test_generator_without_size_is_rejected(self):
+        with self.assertRaises(ValueError):
+            m365_graph.upload_stream_to_folder("drive", "folder", "x.bin", iter([b"abc"]))
+
+    def test_resumes_after_failed_chunk(self):
+        data = self._payload(CHUNK * 3)
+        self.fake.fail_chunks = {2: "error"}
+
+        m365_graph.upload_stream_to_folder(
+            "drive", "folder", "retry.bin", io.BytesIO(data), chunk_size=CHUNK, retry_delay=0,
+        )
+
+        self.assertEqual(self._stored("retry.bin"), data)
+        self.assertEqual(self.fake.calls["handle_session_status"], 1)
+
+    def test_non_json_session_status_retries_from_current_offset(self):
+        data = self._payload(CHUNK * 3)
+        self.fake.fail_chunks = {2: "error"}
+        self.fake.broken_status = 1
+
+        m365_graph.upload_stream_to_folder(
+            "drive", "folder", "proxy.bin", io.BytesIO(data), chunk_size=CHUNK, retry_delay=0,
+        )
+
+        self.assertEqual(self._stored("proxy.bin"), data)
+
+    def test_special_characters_in_name_survive_both_upload_paths(self):
+        name = "Проект #5 100% готово?.pdf"
+
+        m365_graph.upload_bytes_to_folder("drive", "folder", name, b"%PDF-small")
+        m365_graph.upload_stream_to_folder("drive", "folder", "big " + name, self._payload(CHUNK + 1),
+                                           chunk_size=CHUNK)
+
+        self.assertEqual(self._stored(name), b"%PDF-small")
+        self.assertEqual(len(self._stored("big " + name)), CHUNK + 1)
+
+    def test_resumes_mid_chunk_after_partial_write(self):
+        data = self._payload(CHUNK * 2 + 500)
+        self.fake.fail_chunks = {2: "partial"}
+        pieces = (data[i:i + 4096] for i in range(0, len(data), 4096))
+
+        m365_graph.upload_stream_to_folder(
+            "drive", "folder", "partial.bin", pieces, size=len(data), chunk_size=CHUNK, retry_delay=0,
+        )
+
+        self.assertEqual(self._stored("partial.bin"), data)
+
+    def test_gives_up_after_max_retries(self):
+        self.fake.fail_chunks = {n: "error" for n in range(1, 10)}
+
+        with self.assertRaises(m365_graph.GraphError):
+            m365_graph.upload_stream_to_folder(
+                "drive", "folder", "broken.bin", self._payload(CHUNK), chunk_size=CHUNK,
+                max_retries=2, retry_delay=0,
+            )
+
+    def test_upload_bytes_switches_to_session_for_large_content(self):
+        small = b"%PDF-small"
+        large = self._payload(m365_graph.SIMPLE_UPLOAD_LIMIT + 1)
+
+        m365_graph.upload_bytes_to_folder("drive", "folder", "small.pdf", small)
+        m365_graph.upload_bytes_to_folder("drive", "folder", "large.pdf", large)
+
+        self.assertEqual(self.fake.calls["handle_simple_upload"], 1)
+        self.assertEqual(self.fake.calls["handle_create_session"], 1)
+        self.assertEqual(self._stored("small.pdf"), small)
+        self.assertEqual(self._stored("large.pdf"), large)
+
+    def test_parallel_uploads(self):
+        blobs = {f"drawing_{i}.dwg": self._payload(CHUNK + i * 1000) for i in range(4)}
+
+        items = m365_graph.upload_many_to_folder(
+            [
+                {"drive_id": "drive", "folder_id": "folder", "filename": name, "source": data,
+                 "chunk_size": CHUNK}
+                for name, data in blobs.items()
+            ],
+            max_workers=4,
+        )
+
+        self.assertEqual([it["name"] for it in items], list(blobs))
+        for name, data in blobs.items():
+            self.assertEqual(self._stored(name), data)
+
+
+def _folder(item_id: str, name: str) -> dict:
+    return {"id": item_id, "name": name, "folder": {"childCount": 0}}
+
+
+class GraphBatchTests(SimpleTestCase):
+    """Читання дітей багатьох папок через $batch — проти локальної заглушки Graph."""
+
+    def setUp(self):
+        self.fake = FakeGraphServer(page_size=200).start()
+        self.addCleanup(self.fake.stop)
+
+        for target, value in (
+            ("GRAPH_BASE", self.fake.graph_base),
+            ("get_app_token", lambda: "test-token"),
+        ):
+            patcher = mock.patch.object(m365_graph, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        _isolated_graph_state(self)
+
+    def test_children_of_many_folders_with_paging(self):
+        for i in range(45):
+            self.fake.children[("drive", f"f{i}")] = [_folder(f"f{i}-c{j}", f"Child {j}") for j in range(3)]
+        self.fake.children[("drive", "f0")] = [_folder(f"big-{j}", f"Big {j}") for j in range(450)]
+
+        result = m365_graph.batch_list_children("drive", [f"f{i}" for i in range(45)])
+
+        self.assertEqual([it["id"] for it in result["f0"]], [f"big-{j}" for j in range(450)])
+        self.assertEqual([it["id"] for it in result["f44"]], ["f44-c0", "f44-c1", "f44-c2"])
+        # 45 папок = 3 батчі, далі по одному на кожну наступну сторінку великої папки
+        self.assertEqual(self.fake.calls["handle_batch"], 5)
+
+    def test_throttled_sub_request_is_retried(self):
+        self.fake.children[("drive", "a")] = [_folder("a1", "A1")]
+        self.fake.children[("drive", "b")] = [_folder("b1", "B1")]
+        self.fake.throttle_paths = {m365_graph.children_path("drive", "b"): 2}
+
+        result = m365_graph.batch_list_children("drive", ["a", "b"])
+
+        self.assertEqual(result["b"][0]["id"], "b1")
+        self.assertEqual(self.fake.calls["batch_throttled"], 2)
+        self.assertEqual(self.fake.calls["handle_batch"], 3)
+
+    def test_failed_sub_request_does_not_break_others(self):
+        self.fake.children[("drive", "a")] = [_folder("a1", "A1")]
+
+        result = m365_graph.batch_list_children("drive", ["a", "missing"])
+
+        self.assertEqual(result["a"][0]["id"], "a1")
+        self.assertIsInstance(result["missing"], m365_graph.GraphError)
+        self.assertEqual(result["missing"].status_code, 404)
+
+    def test_folders_are_resolved_concurrently_in_shared_batches(self):
+        import asyncio
+
+        from doors.management.commands.sync_m365_orders import fetch_folders
+
+        chains = {
+            "final": [
+                {"type": "child_contains", "value": "3 Креслення в роботу"},
+                {"type": "child_all_contains", "value": "Для КС"},
+            ],
+        }
+        for p in range(30):
+            self.fake.children[("drive", f"p{p}")] = [
+                _folder(f"p{p}-docs", "1 Документи"),
+                _folder(f"p{p}-work", "3 Креслення в роботу"),
+            ]
+            self.fake.children[("drive", f"p{p}-work")] = [
+                _folder(f"p{p}-ks1", "Для КС 1"),
+                _folder(f"p{p}-ks2", "Для КС 2"),
+                _folder(f"p{p}-other", "Інше"),
+            ]
+            for ks in ("ks1", "ks2"):
+                self.fake.children[("drive", f"p{p}-{ks}")] = [
+                    {"id": f"p{p}-{ks}-file", "name": "креслення.dwg", "file": {}},
+                ]
+        self.fake.children[("drive", "p0-work")] = []
+        folders = [_folder(f"p{p}", f"Проект {p}") for p in range(30)] + [_folder("missing", "Без доступу")]
+
+        results = asyncio.run(fetch_folders("drive", folders, chains, folder_timeout=30))
+
+        by_id = {folder["id"]: data for folder, data in results}
+        self.assertEqual(len(results), 31)
+        self.assertFalse(by_id["p0"]["has_data"])
+        self.assertEqual(by_id["p7"]["seen_file_ids"], {"p7-ks1-file", "p7-ks2-file"})
+        # помилка папки повертається явно, а не губиться
+        self.assertEqual(len(by_id["missing"]["chain_errors"]), 1)
+        self.assertIn("HTTP 404", by_id["missing"]["chain_errors"][0])
+        # 30 + 29 + 58 запитів зливаються в кілька батчів, а не 117 окремих викликів
+        self.assertLessEqual(self.fake.calls["handle_batch"], 12)
+
+
+class DriveDeltaTests(SimpleTestCase):
+    """Зміни з delta диска → папки проектів, які треба пересинхронізувати."""
+
+    def setUp(self):
+        self.fake = FakeGraphServer().start()
+        self.addCleanup(self.fake.stop)
+
+        for target, value in (
+            ("GRAPH_BASE", self.fake.graph_base),
+            ("get_app_token", lambda: "test-token"),
+        ):
+            patcher = mock.patch.object(m365_graph, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        _isolated_graph_state(self)
+
+        self.fake.children[("drive", "root")] = [_folder("p1", "Проект 1"), _folder("p2", "Проект 2")]
+        self.fake.children[("drive", "p1")] = [_folder("p1-work", "3 Креслення в роботу")]
+        self.fake.children[("drive", "p1-work")] = [_folder("p1-ks", "Для КС")]
+
+    def test_changed_items_are_mapped_to_project_folders(self):
+        from doors.management.commands.sync_m365_orders import projects_for_changes
+
+        link = m365_graph.drive_delta_latest("drive")
+        self.fake.touch("drive", {"id": "new-file", "name": "a.dwg", "file": {}, "parentReference": {"id": "p1-ks"}})
+        self.fake.touch("drive", {"id": "p2", "name": "Проект 2 (нова назва)", "folder": {},
+                                  "parentReference": {"id": "root"}})
+
+        changes, next_link = m365_graph.drive_delta("drive", link)
+
+        self.assertEqual(len(changes), 2)
+        self.assertNotEqual(next_link, link)
+        # предків файлу (p1-ks → p1-work → p1) дочитує $batch
+        self.assertEqual(projects_for_changes("drive", changes, {"p1", "p2"}, root_id="root"), {"p1", "p2"})
+        self.assertEqual(m365_graph.drive_delta("drive", next_link)[0], [])
+
+    def test_unchanged_project_folder_is_detected_by_ctag(self):
+        from doors.management.commands.sync_m365_orders import folder_unchanged
+
+        p1 = dict(self.fake.children[("drive", "root")][0], eTag='"p1,1"', cTag='"c:p1,1"')
+        self.fake.children[("drive", "root")][0] = p1
+        stored = (p1["eTag"], p1["cTag"])
+        self.assertTrue(folder_unchanged(m365_graph.list_root_children("drive")[0], stored))
+
+        # заглушка зсуває cTag предків, як OneDrive; SharePoint цього не обіцяє — див. folder_unchanged
+        self.fake.touch("drive", {"id": "new-file", "name": "a.dwg", "file": {}, "parentReference": {"id": "p1-ks"}})
+        listed = m365_graph.list_children("drive", "root", use_cache=False)[0]
+        self.assertFalse(folder_unchanged(listed, stored))
+        # без cTag (SharePoint для папок часто не віддає) — завжди обходимо
+        self.assertFalse(folder_unchanged({"id": "p1", "eTag": '"p1,1"'}, (p1["eTag"], None)))
+
+    def test_expired_delta_token_raises_410(self):
+        link = m365_graph.drive_delta_latest("drive")
+        self.fake.delta_floor["drive"] = 10
+
+        with self.assertRaises(m365_graph.GraphError) as ctx:
+            m365_graph.drive_delta("drive", link)
+        self.assertEqual(ctx.exception.status_code, 410)
+
+
+class FakeGraphTreeTests(SimpleTestCase):
+    """Згенероване дерево заглушки проходить тим самим шляхом, що й sync_m365_orders."""
+
+    def setUp(self):
+        self.fake = FakeGraphServer(page_size=50).start()
+        self.addCleanup(self.fake.stop)
+
+        for target, value in (
+            ("GRAPH_BASE", self.fake.graph_base),
+            ("get_app_token", lambda: "test-token"),
+        ):
+            patcher = mock.patch.object(m365_graph, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        _isolated_graph_state(self)
+
+    def test_sites_drives_search_and_content(self):
+        generate_project_tree(self.fake, "drive", projects=60, files_per_leaf=2, site_name="Проекти")
+        self.fake.throttle_every = 5
+
+        site = m365_graph.find_site_by_display_name("Проекти")
+        drive = m365_graph.pick_drive(site["id"], "Документи")
+        projects = m365_graph.list_root_children(drive["id"])
+        found = m365_graph.search_in_folder(drive["id"], projects[0]["id"], "Для КС")
+        leaf_files = m365_graph.list_children(drive["id"], found[0]["id"])
+
+        self.assertEqual(len(projects), 60)  # дві сторінки по 50
+        self.assertTrue(found and all("Для КС" in it["name"] for it in found))
+        r = m365_graph.get_session().get(m365_graph.item_content_url(drive["id"], leaf_files[0]["id"]))
+        self.assertEqual(len(r.content), leaf_files[0]["size"])
+        self.assertGreater(self.fake.calls["throttled"], 0)
+
+
+class AdaptiveLimiterTests(SimpleTestCase):
+    """Спільний обмежувач Graph: token bucket, AIMD-вікно, глобальний Retry-After."""
+
+    def test_token_bucket_caps_request_rate(self):
+        limiter = m365_limiter.AdaptiveLimiter(rate=100, burst=5, max_concurrency=50)
+
+        started = time.monotonic()
+        for _ in range(15):
+            limiter.acquire()
+            limiter.release(200)
+
+        # 5 з запасу + 10 по 10 мс
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+    def test_window_halves_on_throttle_and_grows_back(self):
+        limiter = m365_limiter.AdaptiveLimiter(rate=0, max_concurrency=8)
+
+        limiter.acquire()
+        limiter.release(429)
+        self.assertEqual(limiter.snapshot()["window"], 4)
+        self.assertEqual(limiter.snapshot()["throttled"], 1)
+
+        for _ in range(40):
+            limiter.acquire()
+            limiter.release(200)
+        self.assertEqual(limiter.snapshot()["window"], 8)
+
+    def test_concurrency_is_bounded_by_window(self):
+        limiter = m365_limiter.AdaptiveLimiter(rate=0, max_concurrency=2)
+        self.assertTrue(limiter.acquire(timeout=0.1))
+        self.assertTrue(limiter.acquire(timeout=0.1))
+        self.assertFalse(limiter.acquire(timeout=0.05))
+
+        limiter.release(200)
+        self.assertTrue(limiter.acquire(timeout=0.1))
+
+    def test_retry_after_pauses_every_thread(self):
+        limiter = m365_limiter.AdaptiveLimiter(rate=0, max_concurrency=8)
+        limiter.acquire()
+        limiter.release(429, retry_after=0.2)
+
+        waited = []
+
+        def worker():
+            started = time.monotonic()
+            limiter.acquire()
+            waited.append(time.monotonic() - started)
+            limiter.release(200)
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(waited), 3)
+        self.assertTrue(all(w >= 0.15 for w in waited), waited)
+
+    def test_graph_calls_go_through_shared_limiter(self):
+        with FakeGraphServer() as fake, \
+                mock.patch.object(m365_graph, "GRAPH_BASE", fake.graph_base), \
+                mock.patch.object(m365_graph, "get_app_token", lambda: "test-token"):
+            _isolated_graph_state(self)
+            fake.children[("drive", "root")] = [_folder("a", "A")]
+            fake.throttle_every = 2
+
+            m365_graph.list_children("drive", "root")
+            m365_graph.batch_list_children("drive", ["root"])
+
+            stats = m365_limiter.get_limiter().snapshot()
+        self.assertEqual(stats["throttled"], fake.calls["throttled"])
+        self.assertEqual(stats["requests"], fake.calls["http_requests"])
+
+
+class ChildrenCacheTests(SimpleTestCase):
+    """Кеш переліків дітей: TTL, перевірка мітки папки, інвалідація після upload."""
+
+    def setUp(self):
+        self.fake = FakeGraphServer().start()
+        self.addCleanup(self.fake.stop)
+
+        for target, value in (
+            ("GRAPH_BASE", self.fake.graph_base),
+            ("get_app_token", lambda: "test-token"),
+        ):
+            patcher = mock.patch.object(m365_graph, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        _isolated_graph_state(self)
+        self.cache = m365_cache.get_children_cache()
+
+        self.fake.children[("drive", "root")] = [dict(_folder("p", "Проект"), eTag='"p,1"', cTag='"c:p,1"')]
+        self.fake.children[("drive", "p")] = [_folder("a", "A"), _folder("b", "B")]
+        # мітку папки "p" кеш бачить у переліку кореня
+        m365_graph.list_children("drive", "root")
+        self.fake.calls.clear()
+
+    def _expire(self, item_id: str):
+        self.cache.get("drive", item_id).expires_at = 0
+
+    def test_fresh_listing_is_served_from_cache(self):
+        first = m365_graph.list_children("drive", "p")
+        second = m365_graph.list_children("drive", "p")
+        third = m365_graph.batch_list_children("drive", ["p"])["p"]
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, third)
+        self.assertEqual(self.fake.calls["http_requests"], 1)
+
+    def test_expired_listing_with_same_tag_is_revalidated(self):
+        m365_graph.list_children("drive", "p")
+        self._expire("p")
+        self.fake.calls.clear()
+
+        items = m365_graph.list_children("drive", "p")
+
+        self.assertEqual([it["id"] for it in items], ["a", "b"])
+        self.assertEqual(self.fake.calls["handle_item"], 1)
+        self.assertEqual(self.fake.calls["handle_children"], 0)
+
+    def test_changed_tag_relists_folder(self):
+        m365_graph.batch_list_children("drive", ["p"])
+        self._expire("p")
+        self.fake.children[("drive", "root")][0]["cTag"] = '"c:p,2"'
+        self.fake.children[("drive", "p")].append(_folder("c", "C"))
+
+        items = m365_graph.batch_list_children("drive", ["p"])["p"]
+
+        self.assertEqual([it["id"] for it in items], ["a", "b", "c"])
+        self.assertEqual(self.cache.get("drive", "p").tag, '"c:p,2"')
+
+    def test_folder_without_ctag_expires_instead_of_revalidating_by_etag(self):
+        # eTag папки не змінюється, коли змінюються її діти
+        del self.fake.children[("drive", "root")][0]["cTag"]
+        self.cache.clear()
+        m365_graph.list_children("drive", "root")
+        m365_graph.list_children("drive", "p")
+        self._expire("p")
+        self.fake.children[("drive", "p")].append(_folder("c", "C"))
+        self.fake.calls.clear()
+
+        items = m365_graph.list_children("drive", "p")
+
+        self.assertEqual([it["id"] for it in items], ["a", "b", "c"])
+        self.assertEqual(self.fake.calls["handle_item"], 0)
+        self.assertIsNone(self.cache.get("drive", "p").tag)
+
+        self._expire("p")
+        self.fake.calls.clear()
+        m365_graph.batch_list_children("drive", ["p"])
+        # лише перелік, без $batch із метаданими папки
+        self.assertEqual(self.fake.calls["handle_batch"], 1)
+
+    def test_upload_invalidates_folder_listing(self):
+        m365_graph.list_children("drive", "p")
+        m365_graph.upload_bytes_to_folder("drive", "p", "new.pdf", b"%PDF")
+
+        self.assertIsNone(self.cache.get("drive", "p"))
+
+    def test_memory_is_bounded(self):
+        cache = m365_cache.ChildrenCache(ttl=60, max_entries=2, max_items=2)
+        cache.put("d", "x", [_folder("x1", "1")])
+        cache.put("d", "y", [_folder("y1", "1")])
+        cache.put("d", "z", [_folder("z1", "1"), _folder("z2", "2")])
+
+        self.assertIsNone(cache.get("d", "x"))
+        self.assertIsNone(cache.get("d", "y"))
+        self.assertEqual(cache.stats()["items"], 2)
+
+
+class GraphInstrumentationTests(SimpleTestCase):
+    """Метрики викликів Graph за endpoint-ами і запобіжник."""
+
+    def setUp(self):
+        _isolated_graph_state(self)
+        patcher = mock.patch.object(m365_graph, "get_app_token", lambda: "test-token")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_calls_are_counted_per_endpoint_class(self):
+        with FakeGraphServer() as fake, mock.patch.object(m365_graph, "GRAPH_BASE", fake.graph_base):
+            fake.children[("drive", "root")] = [_folder("a", "A")]
+            fake.children[("drive", "a")] = [_folder("a1", "A1")]
+            fake.throttle_paths = {m365_graph.children_path("drive", "a"): 1}
+
+            m365_graph.list_children("drive", "root")
+            m365_graph.batch_list_children("drive", ["a"])
+
+        stats = m365_metrics.get_metrics().snapshot()
+        self.assertEqual(stats["children"]["calls"], 1)
+        self.assertGreater(stats["children"]["bytes"], 0)
+        self.assertEqual(stats["batch"]["calls"], 2)
+        self.assertEqual(stats["batch"]["retries"], 1)
+        self.assertEqual(stats["batch"]["throttled"], 1)
+
+        summary = m365_metrics.summarize([dict(v, endpoint=k) for k, v in stats.items()])
+        self.assertEqual(summary["batch"]["calls"], 2)
+        self.assertIsNotNone(summary["batch"]["p95_ms"])
+
+    def test_endpoint_classes(self):
+        base = m365_graph.GRAPH_BASE
+        self.assertEqual(m365_metrics.endpoint_class("GET", f"{base}/drives/d/items/x/children?$top=5"), "children")
+        self.assertEqual(m365_metrics.endpoint_class("GET", m365_graph.item_thumbnail_url("d", "x")), "thumbnail")
+        self.assertEqual(m365_metrics.endpoint_class("GET", m365_graph.item_content_url("d", "x")), "content")
+        self.assertEqual(m365_metrics.endpoint_class("PUT", f"{base}/drives/d/items/x:/a.pdf:/content"), "upload")
+        self.assertEqual(m365_metrics.endpoint_class("PUT", "https://tenant.sharepoint.com/upload?x=1"), "upload")
+        self.assertEqual(m365_metrics.endpoint_class("GET", f"{base}/drives/d/items/x?$select=id"), "item")
+
+    def test_breaker_fails_fast_after_repeated_errors(self):
+        # на цьому порту ніхто не слухає — кожен запит падає з ConnectionError
+        with mock.patch.object(m365_graph, "GRAPH_BASE", "http://127.0.0.1:9/v1.0"):
+            for _ in range(5):
+                with self.assertRaises(m365_graph.requests.RequestException):
+                    m365_graph.graph_get("/drives/d/items/x")
+
+            with self.assertRaises(m365_graph.GraphUnavailable) as ctx:
+                m365_graph.graph_get("/drives/d/items/x")
+
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertEqual(m365_limiter.get_breaker().state, "open")
+        self.assertEqual(m365_metrics.get_metrics().snapshot()["item"]["errors"], 5)
+
+    def test_breaker_closes_after_successful_probe(self):
+        breaker = m365_limiter.CircuitBreaker(threshold=2, cooldown=0.05)
+        breaker.failure()
+        breaker.failure()
+        self.assertGreater(breaker.allow(), 0)
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.allow(), 0)
+        # поки пробний запит у дорозі, решта відхиляється
+        self.assertGreater(breaker.allow(), 0)
+        breaker.success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_proxy_views_answer_503_while_graph_is_unavailable(self):
+        from django.test import RequestFactory
+
+        from doors.views import _graph_unavailable_as_503
+
+        @_graph_unavailable_as_503
+        def view(request):
+            raise m365_graph.GraphUnavailable(12)
+
+        resp = view(RequestFactory().get("/"))
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp["Retry-After"], "12")
+
+
+class PooledSessionTests(SimpleTestCase):
+    """Виклики Graph і стріми файлів ідуть через одне keep-alive зʼєднання спільної сесії."""
+
+    def setUp(self):
+        _isolated_graph_state(self)
+        for target, value in (("get_app_token", lambda: "test-token"), ("_session", None)):
+            patcher = mock.patch.object(m365_graph, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_calls_and_streams_reuse_one_connection(self):
+        with FakeGraphServer() as fake, mock.patch.object(m365_graph, "GRAPH_BASE", fake.graph_base):
+            fake.children[("d", "root")] = [_folder("a", "A"), {"id": "f1", "name": "x.pdf", "file": {}, "size": 300_000}]
+            connections = []
+            accept = fake._httpd.process_request
+
+            def counting_accept(request, address):
+                connections.append(address)
+                accept(request, address)
+
+            fake._httpd.process_request = counting_accept
+
+            for _ in range(5):
+                self.assertEqual(m365_graph.graph_get("/drives/d/items/a")["id"], "a")
+            r = m365_graph.graph_stream(m365_graph.item_content_url("d", "f1"), "test-token")
+            self.assertEqual(sum(len(chunk) for chunk in m365_graph.iter_response(r)), 300_000)
+            m365_graph.graph_get("/drives/d/items/a")
+
+        self.assertEqual(len(connections), 1)
+        self.assertIs(m365_graph.get_session(), m365_graph.get_session())
+
+
+class SyncScheduleTests(SimpleTestCase):
+    """Розклад sync_m365_orders --watch: інтервали сайтів, backoff, блокування."""
+
+    def setUp(self):
+        self.now = 1000.0
+        self.schedule = sync_schedule.SiteSchedule(
+            ["A", "B"], interval=60, jitter=0, max_backoff=300, site_intervals={"B": 600},
+            clock=lambda: self.now,
+        )
+
+    def test_sites_follow_their_own_intervals(self):
+        self.assertEqual(self.schedule.due(), ["A", "B"])
+        self.assertEqual(self.schedule.done("A", ok=True), 60)
+        self.assertEqual(self.schedule.done("B", ok=True), 600)
+
+        self.now += 60
+        self.assertEqual(self.schedule.due(), ["A"])
+        self.assertEqual(self.schedule.sleep_for(), 0)
+
+    def test_failures_back_off_exponentially_up_to_the_cap(self):
+        delays = [self.schedule.done("A", ok=False) for _ in range(4)]
+        self.assertEqual(delays, [120, 240, 300, 300])
+        self.assertEqual(self.schedule.done("A", ok=True), 60)
+        self.assertEqual(self.schedule.failures["A"], 0)
+
+    def test_jitter_spreads_the_interval(self):
+        import random
+
+        schedule = sync_schedule.SiteSchedule(["A"], interval=100, jitter=0.2, rnd=random.Random(1))
+        delays = {round(schedule.done("A", ok=True), 3) for _ in range(20)}
+        self.assertGreater(len(delays), 1)
+        self.assertTrue(all(80 <= d <= 120 for d in delays))
+
+    @skipIf(sync_schedule.fcntl is None, "fcntl недоступний")
+    def test_second_run_is_skipped_while_lock_is_held(self):
+        import tempfile
+
+        path = tempfile.mktemp(suffix=".lock")
+        with sync_schedule.sync_lock(path) as first:
+            with sync_schedule.sync_lock(path) as second:
+                self.assertTrue(first)
+                self.assertFalse(second)
+        with sync_schedule.sync_lock(path) as again:
+            self.assertTrue(again)
+
+
+class PdfSyncQueueTests(TestCase):
+    """Черга PdfSyncJob: захоплення, повтори, зависли задачі, заміна параметрів."""
+
+    def setUp(self):
+        from doors.models import Order
+
+        self.order = Order.objects.create(order_number="Q-1")
+
+    def _job(self, **kwargs):
+        from doors.models import PdfSyncJob
+
+        return PdfSyncJob.objects.create(order=self.order, **{"mode": "precalc", **kwargs})
+
+    def test_each_job_is_claimed_once(self):
+        from doors.services.pdf_sync import claim_next_job
+
+        first, second = self._job(mode="precalc"), self._job(mode="final")
+
+        claimed = [claim_next_job(), claim_next_job()]
+
+        self.assertEqual({j.id for j in claimed}, {first.id, second.id})
+        self.assertTrue(all(j.status == "running" and j.attempts == 1 for j in claimed))
+        self.assertIsNone(claim_next_job())
+
+    def test_failed_attempt_is_retried_with_backoff_then_fails(self):
+        from doors.services import pdf_sync
+
+        job = self._job(max_attempts=2)
+        with mock.patch.object(pdf_sync, "_execute", side_effect=RuntimeError("Graph down")), \
+                self.assertLogs("doors.services.pdf_sync", "ERROR"):
+            job = pdf_sync.run_pdf_sync_job(pdf_sync.claim_next_job())
+            self.assertEqual(job.status, "queued")
+            self.assertGreater(job.run_after, timezone.now())
+
+            job.run_after = timezone.now()
+            job.save(update_fields=["run_after"])
+            job = pdf_sync.run_pdf_sync_job(pdf_sync.claim_next_job())
+
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.attempts, 2)
+
+    def test_stale_running_jobs_are_requeued_until_attempts_run_out(self):
+        from doors.models import PdfSyncJob
+        from doors.services.pdf_sync import STALE_RUNNING_AFTER, requeue_stale_jobs
+
+        crashed_once = self._job(mode="precalc", status="running", attempts=1)
+        crashed_always = self._job(mode="final", status="running", attempts=3, max_attempts=3)
+        PdfSyncJob.objects.update(updated_at=timezone.now() - STALE_RUNNING_AFTER - timedelta(minutes=1))
+
+        with self.assertLogs("doors.services.pdf_sync", "WARNING"):
+            self.assertEqual(requeue_stale_jobs(), 1)
+
+        crashed_once.refresh_from_db()
+        crashed_always.refresh_from_db()
+        self.assertEqual(crashed_once.status, "queued")
+        self.assertEqual(crashed_always.status, "failed")
+        self.assertIsNotNone(crashed_always.finished_at)
+
+    def test_new_payload_resets_progress_of_queued_retry(self):
+        from doors.services.pdf_sync import enqueue_pdf_sync
+
+        job = self._job(payload={"markup": 10}, result={"uploaded": ["f1/old.pdf"]}, progress_done=1)
+
+        same, created = enqueue_pdf_sync(self.order, "precalc", {"markup": 20})
+
+        self.assertFalse(created)
+        self.assertEqual(same.id, job.id)
+        self.assertEqual(same.payload, {"markup": 20})
+        self.assertIsNone(same.result)
+        self.assertEqual(same.progress_done, 0)
+
+
+class ReportViewTests(TestCase):
+    """report_view: підсумки одним агрегатом і навігація сторінками зі збереженням фільтрів."""
+
+    def setUp(self):
+        from django.core.cache import caches
+
+        from doors.models import Order, OrderProgress
+
+        caches["reports"].clear()
+        for i in range(5):
+            Order.objects.create(order_number=f"R-{i}", total_cost=100, completion_percent=10)
+        Order.objects.create(order_number="R-P", total_cost=1000, status="postponed")
+        OrderProgress.objects.create(order=Order.objects.get(order_number="R-0"), percent=60)
+
+    def test_totals_cover_all_pages_and_skip_postponed_value(self):
+        response = self.client.get("/report/", {"per_page": 2})
+
+        self.assertEqual(len(response.context["orders"]), 2)
+        self.assertEqual(response.context["orders_count"], 6)
+        self.assertEqual(response.context["postponed_count"], 1)
+        self.assertEqual(response.context["total_value"], 500)
+        # (60 + 4·10) / 5 активних
+        self.assertAlmostEqual(response.context["avg_progress"], 20.0)
+
+    def test_page_links_keep_per_page_and_filters(self):
+        today = timezone.localdate().isoformat()
+
+        response = self.client.get("/report/", {"per_page": 2, "page": 2, "start_date": today})
+
+        self.assertEqual(response.context["page_obj"].number, 2)
+        self.assertContains(response, f'href="?per_page=2&amp;page=1&amp;start_date={today}"')
+        self.assertContains(response, f'href="?per_page=2&amp;page=3&amp;start_date={today}"')
+
+
+class XlsxExportTests(TestCase):
+    """Експорт звіту в .xlsx: рядки з генератора, підсумок окремим блоком унизу."""
+
+    def test_report_export_writes_rows_from_iterator_and_footer(self):
+        from openpyxl import load_workbook
+
+        from doors.models import Order
+
+        for i in range(3):
+            Order.objects.create(order_number=f"X-{i}", total_cost=10)
+
+        response = self.client.get("/report/", {"export": "excel"})
+        content = b"".join(response.streaming_content)
+        response.close()
+
+        self.assertIn("attachment", response["Content-Disposition"])
+        ws = load_workbook(io.BytesIO(content)).active
+        rows = [r for r in ws.iter_rows(values_only=True) if any(v not in (None, "") for v in r)]
+        self.assertEqual(rows[0][:2], ("№", "Номер"))
+        self.assertEqual({r[1] for r in rows[1:4]}, {"X-0", "X-1", "X-2"})
+        self.assertEqual(rows[-1][1:4], ("Разом:", None, 30))
+
+    def test_first_bytes_are_sent_before_rows_are_read(self):
+        from zipfile import ZipFile
+
+        from doors.services.xlsx_export import EXPORT_FLUSH_BYTES, iter_xlsx
+
+        consumed = []
+
+        def rows():
+            for i in range(20000):
+                consumed.append(i)
+                yield [i, f"рядок {i}", i / 3]
+
+        chunks = iter_xlsx("Аркуш", ["№", "Текст", "Число"], rows(), footer=[["Разом", "", 1]])
+        first = next(chunks)
+        self.assertTrue(first.startswith(b"PK"))
+        self.assertEqual(consumed, [])
+
+        second = next(chunks)
+        self.assertGreaterEqual(len(second), EXPORT_FLUSH_BYTES)
+        self.assertLess(len(consumed), 20000)
+
+        content = first + second + b"".join(chunks)
+        self.assertIsNone(ZipFile(io.BytesIO(content)).testzip())
+
+    def test_period_export_streams_the_same_values_as_the_report(self):
+        from datetime import date
+
+        from openpyxl import load_workbook
+
+        from doors.models import Order, OrderProgress, Worker, WorkLog
+        from doors.services.progress_snapshots import rebuild_order_snapshots
+        from doors.views import _period_report_context
+
+        anna = Worker.objects.create(name="Анна")
+        for n, points in enumerate((((1, 20), (3, 60)), ((2, 10), (4, 30)))):
+            order = Order.objects.create(order_number=f"S-{n}", total_ks=10 + n)
+            for day, percent in points:
+                progress = OrderProgress.objects.create(order=order, percent=percent)
+                OrderProgress.objects.filter(pk=progress.pk).update(date=date(2025, 5, day))
+            rebuild_order_snapshots(order)
+        for day in (1, 2, 4):
+            WorkLog.objects.create(worker=anna, date=date(2025, 5, day), hours=day + 1)
+
+        response = self.client.get(
+            "/report/period/", {"start_date": "2025-05-02", "end_date": "2025-05-05", "export": "excel"}
+        )
+        content = b"".join(response.streaming_content)
+        response.close()
+
+        rows = [r for r in load_workbook(io.BytesIO(content)).active.iter_rows(values_only=True) if any(r)]
+        context = _period_report_context(date(2025, 5, 2), date(2025, 5, 5))
+        expected = [
+            (row["date"].strftime("%d.%m.%Y"), row["S-0"], row["S-1"], float(row[anna.id]), float(row["total"]))
+            for row in context["table"]
+        ]
+        self.assertEqual(rows[1:5], expected)
+        self.assertEqual(rows[5][:4], ("Разом", 60, 30, float(context["total_all"])))
+        self.assertAlmostEqual(rows[6][1], float(context["vzag"]))
+        self.assertAlmostEqual(rows[9][1], round(float(context["eff_percent"]), 1))
+
+
+class PeriodReportMatrixTests(TestCase):
+    """Звіт за період: % по днях з прогалинами заповнюється останнім відомим значенням."""
+
+    def test_progress_is_forward_filled_between_entries(self):
+        from datetime import date
+
+        from doors.models import Order, OrderProgress
+        from doors.services.progress_snapshots import rebuild_order_snapshots
+        from doors.views import _period_report_context
+
+        order = Order.objects.create(order_number="P-1", total_ks=10)
+        for day, percent in ((date(2025, 3, 1), 20), (date(2025, 3, 4), 50), (date(2025, 3, 6), 80)):
+            progress = OrderProgress.objects.create(order=order, percent=percent)
+            OrderProgress.objects.filter(pk=progress.pk).update(date=day)
+        rebuild_order_snapshots(order)
+
+        context = _period_report_context(date(2025, 3, 2), date(2025, 3, 5))
+
+        self.assertEqual([row["P-1"] for row in context["table"]], [20.0, 20.0, 50.0, 50.0])
+        self.assertEqual(context["totals_orders"], {"P-1": 50.0})
+        # (50% − 20%) · 10 к/с
+        self.assertEqual(context["vza_period_by_order"]["P-1"], 3)
+
+
+class ProgressSnapshotSignalTests(TestCase):
+    """Знімки % оновлюються на будь-яку зміну OrderProgress / Order, не лише з views."""
+
+    def setUp(self):
+        from doors.models import Order
+
+        self.order = Order.objects.create(order_number="S-1", total_ks=10)
+
+    def _snapshots(self):
+        return list(self.order.progress_snapshots.order_by("date").values_list("date", "percent", "ks_done"))
+
+    def test_orm_edits_and_deletes_of_progress_rebuild_snapshots(self):
+        from datetime import date
+
+        from doors.models import OrderProgress
+
+        today = timezone.localdate()
+        progress = OrderProgress.objects.create(order=self.order, percent=40)
+        self.assertEqual(self._snapshots(), [(today, 40, 4)])
+
+        # як правка в адмінці: інша дата і %
+        moved = date.fromordinal(today.toordinal() - 2)
+        progress.date, progress.percent = moved, 30
+        progress.save()
+        self.assertEqual(self._snapshots(), [(moved, 30, 3)])
+
+        progress.delete()
+        self.assertEqual(self._snapshots(), [])
+
+    def test_total_ks_change_refreshes_ks_done(self):
+        from doors.models import OrderProgress
+
+        OrderProgress.objects.create(order=self.order, percent=50)
+
+        self.order.total_ks = 20
+        self.order.save()
+
+        self.assertEqual(self._snapshots()[0][2], 10)
+
+    def test_order_delete_cascades_without_rebuilding(self):
+        from doors.models import OrderProgress, OrderProgressSnapshot
+
+        OrderProgress.objects.create(order=self.order, percent=50)
+
+        with mock.patch("doors.signals.rebuild_order_snapshots") as rebuild:
+            self.order.delete()
+
+        rebuild.assert_not_called()
+        self.assertFalse(OrderProgressSnapshot.objects.exists())
+
+
+class HoursRollupSignalTests(TestCase):
+    """Підсумки годин стежать за будь-якими змінами WorkLog і збігаються з повним перерахунком."""
+
+    def setUp(self):
+        from doors.models import Worker
+
+        self.anna = Worker.objects.create(name="Анна")
+        self.ivan = Worker.objects.create(name="Іван")
+
+    def _rollups(self):
+        from doors.models import WorkerHoursRollup
+
+        return sorted(
+            WorkerHoursRollup.objects.values_list("worker_id", "period", "period_start", "hours", "work_hours", "entries")
+        )
+
+    def _assert_matches_rebuild(self):
+        from doors.services.hours_rollups import rebuild_rollups
+
+        maintained = self._rollups()
+        rebuild_rollups()
+        self.assertEqual(maintained, self._rollups())
+
+    def test_edits_move_hours_between_workers_and_months(self):
+        from datetime import date
+
+        from doors.models import WorkLog
+
+        log = WorkLog.objects.create(worker=self.anna, date=date(2025, 1, 31), hours=8, work_hours=6)
+        WorkLog.objects.create(worker=self.anna, date=date(2025, 1, 30), hours=4)
+
+        # як правка в адмінці: інший працівник, дата і години
+        log.worker, log.date, log.hours = self.ivan, date(2025, 2, 1), 5
+        log.save()
+
+        self._assert_matches_rebuild()
+        self.assertEqual({p for _, p, *_ in self._rollups()}, {"day", "week", "month"})
+
+    def test_deletes_including_order_cascade_are_subtracted(self):
+        from datetime import date
+
+        from doors.models import Order, WorkerHoursRollup, WorkLog
+
+        order = Order.objects.create(order_number="H-1")
+        WorkLog.objects.create(worker=self.anna, order=order, date=date(2025, 1, 10), hours=3)
+        kept = WorkLog.objects.create(worker=self.anna, date=date(2025, 1, 10), hours=2)
+        WorkLog.objects.create(worker=self.ivan, date=date(2025, 1, 11), hours=7)
+
+        order.delete()
+        self._assert_matches_rebuild()
+
+        kept.delete()
+        self.ivan.delete()
+        self.assertFalse(WorkerHoursRollup.objects.exists())
+
+
+class ReportCacheInvalidationTests(TestCase):
+    """Версія даних звітів росте лише від змін, які видно у звітах."""
+
+    def setUp(self):
+        from doors.models import Order
+
+        self.order = Order.objects.create(order_number="C-1", total_ks=5)
+
+    @contextlib.contextmanager
+    def assertVersionBumped(self, bumped=True):
+        from doors.services.report_cache import data_version
+
+        before = data_version()
+        yield
+        (self.assertGreater if bumped else self.assertEqual)(data_version(), before)
+
+    def test_sync_only_order_fields_keep_cached_reports(self):
+        self.order.remote_etag = '"e:1"'
+        with self.assertVersionBumped(False):
+            self.order.save(update_fields=["remote_etag"])
+        with self.assertVersionBumped(False):
+            self.order.save()
+
+    def test_report_fields_of_order_invalidate(self):
+        self.order.status = "postponed"
+        with self.assertVersionBumped():
+            self.order.save()
+        self.order.total_ks = 7
+        with self.assertVersionBumped():
+            self.order.save(update_fields=["total_ks"])
+        with self.assertVersionBumped():
+            self.order.delete()
+
+    def test_other_report_sources_always_invalidate_and_unrelated_models_do_not(self):
+        from doors.models import PdfSyncJob, Worker
+
+        with self.assertVersionBumped():
+            Worker.objects.create(name="Олег")
+        with self.assertVersionBumped(False):
+            PdfSyncJob.objects.create(order=self.order, mode="precalc")
+
+
+class PeriodReportPdfTests(TestCase):
+    """PDF звіту за період: широка таблиця ділиться на групи стовпців."""
+
+    def test_wide_report_is_split_into_column_groups(self):
+        from doors.models import Order, OrderProgress, Worker, WorkLog
+
+        today = timezone.localdate()
+        for i in range(30):
+            order = Order.objects.create(order_number=f"W-{i:02}", order_name=f"Замовлення {i}", total_ks=10)
+            OrderProgress.objects.create(order=order, percent=i)
+        WorkLog.objects.create(worker=Worker.objects.create(name="Анна"), date=today, hours=8)
+
+        response = self.client.get(
+            "/report/period/", {"start_date": today.isoformat(), "end_date": today.isoformat(), "export": "pdf"}
+        )
+        content = b"".join(response.streaming_content)
+        response.close()
+
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(content.startswith(b"%PDF"))
+        # 31 змінний стовпець → 3 групи таблиць + сторінка підсумків
+        self.assertRegex(content, rb"/Count 4\b")
+
+
+class GeneratePdfTests(TestCase):
+    """generate_pdf рендерить усі три режими КП зі спільним стилем таблиць."""
+
+    def test_all_modes_render(self):
+        import json
+
+        from django.core.management import call_command
+
+        out = io.StringIO()
+        call_command("bench_pdf", sizes="3", repeat=1, stdout=out, stderr=io.StringIO())
+        results = json.loads(out.getvalue())["results"]
+
+        self.assertEqual({row["mode"] for row in results}, {"detailed", "simple", "internal"})
+        self.assertTrue(all(row["pdf_bytes"] > 0 for row in results))
+
+
+class EfficiencySeriesTests(TestCase):
+    """Точка ряду ефективності = звіт за період з тим самим вікном."""
+
+    def test_window_point_matches_period_report(self):
+        from datetime import date
+
+        from doors.models import Order, OrderProgress, Worker, WorkLog
+        from doors.services.progress_snapshots import rebuild_order_snapshots
+        from doors.views import _period_report_context
+
+        worker = Worker.objects.create(name="Анна")
+        for n, (total_ks, points) in enumerate(((20, ((1, 10), (5, 40), (9, 70))), (8, ((3, 50), (12, 100))))):
+            order = Order.objects.create(order_number=f"E-{n}", total_ks=total_ks)
+            for day, percent in points:
+                progress = OrderProgress.objects.create(order=order, percent=percent)
+                OrderProgress.objects.filter(pk=progress.pk).update(date=date(2025, 4, day))
+            rebuild_order_snapshots(order)
+        for day in range(1, 13):
+            WorkLog.objects.create(worker=worker, date=date(2025, 4, day), hours=day % 3 + 4)
+
+        response = self.client.get(
+            "/report/efficiency/", {"start_date": "2025-04-10", "end_date": "2025-04-12", "window": 7}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        points = response.json()["points"]
+        self.assertEqual([p["date"] for p in points], ["2025-04-10", "2025-04-11", "2025-04-12"])
+        for point in points:
+            end = date.fromisoformat(point["date"])
+            report = _period_report_context(date.fromordinal(end.toordinal() - 6), end)
+            window = point["windows"]["7"]
+            self.assertAlmostEqual(window["vzag"], float(report["vzag"]), places=3)
+            self.assertAlmostEqual(window["t_fact"], float(report["t_fact"]), places=2)
+            self.assertAlmostEqual(window["eff_percent"], round(float(report["eff_percent"]), 1), places=1)
+
+    def test_weekly_points_read_weekly_rollups(self):
+        from datetime import date
+
+        from doors.models import Worker, WorkLog
+        from doors.views import _period_report_context
+
+        worker = Worker.objects.create(name="Анна")
+        for day in range(1, 31):
+            WorkLog.objects.create(worker=worker, date=date(2025, 3, day), hours=day % 4 + 2)
+
+        # неділі 16.03 і 23.03; вікно 30 днів починається в суботу — край рахується з денних рядків
+        with self.assertNumQueries(5):
+            response = self.client.get(
+                "/report/efficiency/",
+                {"start_date": "2025-03-16", "end_date": "2025-03-23", "freq": "week", "window": [7, 30]},
+            )
+
+        points = response.json()["points"]
+        self.assertEqual([p["date"] for p in points], ["2025-03-16", "2025-03-23"])
+        for point in points:
+            end = date.fromisoformat(point["date"])
+            for w in (7, 30):
+                report = _period_report_context(date.fromordinal(end.toordinal() - w + 1), end)
+                self.assertAlmostEqual(point["windows"][str(w)]["t_fact"], float(report["t_fact"]), places=2)
+
+    def test_rejects_unknown_window(self):
+        response = self.client.get("/report/efficiency/", {"window": 14})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class AppTokenTests(TransactionTestCase):
+    """Токен Graph: один запит до MSAL на всі потоки і процеси, оновлення у фоні."""
+
+    def setUp(self):
+        from doors.services import m365_token
+
+        self.token = m365_token
+        self.issued = []
+
+        def acquire():
+            time.sleep(0.05)
+            self.issued.append(f"token-{len(self.issued) + 1}")
+            return self.issued[-1], timezone.now() + timedelta(hours=1)
+
+        for target, value in (("_acquire_from_msal", acquire), ("_cached", {"token": None, "expires_at": None})):
+            patcher = mock.patch.object(m365_token, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _forget_process_copy(self):
+        # як новий gunicorn-воркер: памʼять порожня, рядок у БД є
+        self.token._cached.update(token=None, expires_at=None)
+
+    def test_concurrent_callers_share_one_msal_request(self):
+        from django.db import connection
+
+        results = []
+
+        def call():
+            results.append(self.token.get_app_token())
+            connection.close()
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(self.issued, ["token-1"])
+        self.assertEqual(results, ["token-1"] * 8)
+
+        self._forget_process_copy()
+        self.assertEqual(self.token.get_app_token(), "token-1")
+        self.assertEqual(len(self.issued), 1)
+
+    def test_rejected_token_is_replaced_once_for_everyone(self):
+        self.assertEqual(self.token.get_app_token(), "token-1")
+
+        self.assertEqual(self.token.refresh_app_token(rejected="token-1"), "token-2")
+        self._forget_process_copy()
+        self.assertEqual(self.token.refresh_app_token(rejected="token-1"), "token-2")
+        self.assertEqual(self.issued, ["token-1", "token-2"])
+
+    def test_token_near_expiry_is_served_while_refreshing_in_background(self):
+        from doors.models import M365AccessToken
+
+        soon = timezone.now() + timedelta(seconds=self.token.REFRESH_MARGIN - 60)
+        M365AccessToken.objects.create(key=self.token.TOKEN_KEY, access_token="old", expires_at=soon)
+        self.token._cached.update(token="old", expires_at=soon)
+
+        self.assertEqual(self.token.get_app_token(), "old")
+        for _ in range(100):
+            if self.token._cached["token"] != "old":
+                break
+            time.sleep(0.02)
+        with self.token._background_lock:  # фоновий потік завершився
+            pass
+        self.assertEqual(self.token.get_app_token(), "token-1")
+        self.assertEqual(M365AccessToken.objects.get().access_token, "token-1")
+
+
+class AsyncGraphClientTests(TestCase):
+    """AsyncGraphClient: межу одночасних запитів задає вікно обмежувача; потоки прибирають за собою БД."""
+
+    @override_settings(M365_SYNC_WORKERS=1)
+    def test_in_flight_batches_are_capped_by_the_limiter_window(self):
+        import asyncio
+
+        from doors.services import m365_async
+
+        _isolated_graph_state(self)
+        limiter = m365_limiter.AdaptiveLimiter(rate=0, max_concurrency=6)
+        limiter.window = 3.0  # як після урізання на 429
+        peak = []
+        acquire = limiter.acquire
+
+        def tracking_acquire(*args, **kwargs):
+            ok = acquire(*args, **kwargs)
+            peak.append((limiter.in_flight, int(limiter.window)))
+            return ok
+
+        async def walk():
+            async with m365_async.AsyncGraphClient() as client:
+                await asyncio.gather(*(client.list_children("drive", f"f{i}") for i in range(160)))
+                return client
+
+        with FakeGraphServer() as fake, \
+                mock.patch.object(m365_graph, "GRAPH_BASE", fake.graph_base), \
+                mock.patch.object(m365_graph, "get_app_token", lambda: "test-token"), \
+                mock.patch.object(m365_limiter, "_limiter", limiter), \
+                mock.patch.object(limiter, "acquire", tracking_acquire):
+            for i in range(160):
+                fake.children[("drive", f"f{i}")] = []
+            fake.latency = 0.05
+            client = asyncio.run(walk())
+
+        # потоків стільки, скільки стеля вікна, а не M365_SYNC_WORKERS
+        self.assertEqual(client.max_in_flight, 6)
+        self.assertEqual(client.batches_sent, 8)
+        # в дорозі ніколи більше, ніж дозволяє поточне вікно, і вікно реально заповнюється
+        self.assertTrue(all(in_flight <= window for in_flight, window in peak))
+        self.assertGreater(max(in_flight for in_flight, _ in peak), 1)
+
+    def test_executor_threads_close_db_connections(self):
+        import asyncio
+
+        from doors.models import M365AccessToken
+        from doors.services import m365_async
+
+        used, closed = set(), set()
+
+        def token_from_db():
+            # як m365_token: читання рядка токена в потоці клієнта
+            M365AccessToken.objects.filter(key="graph_app").exists()
+            used.add(threading.get_ident())
+            return "test-token"
+
+        async def walk():
+            async with m365_async.AsyncGraphClient(max_in_flight=2) as client:
+                return await asyncio.gather(*(client.list_children("drive", f"f{i}") for i in range(30)))
+
+        with FakeGraphServer() as fake, \
+                mock.patch.object(m365_graph, "GRAPH_BASE", fake.graph_base), \
+                mock.patch.object(m365_graph, "get_app_token", token_from_db), \
+                mock.patch.object(m365_async.connections, "close_all", lambda: closed.add(threading.get_ident())):
+            _isolated_graph_state(self)
+            for i in range(30):
+                fake.children[("drive", f"f{i}")] = [_folder(f"f{i}-c", "C")]
+            results = asyncio.run(walk())
+
+        self.assertEqual(results[29][0]["id"], "f29-c")
+        self.assertTrue(used)
+        self.assertNotIn(threading.get_ident(), used)
+        self.assertLessEqual(used, closed)
+
+
+class SyncUpsertTests(TestCase):
+    """Масовий upsert файлів папки в sync_m365_orders."""
+
+    def setUp(self):
+        from doors.models import Order
+
+        self.order = Order.objects.create(order_number="U-1")
+
+    def _item(self, item_id, etag="e1"):
+        return {"id": item_id, "name": f"{item_id}.pdf", "web": f"https://x/{item_id}", "size": 10,
+                "version": {"remote_etag": etag, "remote_ctag": None, "remote_modified_at": None}}
+
+    def _upsert(self, items):
+        from doors.management.commands.sync_m365_orders import Command
+        from doors.models import OrderFile
+
+        return Command._upsert_items(OrderFile, items, self.order,
+                                     {"source": "m365", "remote_site_id": "s", "remote_drive_id": "d"})
+
+    def test_created_counts_only_inserted_rows_and_updates_only_changed(self):
+        from doors.models import OrderFile
+
+        # той самий файл двічі в переліку — один рядок
+        self.assertEqual(self._upsert([self._item("a"), self._item("b"), self._item("a")]), (2, 0, 0))
+        self.assertEqual(self._upsert([self._item("a"), self._item("b", etag="e2"), self._item("c")]), (1, 1, 0))
+
+        self.assertEqual(
+            dict(OrderFile.objects.values_list("remote_item_id", "remote_etag")), {"a": "e1", "b": "e2", "c": "e1"}
+        )
+
+    def test_item_from_another_order_is_moved_explicitly(self):
+        from doors.models import Order, OrderFile
+
+        other = Order.objects.create(order_number="U-2")
+        OrderFile.objects.create(order=other, source="m365", remote_drive_id="d", remote_item_id="a", remote_etag="e1")
+        # той самий id на іншому диску — інший елемент
+        OrderFile.objects.create(order=other, source="m365", remote_drive_id="d2", remote_item_id="b")
+
+        self.assertEqual(self._upsert([self._item("a"), self._item("b")]), (1, 0, 1))
+
+        self.assertEqual(
+            sorted(OrderFile.objects.values_list("remote_drive_id", "remote_item_id", "order__order_number")),
+            [("d", "a", "U-1"), ("d", "b", "U-1"), ("d2", "b", "U-2")],
+        )
+
+    def test_created_is_counted_from_ids_missing_before_insert(self):
+        from doors.models import OrderFile
+
+        real_bulk_create = OrderFile.objects.bulk_create
+
+        def concurrent_insert_first(rows, **kwargs):
+            # паралельний запуск встиг вставити "b" між нашим SELECT і INSERT
+            OrderFile.objects.create(order=self.order, source="m365", remote_drive_id="d", remote_item_id="b")
+            return real_bulk_create(rows, **kwargs)
+
+        with mock.patch.object(OrderFile.objects, "bulk_create", concurrent_insert_first):
+            created, _, _ = self._upsert([self._item("a"), self._item("b")])
+
+        # створені = id, яких бракувало до INSERT; рядок "b" не подвоюється
+        self.assertEqual(created, 2)
+        self.assertEqual(OrderFile.objects.filter(remote_item_id="b").count(), 1)
+
+
+@override_settings(
+    M365_SITE_DISPLAY_NAMES=["Проекти"],
+    M365_SYNC_CHAINS={"final": [{"type": "child_contains", "value": "Для КС"}]},
+    M365_SYNC_FOLDER_ATTEMPTS=2,
+    M365_SYNC_MAX_ERROR_RATIO=0.25,
+)
+class SyncCheckpointTests(TestCase):
+    """sync_m365_orders: повний обхід частинами з чекпойнтами, повтори невдалих папок, поріг помилок."""
+
+    def setUp(self):
+        from doors.management.commands import sync_m365_orders as cmd
+
+        self.cmd = cmd
+        self.fake = FakeGraphServer().start()
+        self.addCleanup(self.fake.stop)
+        self.fake.children[("d", "root")] = [_folder(f"p{p}", f"Проект {p}") for p in range(12)]
+        for p in range(12):
+            self.fake.children[("d", f"p{p}")] = [_folder(f"p{p}-ks", "Для КС")]
+            self.fake.children[("d", f"p{p}-ks")] = [{"id": f"p{p}-f", "name": "a.dwg", "file": {}}]
+
+        for patcher in (
+            mock.patch.object(m365_graph, "GRAPH_BASE", self.fake.graph_base),
+            mock.patch.object(m365_graph, "get_app_token", lambda: "test-token"),
+            mock.patch.object(cmd, "find_site_by_display_name", lambda name: {"id": "s"}),
+            mock.patch.object(cmd, "pick_drive", lambda site_id, name: {"id": "d"}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        _isolated_graph_state(self)
+
+    def _run(self, **options):
+        out = io.StringIO()
+        return self.cmd.Command(stdout=out, stderr=out)._sync_once(**{"incremental": True, **options})["Проекти"]
+
+    def test_full_pass_resumes_from_checkpoints_and_retries_failed_folder(self):
+        from doors.models import M365DriveState, M365FolderSyncState, Order
+
+        broken = self.fake.children.pop(("d", "p0-ks"))
+
+        self.assertTrue(self._run(max_folders=5))
+        state = M365DriveState.objects.get()
+        self.assertIsNotNone(state.pass_started_at)
+        self.assertEqual(state.status, "error")
+        # невдала папка повторена в тому ж запуску — до межі спроб
+        self.assertEqual(M365FolderSyncState.objects.get(folder_id="p0").attempts, 2)
+        self.assertEqual(Order.objects.count(), 4)
+
+        self.fake.children[("d", "p0-ks")] = broken
+        self.assertTrue(self._run(max_folders=5))
+        # p0 вичерпав спроби в цьому обході — продовження бере лише нові папки
+        self.assertEqual(M365FolderSyncState.objects.get(folder_id="p0").status, "error")
+        self.assertEqual(Order.objects.count(), 9)
+
+        self.assertTrue(self._run(max_folders=5))
+        state.refresh_from_db()
+        self.assertIsNone(state.pass_started_at)
+        self.assertTrue(state.delta_link)
+        self.assertEqual(Order.objects.count(), 11)
+
+        # наступний --incremental підхоплює папку, що впала під час обходу
+        self.assertTrue(self._run())
+        self.assertEqual(Order.objects.count(), 12)
+        self.assertFalse(M365FolderSyncState.objects.exclude(status="ok").exists())
+
+    def test_ctag_skip_only_on_normal_pass(self):
+        from doors.models import M365DriveState, OrderFile
+
+        for p, folder in enumerate(self.fake.children[("d", "root")]):
+            folder.update(eTag=f'"p{p},1"', cTag=f'"c:p{p},1"')
+        self.assertTrue(self._run(incremental=False))
+        self.assertEqual(OrderFile.objects.count(), 12)
+
+        # файл глибоко під папкою, cTag папки проекту не зсунувся
+        self.fake.children[("d", "p0-ks")].append({"id": "p0-g", "name": "b.dwg", "file": {}})
+        self.assertTrue(self._run(incremental=False))
+        self.assertFalse(OrderFile.objects.filter(remote_item_id="p0-g").exists())
+
+        # відкат з --incremental (deltaLink протух) обходить усі папки, навіть продовжений
+        M365DriveState.objects.update(delta_link="")
+        self.assertTrue(self._run(max_folders=5))
+        self.assertTrue(M365DriveState.objects.get().pass_full)
+        self.assertTrue(self._run(max_folders=5))
+        self.assertTrue(self._run(max_folders=5))
+        self.assertTrue(OrderFile.objects.filter(remote_item_id="p0-g").exists())
+        self.assertFalse(M365DriveState.objects.get().pass_full)
+
+    def test_cycle_fails_when_errors_exceed_threshold(self):
+        for p in range(4):
+            self.fake.children.pop(("d", f"p{p}-ks"))
+
+        self.assertFalse(self._run())
+
+        for p in range(1, 4):
+            self.fake.children[("d", f"p{p}-ks")] = [{"id": f"p{p}-f", "name": "a.dwg", "file": {}}]
+        self.assertTrue(self._run(full=True))
@@ -11,6 +11,7 @@ urlpatterns = [
     path("worklog/", views.worklog_list, name="worklog_list"),
     path("report/", views.report_view, name="report_view"),
     path("report/period/", views.report_period_view, name="report_period"),
+    path("report/efficiency/", views.efficiency_series_view, name="report_efficiency"),
     path("worklog/", views.worklog_list, name="worklog_list"),
     path("worklog/delete/<int:pk>/", views.worklog_delete, name="worklog_delete"),
     path("worklog/add/", views.worklog_add, name="worklog_add"),
@@ -32,5 +33,6 @@ urlpatterns = [
     path("m365/image/<int:image_id>/thumb/", views.m365_image_thumb, name="m365_image_thumb"),
     path("m365/file/<int:file_id>/inline/", views.order_file_inline, name="order_file_inline"),
     path("orders/<int:order_id>/sync-internal-pdf/", views.sync_internal_pdf, name="sync_internal_pdf"),
+    path("pdf-sync-jobs/<int:job_id>/", views.pdf_sync_job_status, name="pdf_sync_job_status"),
 
 ]
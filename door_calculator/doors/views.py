@@ -1,3 +1,4 @@
+import functools
 import json
 import os
 from datetime import datetime, timedelta, date
@@ -6,33 +7,55 @@ from io import BytesIO
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Sum, Q
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Sum, Q, Avg, Count, F, FloatField, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce
 from django.http import HttpResponse, JsonResponse, HttpResponseBadRequest, FileResponse, StreamingHttpResponse, \
-    Http404, QueryDict
+    Http404
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
-from openpyxl import Workbook
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import mm
 from reportlab.lib.utils import ImageReader
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from doors.services.m365_graph import get_app_token, list_children, search_in_folder, upload_bytes_to_folder
+from doors.services.m365_graph import (
+    GraphError,
+    GraphUnavailable,
+    batch_list_children,
+    get_app_token,
+    graph_stream,
+    item_content_url,
+    item_thumbnail_url,
+    iter_response,
+    list_children,
+    search_in_folder,
+)
+from doors.services.pdf_common import PDF_TOTAL_ROW_COLOR, grid_table_style, pdf_base_font, pdf_cell_styles
+from doors.services.pdf_sync import enqueue_pdf_sync, job_status_payload
+from doors.services.period_report_pdf import render_period_report_pdf
+from doors.services.report_cache import cached_report
+from doors.services.period_report import CellFormatter, iter_period_rows, period_days, progress_matrix
+from doors.services.efficiency import (
+    ALLOWED_WINDOWS as EFFICIENCY_ALLOWED_WINDOWS,
+    DEFAULT_WINDOWS as EFFICIENCY_DEFAULT_WINDOWS,
+    FREQUENCIES as EFFICIENCY_FREQUENCIES,
+    NormTimeline,
+    efficiency_series,
+)
+from doors.services.hours_rollups import daily_hours, worker_totals
+from doors.services.xlsx_export import EXPORT_CHUNK_SIZE, xlsx_response
 from .forms import OrderProgressForm
 from .models import (
     Category, Product, Addition, Coefficient, Rate,
     Order, OrderItem, AdditionItem, WorkLog, Worker,
-    OrderProgress, OrderImage, CompanyInfo, OrderFile, Customer, OrderImageMarker, OrderNameDirectory, OrderItemProduct
+    OrderProgress, OrderImage, CompanyInfo, OrderFile, Customer, OrderImageMarker, OrderNameDirectory, OrderItemProduct,
+    PdfSyncJob, OrderProgressSnapshot, WorkerHoursRollup,
 )
 from reportlab.platypus import Paragraph
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.lib.enums import TA_LEFT
-import requests
 from django.urls import reverse
 from django.views.decorators.clickjacking import xframe_options_exempt
 from django.utils.html import strip_tags
@@ -1040,6 +1063,18 @@ def _q2(x: Decimal) -> Decimal:
     return x.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
 
+def _client_table_style(base_font: str) -> list:
+    """Стиль таблиць клієнтської КП: сітка, біла шапка, шрифт 10."""
+    return grid_table_style(
+        base_font,
+        font_size=10,
+        header_background=colors.white,
+        header_text_color=colors.black,
+        valign="TOP",
+        padding=4,
+    )
+
+
 def build_item_formula_parts(it):
     """
     Деталізація для internal PDF:
@@ -1275,48 +1310,13 @@ def generate_pdf(request, order_id):
     p = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
 
-    # ---------- шрифт ----------
-    font_path = os.path.join(settings.BASE_DIR, "doors", "static", "fonts", "DejaVuSerif.ttf")
-    if os.path.exists(font_path):
-        pdfmetrics.registerFont(TTFont("DejaVuSerif", font_path))
-        base_font = "DejaVuSerif"
-    else:
-        base_font = "Helvetica"
-
-    # ---------- стилі ----------
-    styles = getSampleStyleSheet()
-
-    cell_style = ParagraphStyle(
-        name="CellStyle",
-        parent=styles["Normal"],
-        fontName=base_font,
-        fontSize=9,
-        leading=11,
-        alignment=TA_LEFT,
-        wordWrap="CJK",
-    )
-
-    cell_center_style = ParagraphStyle(
-        name="CellCenterStyle",
-        parent=cell_style,
-        alignment=1,
-    )
-
-    cell_right_style = ParagraphStyle(
-        name="CellRightStyle",
-        parent=cell_style,
-        alignment=2,
-    )
-
-    formula_style = ParagraphStyle(
-        name="FormulaStyle",
-        parent=styles["Normal"],
-        fontName=base_font,
-        fontSize=8,
-        leading=10,
-        alignment=TA_LEFT,
-        wordWrap="CJK",
-    )
+    # ---------- шрифт і стилі ----------
+    base_font = pdf_base_font()
+    pdf_styles = pdf_cell_styles(base_font)
+    cell_style = pdf_styles["cell"]
+    cell_center_style = pdf_styles["cell_center"]
+    cell_right_style = pdf_styles["cell_right"]
+    formula_style = pdf_styles["formula"]
 
     # ---------- шапка ----------
     if company and getattr(company, "logo", None):
@@ -1467,18 +1467,9 @@ def generate_pdf(request, order_id):
 
         col_widths = [20, 80, 35, 140, 35, 30, 70, 70, 70]
         tbl = Table(data, colWidths=col_widths)
-        tbl.setStyle(TableStyle([
-            ("GRID", (0, 0), (-1, -1), 0.6, colors.black),
-            ("FONTNAME", (0, 0), (-1, -1), base_font),
-            ("FONTSIZE", (0, 0), (-1, -1), 8),
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#0d6efd")),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-            ("ALIGN", (0, 0), (-1, 0), "CENTER"),
-            ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        tbl.setStyle(TableStyle(grid_table_style(base_font, valign="TOP", padding=4) + [
             ("LEADING", (0, 0), (-1, -1), 10),
-            ("TOPPADDING", (0, 0), (-1, -1), 4),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
-            ("BACKGROUND", (0, -1), (-1, -1), colors.HexColor("#f2f2f2")),
+            ("BACKGROUND", (0, -1), (-1, -1), PDF_TOTAL_ROW_COLOR),
         ]))
 
         _, h = tbl.wrap(0, 0)
@@ -1582,15 +1573,7 @@ def generate_pdf(request, order_id):
             ])
 
         main_table = Table(main_data, colWidths=[30, 250, 60, 110, 90])
-        main_table.setStyle(TableStyle([
-            ("GRID", (0, 0), (-1, -1), 0.6, colors.black),
-            ("FONTNAME", (0, 0), (-1, -1), base_font),
-            ("FONTSIZE", (0, 0), (-1, -1), 10),
-            ("BACKGROUND", (0, 0), (-1, 0), colors.white),
-            ("TEXTCOLOR", (0, 0), (-1, -1), colors.black),
-            ("VALIGN", (0, 0), (-1, -1), "TOP"),
-            ("TOPPADDING", (0, 0), (-1, -1), 4),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+        main_table.setStyle(TableStyle(_client_table_style(base_font) + [
             ("LEFTPADDING", (1, 1), (1, -1), 6),
             ("RIGHTPADDING", (1, 1), (1, -1), 6),
         ]))
@@ -1627,16 +1610,7 @@ def generate_pdf(request, order_id):
             ])
 
         extras_table = Table(extras_data, colWidths=[30, 230, 70, 130, 80])
-        extras_table.setStyle(TableStyle([
-            ("GRID", (0, 0), (-1, -1), 0.6, colors.black),
-            ("FONTNAME", (0, 0), (-1, -1), base_font),
-            ("FONTSIZE", (0, 0), (-1, -1), 10),
-            ("BACKGROUND", (0, 0), (-1, 0), colors.white),
-            ("TEXTCOLOR", (0, 0), (-1, -1), colors.black),
-            ("VALIGN", (0, 0), (-1, -1), "TOP"),
-            ("TOPPADDING", (0, 0), (-1, -1), 4),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
-        ]))
+        extras_table.setStyle(TableStyle(_client_table_style(base_font)))
 
         _, extras_h = extras_table.wrap(0, 0)
         extras_y = current_y - extras_h
@@ -1706,15 +1680,51 @@ def worklog_list(request):
     if end_date:
         logs = logs.filter(date__lte=end_date)
 
-    # Підсумки годин по кожному працівнику
-    totals = (
-        logs.values("worker__name", "worker__position")
-        .annotate(
-            total_hours=Sum("hours"),
-            work_hours=Sum("work_hours"),
+    # Підсумки годин по кожному працівнику — з готових підсумків (WorkerHoursRollup).
+    # Фільтр по замовленню в підсумках не врахований, тоді рахуємо по сирих записах.
+    use_rollups = not order_id
+    try:
+        totals_start = date.fromisoformat(start_date) if start_date else None
+        totals_end = date.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        use_rollups = False
+
+    if not use_rollups:
+        totals = (
+            logs.values("worker__name", "worker__position")
+            .annotate(
+                total_hours=Sum("hours"),
+                work_hours=Sum("work_hours"),
+            )
+            .order_by("worker__name")
+        )
+    else:
+        totals = worker_totals(totals_start, totals_end, worker_id=worker_id)
+
+    if request.GET.get("export") == "excel":
+        def export_rows():
+            for log in logs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+                yield [
+                    log.date.strftime("%d.%m.%Y"),
+                    log.worker.name,
+                    log.worker.position or "",
+                    log.order.order_number if log.order else "",
+                    float(log.hours or 0),
+                    float(log.work_hours) if log.work_hours is not None else None,
+                    log.comment or "",
+                ]
+
+        return xlsx_response(
+            filename=f"worklogs_{datetime.now().strftime('%Y%m%d')}.xlsx",
+            sheet_title="Робочі години",
+            header=["Дата", "Працівник", "Посада", "Замовлення", "Годин за день", "ХОЗ години", "Коментар"],
+            rows=export_rows(),
+            footer=[
+                ["", t["worker__name"], t["worker__position"] or "", "Разом:",
+                 float(t["total_hours"] or 0), float(t["work_hours"] or 0), ""]
+                for t in totals
+            ],
         )
-        .order_by("worker__name")
-    )
 
     return render(request, "doors/worklog_list.html", {
         "logs": logs,
@@ -1735,6 +1745,7 @@ def worklog_delete(request, pk):
     worker_name = log.worker.name if log.worker else "—"
     log_date = log.date.strftime("%d.%m.%Y") if log.date else "—"
 
+    # підсумки годин зменшує обробник post_delete (у транзакції видалення)
     log.delete()
 
     messages.success(
@@ -1746,6 +1757,9 @@ def worklog_delete(request, pk):
     return redirect(redirect_url if redirect_url else "worklog_list")
 
 
+REPORT_PAGE_SIZE = 50
+
+
 def report_view(request):
     start_date_raw = request.GET.get("start_date")
     end_date_raw = request.GET.get("end_date")
@@ -1771,228 +1785,235 @@ def report_view(request):
     if end_date:
         orders = orders.filter(created_at__date__lte=end_date)
 
-    # Розрахунок % виконання на дату (end_date або зараз) по OrderProgress
+    # % виконання на дату (end_date або зараз): останній OrderProgress <= calc_date
+    # одним підзапитом замість окремого запиту на кожне замовлення
     calc_date = end_date or date.today()
-    for order in orders:
-        op = (
-            OrderProgress.objects
-            .filter(order=order, date__lte=calc_date)
-            .order_by("-date")
-            .first()
+    latest_progress = (
+        OrderProgress.objects
+        .filter(order=OuterRef("pk"), date__lte=calc_date)
+        .order_by("-date", "-id")
+        .values("percent")[:1]
+    )
+    orders = orders.annotate(
+        calculated_progress=Cast(
+            Coalesce(Subquery(latest_progress), F("completion_percent")),
+            FloatField(),
         )
-        if op:
-            order.calculated_progress = float(op.percent)
-        else:
-            order.calculated_progress = float(order.completion_percent or 0)
-
-    # Поділ на активні/відкладені
-    active_orders = [o for o in orders if o.status != "postponed"]
-    postponed_orders = [o for o in orders if o.status == "postponed"]
-
-    # Загальна вартість по активним
-    total_value = (
-            Order.objects
-            .filter(id__in=[o.id for o in active_orders])
-            .aggregate(Sum("total_cost"))["total_cost__sum"]
-            or Decimal("0")
     )
 
-    # Середній % виконання по активним
-    if active_orders:
-        avg_progress = sum(o.calculated_progress for o in active_orders) / len(active_orders)
-    else:
-        avg_progress = 0
+    # Підсумки одним агрегатом: вартість і середній % — по активних (не відкладених)
+    active_q = ~Q(status="postponed")
+
+    def aggregate_totals():
+        return orders.aggregate(
+            orders_count=Count("id"),
+            active_count=Count("id", filter=active_q),
+            postponed_count=Count("id", filter=Q(status="postponed")),
+            total_value=Sum("total_cost", filter=active_q),
+            avg_progress=Avg("calculated_progress", filter=active_q),
+        )
 
-    # Експорт в Excel
+    # Експорт в Excel — потоково, рядки йдуть з курсора БД без накопичення в памʼяті
     if export == "excel":
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Звіт по замовленнях"
-        ws.append(["№", "Номер", "Статус", "Вартість (грн)", "К/С", "Виконано (%)", "Дата"])
-
-        for idx, order in enumerate(orders, start=1):
-            ws.append([
-                idx,
-                order.order_number,
-                order.get_status_display(),
-                float(order.total_cost or 0),
-                float(order.total_ks or 0),
-                round(order.calculated_progress, 1),
-                order.created_at.strftime("%d.%m.%Y"),
-            ])
+        totals = aggregate_totals()
+        total_value = totals["total_value"] or Decimal("0")
+        avg_progress = totals["avg_progress"] or 0
+
+        def export_rows():
+            for idx, order in enumerate(orders.iterator(chunk_size=EXPORT_CHUNK_SIZE), start=1):
+                yield [
+                    idx,
+                    order.order_number,
+                    order.get_status_display(),
+                    float(order.total_cost or 0),
+                    float(order.total_ks or 0),
+                    round(order.calculated_progress or 0, 1),
+                    order.created_at.strftime("%d.%m.%Y"),
+                ]
+
+        return xlsx_response(
+            filename=f"report_{datetime.now().strftime('%Y%m%d')}.xlsx",
+            sheet_title="Звіт по замовленнях",
+            header=["№", "Номер", "Статус", "Вартість (грн)", "К/С", "Виконано (%)", "Дата"],
+            rows=export_rows(),
+            footer=[["", "Разом:", "", float(total_value), "", f"{avg_progress:.1f}%", ""]],
+        )
 
-        ws.append([])
-        ws.append([
-            "",
-            "Разом:",
-            "",
-            float(total_value),
-            "",
-            f"{avg_progress:.1f}%",
-            "",
-        ])
+    try:
+        per_page = min(max(int(request.GET.get("per_page") or REPORT_PAGE_SIZE), 1), 500)
+    except ValueError:
+        per_page = REPORT_PAGE_SIZE
+    try:
+        page_number = max(int(request.GET.get("page") or 1), 1)
+    except ValueError:
+        page_number = 1
 
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        response["Content-Disposition"] = f'attachment; filename="report_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-        wb.save(response)
-        return response
+    def compute_page():
+        page = Paginator(orders, per_page).get_page(page_number)
+        return {"totals": aggregate_totals(), "page_number": page.number, "orders": list(page.object_list)}
+
+    # повторні перегляди з тими самими параметрами беруться з кешу, доки дані не змінились
+    data = cached_report(
+        "report_view",
+        {
+            "start_date": start_date,
+            "end_date": end_date,
+            "calc_date": calc_date,
+            "page": page_number,
+            "per_page": per_page,
+        },
+        compute_page,
+    )
+    totals = data["totals"]
+
+    # пагінатор над range — лише для навігації, рядки сторінки вже взяті з кешу
+    page_obj = Paginator(range(totals["orders_count"]), per_page).get_page(data["page_number"])
+    page_obj.object_list = data["orders"]
 
     return render(request, "doors/report.html", {
-        "orders": orders,
+        "orders": page_obj.object_list,
+        "page_obj": page_obj,
         "start_date": start_date,
         "end_date": end_date,
-        "total_value": total_value,
-        "avg_progress": avg_progress,
-        "active_orders": active_orders,
-        "postponed_orders": postponed_orders,
+        "total_value": totals["total_value"] or Decimal("0"),
+        "avg_progress": totals["avg_progress"] or 0,
+        "orders_count": totals["orders_count"],
+        "active_count": totals["active_count"],
+        "postponed_count": totals["postponed_count"],
     })
 
 
-def report_period_view(request):
-    start_date_raw = request.GET.get("start_date")
-    end_date_raw = request.GET.get("end_date")
-
-    # Якщо дати не вибрані — останні 7 днів
-    if not start_date_raw or not end_date_raw:
-        end_date = datetime.today().date()
-        start_date = end_date - timedelta(days=7)
-    else:
-        try:
-            start_date = datetime.strptime(start_date_raw, "%Y-%m-%d").date()
-            end_date = datetime.strptime(end_date_raw, "%Y-%m-%d").date()
-        except ValueError:
-            return HttpResponseBadRequest("Некоректні дати")
-
-    if start_date > end_date:
-        start_date, end_date = end_date, start_date
-
-    # Норма виробітку (к/с за год). Можеш винести в settings або модель.
-    HV = Decimal("0.75")
-
-    # Години працівників
-    logs = (
-        WorkLog.objects
-        .select_related("worker", "order")
-        .filter(date__range=[start_date, end_date])
-    )
-
-    # Прогрес за період (щоб визначити перелік замовлень)
-    progress_in_period_qs = (
+def _period_orders(start_date: date, end_date: date) -> list[Order]:
+    """Замовлення (без дублів), що мають записи прогресу в періоді."""
+    order_ids = (
         OrderProgress.objects
-        .select_related("order")
         .filter(date__range=[start_date, end_date])
+        .values_list("order_id", flat=True)
+        .distinct()
     )
+    return list(Order.objects.filter(id__in=order_ids).order_by("order_number"))
 
-    # ----- СПИСОК ЗАМОВЛЕНЬ (БЕЗ ДУБЛІВ) -----
-    order_ids = progress_in_period_qs.values_list("order_id", flat=True).distinct()
-    orders_qs = Order.objects.filter(id__in=order_ids).order_by("order_number")
-
-    orders = [{"number": o.order_number, "name": o.order_name, "total_ks": o.total_ks} for o in orders_qs]
 
-    # ----- СПИСОК ПРАЦІВНИКІВ (ID + name) -----
-    workers = list(
-        logs.order_by("worker__name")
+def _period_workers(start_date: date, end_date: date) -> list[dict]:
+    """Працівники (ID + name), що мають години в періоді."""
+    workers = (
+        WorkerHoursRollup.objects
+        .filter(period="day", period_start__range=[start_date, end_date])
+        .order_by("worker__name")
         .values("worker_id", "worker__name")
         .distinct()
     )
-    workers = [{"id": w["worker_id"], "name": w["worker__name"]} for w in workers]
+    return [{"id": w["worker_id"], "name": w["worker__name"]} for w in workers]
+
+
+def _period_summary(order_objs, start_percents: dict, end_percents: dict, total_all: Decimal, end_date: date) -> dict:
+    """
+    Розрахунок по методичці замовника:
+    Vза_період[i] = ( %кін - %до ) * Vz / 100, Vz — total_ks (к/с) у Order.
+    """
+    # Норма виробітку (к/с за год) — чинна на кінець періоду (ProductionNorm / settings)
+    HV = NormTimeline().hv_on(end_date)
+
+    vza_period_by_order = {}
+    vzag = Decimal("0")
+
+    for order_obj in order_objs:
+        num = order_obj.order_number
+        vz = Decimal(str(order_obj.total_ks or 0))
+        d_percent = end_percents[num] - start_percents[num]
+        vza = (d_percent * vz) / Decimal("100")
 
-    # ===== МАПА ГОДИН (date, worker_id) -> total hours =====
-    hours_map = {
-        (x["date"], x["worker_id"]): Decimal(str(x["total"] or 0))
-        for x in logs.values("date", "worker_id").annotate(total=Sum("hours"))
+        # якщо не хочемо від’ємні значення (регрес) — обрізаємо
+        if vza < 0:
+            vza = Decimal("0")
+
+        vza_period_by_order[num] = vza
+        vzag += vza
+
+    t_norma = (vzag / HV) if HV > 0 else Decimal("0")  # години по нормі
+    t_fact = total_all  # фактичні години
+    eff_percent = (t_norma / t_fact * Decimal("100")) if t_fact > 0 else Decimal("0")
+
+    return {
+        "hv": HV,
+        "vzag": vzag,
+        "t_norma": t_norma,
+        "t_fact": t_fact,
+        "eff_percent": eff_percent,
+        "vza_period_by_order": vza_period_by_order,
     }
 
-    # ===== Прогреси для замовлень до end_date (щоб дістати % на start/end і по днях) =====
+
+def _period_report_context(start_date: date, end_date: date) -> dict:
+    """Усі розрахунки звіту виробітку за період (кешуються у report_period_view)."""
+    # ----- СПИСОК ЗАМОВЛЕНЬ І ПРАЦІВНИКІВ -----
+    order_objs = _period_orders(start_date, end_date)
+    orders = [{"number": o.order_number, "name": o.order_name, "total_ks": o.total_ks} for o in order_objs]
+    workers = _period_workers(start_date, end_date)
+
+    # ===== МАПА ГОДИН (date, worker_id) -> total hours — з денних підсумків =====
+    hours_map = daily_hours(start_date, end_date)
+
+    # ===== % по днях — з щоденних знімків (один запит по діапазону дат) =====
     order_numbers = [o["number"] for o in orders]
-    progress_all_qs = (
-        OrderProgress.objects
-        .filter(order__order_number__in=order_numbers, date__lte=end_date)
-        .order_by("order__order_number", "date")
-        .values("order__order_number", "date", "percent")
+    number_by_id = {o.id: o.order_number for o in order_objs}
+    snapshots_qs = (
+        OrderProgressSnapshot.objects
+        .filter(order_id__in=number_by_id, date__range=[start_date, end_date])
+        .order_by("order_id", "date")
+        .values_list("order_id", "date", "percent")
     )
 
+    # Знімки щільні від першого до останнього запису прогресу, а кожне замовлення
+    # має запис у межах періоду — тож значення на початок періоду вже є в ряду,
+    # далі forward-fill у progress_matrix
     progress_by_order = {}
-    for p in progress_all_qs:
-        num = p["order__order_number"]
-        progress_by_order.setdefault(num, []).append(
-            (p["date"], Decimal(str(p["percent"])))
-        )
+    for order_id, day, percent in snapshots_qs:
+        progress_by_order.setdefault(number_by_id[order_id], []).append((day, percent))
 
-    # helper: останній % <= target_date
-    def get_last_percent(num, target_date: date) -> Decimal:
-        arr = progress_by_order.get(num, [])
-        last = Decimal("0")
-        for d, perc in arr:
-            if d <= target_date:
-                last = perc
-            else:
-                break
-        return last
+    # ===== МАТРИЦЯ % ПО ДНЯХ (замовлення × дні, forward-fill за один прохід) =====
+    days = period_days(start_date, end_date)
+    matrix = progress_matrix(progress_by_order, order_numbers, days)
 
     # ===== ТАБЛИЦЯ ПО ДНЯХ =====
     table = []
     totals_workers = {w["id"]: Decimal("0") for w in workers}
     total_all = Decimal("0")  # Tфакт (години за період)
 
-    current_date = start_date
-    while current_date <= end_date:
-        row = {"date": current_date, "total": Decimal("0")}
+    # клітинки форматуємо тут один раз на значення — шаблон лише виводить рядки
+    fmt = CellFormatter(1)
+
+    for day_idx, current_date in enumerate(days):
+        row = {"date": current_date, "total": Decimal("0"), "order_cells": [], "worker_cells": []}
 
         # % виконання по кожному замовленню станом на current_date
-        for o in orders:
-            num = o["number"]
-            row[num] = float(get_last_percent(num, current_date))  # для красивого виводу
+        for num in order_numbers:
+            row[num] = float(matrix[num][day_idx])  # для красивого виводу
+            row["order_cells"].append(fmt(row[num]))
 
         # години по працівниках
         for w in workers:
             wid = w["id"]
             h = hours_map.get((current_date, wid), Decimal("0"))
             row[wid] = h
+            row["worker_cells"].append(fmt(h))
             totals_workers[wid] += h
             row["total"] += h
 
         total_all += row["total"]
         table.append(row)
-        current_date += timedelta(days=1)
+
+    # ===== % НА ПОЧАТОК І КІНЕЦЬ ПЕРІОДУ — перший і останній стовпці матриці =====
+    start_percents = {num: matrix[num][0] for num in order_numbers}
+    end_percents = {num: matrix[num][-1] for num in order_numbers}
 
     # ===== ПІДСУМКОВИЙ % ПО ЗАМОВЛЕННЯХ (на end_date) =====
-    totals_orders = {}
-    for o in orders:
-        num = o["number"]
-        totals_orders[num] = float(get_last_percent(num, end_date))
+    totals_orders = {num: float(end_percents[num]) for num in order_numbers}
 
     # ===== РОЗРАХУНОК ПО МЕТОДИЧЦІ ЗАМОВНИКА =====
-    # Vза_період[i] = ( %кін - %до ) * Vz / 100
-    # Vz беремо як total_ks (к/с) у Order
-    orders_map = {o.order_number: o for o in orders_qs}
+    summary = _period_summary(order_objs, start_percents, end_percents, total_all, end_date)
 
-    start_percents = {num: get_last_percent(num, start_date) for num in order_numbers}
-    end_percents = {num: get_last_percent(num, end_date) for num in order_numbers}
-
-    vza_period_by_order = {}
-    vzag = Decimal("0")
-
-    for num in order_numbers:
-        order_obj = orders_map.get(num)
-        vz = Decimal(str(getattr(order_obj, "total_ks", 0) or 0))
-        d_percent = end_percents[num] - start_percents[num]
-        vza = (d_percent * vz) / Decimal("100")
-
-        # якщо не хочемо від’ємні значення (регрес) — обрізаємо
-        if vza < 0:
-            vza = Decimal("0")
-
-        vza_period_by_order[num] = vza
-        vzag += vza
-
-    t_norma = (vzag / HV) if HV > 0 else Decimal("0")  # години по нормі
-    t_fact = total_all  # фактичні години
-    eff_percent = (t_norma / t_fact * Decimal("100")) if t_fact > 0 else Decimal("0")
-
-    work_days = (end_date - start_date).days + 1
+    work_days = len(days)
 
     context = {
         "start_date": start_date,
@@ -2006,23 +2027,157 @@ def report_period_view(request):
         "work_days": work_days,
 
         # нові показники по методичці
-        "hv": HV,
-        "vzag": vzag,
-        "t_norma": t_norma,
-        "t_fact": t_fact,
-        "eff_percent": eff_percent,
-        "vza_period_by_order": vza_period_by_order,
+        **summary,
     }
+    return context
+
+
+def _period_excel_response(start_date: date, end_date: date) -> StreamingHttpResponse:
+    """
+    Excel звіту за період: рядки по днях з курсорів знімків і денних підсумків
+    (iter_period_rows), підсумки накопичуються по ходу і пишуться після рядків.
+    """
+    order_objs = _period_orders(start_date, end_date)
+    workers = _period_workers(start_date, end_date)
+    order_ids = [o.id for o in order_objs]
+    worker_ids = [w["id"] for w in workers]
+
+    snapshots = (
+        OrderProgressSnapshot.objects
+        .filter(order_id__in=order_ids, date__range=[start_date, end_date])
+        .order_by("date", "order_id")
+        .values_list("date", "order_id", "percent")
+    )
+    hours = (
+        WorkerHoursRollup.objects
+        .filter(period="day", period_start__range=[start_date, end_date])
+        .order_by("period_start", "worker_id")
+        .values_list("period_start", "worker_id", "hours")
+    )
+
+    acc = {"start": None, "end": None, "workers": [Decimal("0")] * len(workers), "total": Decimal("0")}
+
+    def export_rows():
+        for day, percents, day_hours in iter_period_rows(
+            period_days(start_date, end_date),
+            snapshots.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+            hours.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+            order_ids,
+            worker_ids,
+        ):
+            if acc["start"] is None:
+                acc["start"] = percents
+            acc["end"] = percents
+            acc["workers"] = [t + h for t, h in zip(acc["workers"], day_hours)]
+            day_total = sum(day_hours, Decimal("0"))
+            acc["total"] += day_total
+            yield (
+                [day.strftime("%d.%m.%Y")]
+                + [float(p) for p in percents]
+                + [float(h) for h in day_hours]
+                + [float(day_total)]
+            )
+
+    def export_footer():
+        numbers = [o.order_number for o in order_objs]
+        end_percents = dict(zip(numbers, acc["end"]))
+        summary = _period_summary(order_objs, dict(zip(numbers, acc["start"])), end_percents, acc["total"], end_date)
+        yield ["Разом"] + [float(p) for p in acc["end"]] + [float(h) for h in acc["workers"]] + [float(acc["total"])]
+        yield ["Vзаг (к/с)", float(summary["vzag"])]
+        yield ["Tнорма (год)", float(summary["t_norma"])]
+        yield ["Tфакт (год)", float(summary["t_fact"])]
+        yield ["Ефективність (%)", round(float(summary["eff_percent"]), 1)]
+
+    return xlsx_response(
+        filename=f"report_period_{start_date:%Y%m%d}_{end_date:%Y%m%d}.xlsx",
+        sheet_title="Виробіток за період",
+        header=(
+            ["Дата"]
+            + [f"№{o.order_number} (%)" for o in order_objs]
+            + [f"{w['name']} (год)" for w in workers]
+            + ["Σ год за день"]
+        ),
+        rows=export_rows(),
+        footer=export_footer(),
+    )
+
+
+def report_period_view(request):
+    start_date_raw = request.GET.get("start_date")
+    end_date_raw = request.GET.get("end_date")
+
+    # Якщо дати не вибрані — останні 7 днів
+    if not start_date_raw or not end_date_raw:
+        end_date = datetime.today().date()
+        start_date = end_date - timedelta(days=7)
+    else:
+        try:
+            start_date = datetime.strptime(start_date_raw, "%Y-%m-%d").date()
+            end_date = datetime.strptime(end_date_raw, "%Y-%m-%d").date()
+        except ValueError:
+            return HttpResponseBadRequest("Некоректні дати")
+
+    if start_date > end_date:
+        start_date, end_date = end_date, start_date
 
-    # ===== Якщо просили PDF =====
-    if request.GET.get("export") == "pdf" and table:
-        # тут залишаєш свій існуючий код PDF без змін
-        # (якщо треба — потім доповнимо PDF цими метриками)
-        pass
+    # Excel — потоково з курсорів БД, без побудови (і кешування) всієї таблиці
+    if request.GET.get("export") == "excel":
+        return _period_excel_response(start_date, end_date)
+
+    # повторні перегляди тих самих дат беруться з кешу, доки дані не змінились
+    context = cached_report(
+        "report_period",
+        {"start_date": start_date, "end_date": end_date},
+        lambda: _period_report_context(start_date, end_date),
+    )
+
+    # ===== Якщо просили PDF — з тих самих готових даних, що й HTML =====
+    if request.GET.get("export") == "pdf" and context["table"]:
+        pdf_bytes = render_period_report_pdf(context)
+        return FileResponse(
+            BytesIO(pdf_bytes),
+            as_attachment=True,
+            filename=f"report_period_{start_date:%Y%m%d}_{end_date:%Y%m%d}.pdf",
+            content_type="application/pdf",
+        )
 
     return render(request, "doors/report_period.html", context)
 
 
+def efficiency_series_view(request):
+    """
+    GET /report/efficiency/?start_date=&end_date=&freq=day|week&window=7&window=30
+    Ефективність (Tнорма / Tфакт) як часовий ряд з ковзними вікнами.
+    """
+    try:
+        end_date = date.fromisoformat(request.GET["end_date"]) if request.GET.get("end_date") else date.today()
+        start_date = (
+            date.fromisoformat(request.GET["start_date"])
+            if request.GET.get("start_date")
+            else end_date - timedelta(days=89)
+        )
+        windows = [int(w) for w in request.GET.getlist("window")] or list(EFFICIENCY_DEFAULT_WINDOWS)
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Некоректні параметри"}, status=400)
+
+    freq = request.GET.get("freq") or "day"
+    if freq not in EFFICIENCY_FREQUENCIES:
+        return JsonResponse({"ok": False, "error": f"freq must be one of {EFFICIENCY_FREQUENCIES}"}, status=400)
+    if any(w not in EFFICIENCY_ALLOWED_WINDOWS for w in windows):
+        return JsonResponse({"ok": False, "error": f"window must be one of {EFFICIENCY_ALLOWED_WINDOWS}"}, status=400)
+    if start_date > end_date:
+        start_date, end_date = end_date, start_date
+    if (end_date - start_date).days > 3 * 366:
+        return JsonResponse({"ok": False, "error": "Період не може бути довшим за 3 роки"}, status=400)
+
+    data = cached_report(
+        "efficiency_series",
+        {"start_date": start_date, "end_date": end_date, "freq": freq, "windows": sorted(set(windows))},
+        lambda: efficiency_series(start_date, end_date, freq=freq, windows=windows),
+    )
+    return JsonResponse({"ok": True, **data})
+
+
 def worklog_add(request):
     if request.method == "POST":
         worker_id = request.POST.get("worker")
@@ -2044,14 +2199,15 @@ def worklog_add(request):
         if not worker_id:
             return HttpResponseBadRequest("Оберіть працівника")
 
-        # Створення запису
-        WorkLog.objects.create(
-            worker_id=worker_id,
-            date=date,
-            hours=hours,
-            work_hours=work_hours or None,  # НОВЕ
-            comment=comment,
-        )
+        # Створення запису + підсумки годин в одній транзакції
+        with transaction.atomic():
+            WorkLog.objects.create(
+                worker_id=worker_id,
+                date=date,
+                hours=hours,
+                work_hours=work_hours or None,  # НОВЕ
+                comment=comment,
+            )
 
         return redirect("worklog_list")
 
@@ -2613,30 +2769,46 @@ def add_order_name(request):
 """Teams"""
 
 
+def _graph_unavailable_as_503(view):
+    """
+    Проксі файлів M365: відкритий запобіжник Graph або затяжний throttling — одразу 503
+    з Retry-After, а не воркер, що висить на таймаутах.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except GraphError as e:
+            if not isinstance(e, GraphUnavailable) and e.status_code != 429:
+                raise
+            resp = HttpResponse("Microsoft 365 тимчасово недоступний, спробуйте пізніше",
+                                status=503, content_type="text/plain; charset=utf-8")
+            resp["Retry-After"] = str(int(getattr(e, "retry_after", 0) or 10))
+            return resp
+
+    return wrapper
+
+
 def _stream_graph_content(graph_url: str, access_token: str):
     """
     Стрімить контент з Microsoft Graph (щоб не тримати файл у памʼяті).
     """
-    r = requests.get(
-        graph_url,
-        headers={"Authorization": f"Bearer {access_token}"},
-        stream=True,
-        timeout=60,
-        allow_redirects=True,
-    )
-
-    # Важливо: Graph інколи відповідає 302 на pre-auth download URL — allow_redirects=True це покриває
+    # Важливо: Graph інколи відповідає 302 на pre-auth download URL — redirects за замовчуванням увімкнені
+    r = graph_stream(graph_url, access_token, timeout=60)
     if not r.ok:
-        return HttpResponse(r.text, status=r.status_code, content_type="text/plain")
+        body = r.text
+        r.close()
+        return HttpResponse(body, status=r.status_code, content_type="text/plain")
 
     content_type = r.headers.get("Content-Type", "application/octet-stream")
-    resp = StreamingHttpResponse(r.iter_content(chunk_size=1024 * 64), content_type=content_type)
+    resp = StreamingHttpResponse(iter_response(r, chunk_size=1024 * 64), content_type=content_type)
 
     # корисно: кеш відключити, щоб завжди брало актуальне
     resp["Cache-Control"] = "no-store"
     return resp
 
 
+@_graph_unavailable_as_503
 def order_file_download(request, file_id: int):
     of = get_object_or_404(OrderFile, id=file_id)
 
@@ -2652,15 +2824,16 @@ def order_file_download(request, file_id: int):
         raise Http404("File not available")
 
     token = get_app_token()
-    url = f"https://graph.microsoft.com/v1.0/drives/{of.remote_drive_id}/items/{of.remote_item_id}/content"
+    url = item_content_url(of.remote_drive_id, of.remote_item_id)
 
-    r = requests.get(url, headers={"Authorization": f"Bearer {token}"}, stream=True, timeout=180)
+    r = graph_stream(url, token, timeout=180)
     if r.status_code >= 400:
+        r.close()
         raise Http404(f"Graph error: {r.status_code}")
 
     filename = of.remote_name or "file"
     resp = StreamingHttpResponse(
-        r.iter_content(chunk_size=1024 * 256),
+        iter_response(r),
         content_type=r.headers.get("Content-Type", "application/octet-stream"),
     )
     resp["Content-Disposition"] = f'attachment; filename="{filename}"'
@@ -2675,19 +2848,15 @@ def _is_image_name(name: str | None) -> bool:
 
 
 def _stream_graph(url: str, token: str) -> StreamingHttpResponse:
-    r = requests.get(
-        url,
-        headers={"Authorization": f"Bearer {token}"},
-        stream=True,
-        timeout=60,
-    )
-    if r.status_code == 404:
-        raise Http404("Remote file not found")
+    r = graph_stream(url, token, timeout=60)
     if not r.ok:
+        r.close()
+        if r.status_code == 404:
+            raise Http404("Remote file not found")
         raise Http404(f"Graph error: {r.status_code}")
 
     resp = StreamingHttpResponse(
-        streaming_content=r.iter_content(chunk_size=1024 * 256),
+        streaming_content=iter_response(r),
         status=200,
     )
     ct = r.headers.get("Content-Type")
@@ -2697,6 +2866,7 @@ def _stream_graph(url: str, token: str) -> StreamingHttpResponse:
 
 
 @login_required
+@_graph_unavailable_as_503
 def m365_file_content(request, file_id: int):
     of = get_object_or_404(OrderFile, id=file_id)
 
@@ -2706,7 +2876,7 @@ def m365_file_content(request, file_id: int):
     token = get_app_token()
 
     # content stream
-    url = f"https://graph.microsoft.com/v1.0/drives/{of.remote_drive_id}/items/{of.remote_item_id}/content"
+    url = item_content_url(of.remote_drive_id, of.remote_item_id)
     resp = _stream_graph(url, token)
 
     # filename (щоб нормально завантажувалось)
@@ -2722,17 +2892,21 @@ def m365_download_bytes(*, drive_id: str, item_id: str):
     Повертає (bytes, content_type)
     """
     token = get_app_token()  # у тебе вже є
-    url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{item_id}/content"
+    url = item_content_url(drive_id, item_id)
 
-    r = requests.get(url, headers={"Authorization": f"Bearer {token}"}, timeout=60, allow_redirects=True)
-    if not r.ok:
-        raise RuntimeError(f"Graph download failed HTTP {r.status_code}: {r.text}")
+    r = graph_stream(url, token, timeout=60)
+    try:
+        if not r.ok:
+            raise RuntimeError(f"Graph download failed HTTP {r.status_code}: {r.text}")
 
-    content_type = r.headers.get("Content-Type")
-    return r.content, content_type
+        content_type = r.headers.get("Content-Type")
+        return r.content, content_type
+    finally:
+        r.close()
 
 
 @login_required
+@_graph_unavailable_as_503
 def m365_file_thumb(request, file_id: int):
     of = get_object_or_404(OrderFile, id=file_id)
 
@@ -2747,14 +2921,12 @@ def m365_file_thumb(request, file_id: int):
     token = get_app_token()
 
     # Graph thumbnails: /thumbnails/0/medium/content
-    url = (
-        f"https://graph.microsoft.com/v1.0/drives/{of.remote_drive_id}"
-        f"/items/{of.remote_item_id}/thumbnails/0/medium/content"
-    )
+    url = item_thumbnail_url(of.remote_drive_id, of.remote_item_id)
     return _stream_graph(url, token)
 
 
 @login_required
+@_graph_unavailable_as_503
 def m365_image_content(request, image_id: int):
     image = get_object_or_404(OrderImage, id=image_id)
 
@@ -2764,11 +2936,12 @@ def m365_image_content(request, image_id: int):
     token = get_app_token()
 
     # /content — віддає байти файла
-    graph_url = f"https://graph.microsoft.com/v1.0/drives/{image.remote_drive_id}/items/{image.remote_item_id}/content"
+    graph_url = item_content_url(image.remote_drive_id, image.remote_item_id)
     return _stream_graph_content(graph_url, token)
 
 
 @login_required
+@_graph_unavailable_as_503
 def m365_image_thumb(request, image_id: int):
     image = get_object_or_404(OrderImage, id=image_id)
 
@@ -2778,15 +2951,13 @@ def m365_image_thumb(request, image_id: int):
     token = get_app_token()
 
     # thumbnails — дає меншу картинку, якщо є
-    graph_url = (
-        f"https://graph.microsoft.com/v1.0/drives/{image.remote_drive_id}"
-        f"/items/{image.remote_item_id}/thumbnails/0/medium/content"
-    )
+    graph_url = item_thumbnail_url(image.remote_drive_id, image.remote_item_id)
     return _stream_graph_content(graph_url, token)
 
 
 @login_required
 @xframe_options_exempt
+@_graph_unavailable_as_503
 def order_file_inline(request, file_id):
     f = get_object_or_404(OrderFile, id=file_id)
 
@@ -2815,14 +2986,29 @@ def _is_folder(it: dict) -> bool:
     return "folder" in (it or {})
 
 
-def _find_child_folder_by_contains(drive_id: str, parent_id: str, needle: str):
+def _first_folder_contains(children, needle: str):
     n = _lower(needle)
-    for x in list_children(drive_id, parent_id):
+    for x in children or []:
         if _is_folder(x) and n in _lower(x.get("name", "")):
             return x
     return None
 
 
+def _find_child_folder_by_contains(drive_id: str, parent_id: str, needle: str):
+    return _first_folder_contains(list_children(drive_id, parent_id), needle)
+
+
+def _children_of_many(drive_id: str, folder_ids: list[str]) -> dict:
+    """list_children для кількох папок через $batch; помилка будь-якої — GraphError, як і раніше."""
+    if not folder_ids:
+        return {}
+    children = batch_list_children(drive_id, folder_ids)
+    for value in children.values():
+        if isinstance(value, GraphError):
+            raise value
+    return children
+
+
 def _unique_by_id(items: list[dict]) -> list[dict]:
     d = {}
     for it in items:
@@ -2853,13 +3039,19 @@ def resolve_target_folders_for_normal_project(order: Order, mode: str) -> list[d
         # усі КП* всередині
         cps = [x for x in list_children(drive_id, f_cp["id"]) if _is_folder(x) and "кп" in _lower(x.get("name", ""))]
 
-        result = []
+        # "1 Розрахунок матеріалів" у кожному КП — один $batch на всі КП
+        cp_children = _children_of_many(drive_id, [cp["id"] for cp in cps])
+        calcs = []
         for cp in cps:
-            f_calc = _find_child_folder_by_contains(drive_id, cp["id"], "1 Розрахунок матеріалів")
-            if not f_calc:
-                continue
-            # знайти ВСІ "Для КС" всередині f_calc через list_children (без пошуку)
-            children = list_children(drive_id, f_calc["id"]) or []
+            f_calc = _first_folder_contains(cp_children[cp["id"]], "1 Розрахунок матеріалів")
+            if f_calc:
+                calcs.append(f_calc)
+
+        # знайти ВСІ "Для КС" всередині кожного f_calc через list_children (без пошуку)
+        calc_children = _children_of_many(drive_id, [f["id"] for f in calcs])
+        result = []
+        for f_calc in calcs:
+            children = calc_children[f_calc["id"]] or []
             result.extend([x for x in children if _is_folder(x) and "для кс" in _lower(x.get("name", ""))])
         return _unique_by_id(result)
 
@@ -2877,10 +3069,11 @@ def resolve_target_folders_for_normal_project(order: Order, mode: str) -> list[d
         # Всі підпапки в "2 В роботу" (Проект 1, Проект 2, ...)
         project_folders = [x for x in list_children(drive_id, f_in_work["id"]) if _is_folder(x)]
 
+        # беремо ВСІ "Для КС" всередині кожного проекту — діти всіх проектів одним $batch
+        pf_children = _children_of_many(drive_id, [pf["id"] for pf in project_folders])
         result = []
         for pf in project_folders:
-            # беремо ВСІ "Для КС" всередині кожного проекту через list_children
-            children = list_children(drive_id, pf["id"]) or []
+            children = pf_children[pf["id"]] or []
             result.extend([
                 x for x in children
                 if _is_folder(x) and "для кс" in _lower(x.get("name", ""))
@@ -2941,12 +3134,15 @@ def sync_internal_pdf(request, order_id):
         "mode": "precalc" | "final",
         "markup": 10,
         "delivery": 300,
-        "packing": 200
+        "packing": 200,
+        "target_folder_id": "..."   # якщо раніше прийшли candidates
       }
 
-    Синхронізує PDF в Teams/SharePoint у відповідні папки.
+    Ставить синхронізацію PDF в Teams/SharePoint у чергу і одразу повертає job_id (202).
+    Резолв папок, рендер і завантаження виконує воркер run_pdf_sync_jobs,
+    стан задачі — через pdf_sync_job_status.
 
-    Логіка папок:
+    Логіка папок (у воркері):
       - work_type="project": шукає leaf-папки "Для КС" (може бути кілька)
       - work_type="rework": знаходить 1 destination папку в корені проєкту
     """
@@ -2974,145 +3170,22 @@ def sync_internal_pdf(request, order_id):
         except Exception:
             return default
 
-    markup = _num(payload.get("markup", 0), 0)
-    delivery = _num(payload.get("delivery", 0), 0)
-    packing = _num(payload.get("packing", 0), 0)
-
-    if order.work_type == "rework":
-        is_final = (mode == "final")
-        try:
-            dest = resolve_rework_destination_folder(
-                drive_id=order.remote_drive_id,
-                project_folder_id=order.remote_folder_id,
-                is_final=is_final,
-            )
-        except RuntimeError as e:
-            return JsonResponse({"ok": False, "error": str(e)}, status=404)
-
-        target_folders = [dest]
-    else:
-        target_folders = resolve_target_folders_for_normal_project(order, mode)
-        chosen_id = (payload.get("target_folder_id") or "").strip()
-
-        if order.work_type != "rework" and len(target_folders) > 1 and not chosen_id:
-            return JsonResponse({
-                "ok": False,
-                "error": "Multiple target folders found. Please choose one.",
-                "candidates": [
-                    {"id": x.get("id"), "name": x.get("name"), "webUrl": x.get("webUrl")}
-                    for x in target_folders
-                    if x and x.get("id")
-                ],
-            }, status=409)
-
-        if order.work_type != "rework" and chosen_id:
-            by_id = {x["id"]: x for x in target_folders if x and x.get("id")}
-            if chosen_id not in by_id:
-                return JsonResponse({"ok": False, "error": "target_folder_id is not among candidates"}, status=400)
-            target_folders = [by_id[chosen_id]]
-
-    if not target_folders:
-        return JsonResponse({
-            "ok": False,
-            "error": "Не знайдено цільових папок для синхронізації."
-        }, status=404)
-
-    valid_target_folders = [folder for folder in target_folders if folder and folder.get("id")]
-    if not valid_target_folders:
-        return JsonResponse({
-            "ok": False,
-            "error": "Цільові папки знайдені, але не містять коректного folder_id."
-        }, status=400)
-
-    def _render_pdf_bytes(get_params: dict) -> bytes:
-        old_get = request.GET
-        q = QueryDict(mutable=True)
-        for k, v in get_params.items():
-            q[k] = str(v)
-        request.GET = q
-        try:
-            resp = generate_pdf(request, order_id)
-            content = getattr(resp, "content", None)
-            if content is None:
-                content = b"".join(resp.streaming_content)
-            return content or b""
-        finally:
-            request.GET = old_get
-
-    base_params = {
-        "markup": markup,
-        "delivery": delivery,
-        "packing": packing,
+    job_payload = {
+        "markup": _num(payload.get("markup", 0), 0),
+        "delivery": _num(payload.get("delivery", 0), 0),
+        "packing": _num(payload.get("packing", 0), 0),
+        "target_folder_id": (payload.get("target_folder_id") or "").strip(),
     }
 
-    mode_label = "Попередній" if mode == "precalc" else "Фінальний"
-
-    uploaded_folders = 0
-    uploaded_files = []
-
-    for folder in valid_target_folders:
-        folder_id = folder.get("id")
-        pdf_number = build_pdf_number(order, mode, folder)
-
-        if order.work_type == "rework":
-            pdfs = [
-                (
-                    "detailed",
-                    {**base_params, "pdf_number": pdf_number},
-                    f"{mode_label}_Детальний_{pdf_number}.pdf"
-                ),
-                (
-                    "offer",
-                    {**base_params, "simple": 1, "pdf_number": pdf_number},
-                    f"{mode_label}_Комерційна_пропозиція_{pdf_number}.pdf"
-                ),
-                (
-                    "internal",
-                    {**base_params, "internal": 1, "pdf_number": pdf_number},
-                    f"{mode_label}_Внутрішній_розрахунок_{pdf_number}.pdf"
-                ),
-            ]
-        else:
-            pdfs = [
-                (
-                    "internal",
-                    {**base_params, "internal": 1, "pdf_number": pdf_number},
-                    f"{mode_label}_Внутрішній_розрахунок_{pdf_number}.pdf"
-                ),
-            ]
-
-        uploaded_any_in_folder = False
-
-        for label, params, filename in pdfs:
-            pdf_bytes = _render_pdf_bytes(params)
-            if not pdf_bytes:
-                return JsonResponse({"ok": False, "error": f"Failed to render PDF: {label}"}, status=500)
-
-            upload_bytes_to_folder(
-                drive_id=order.remote_drive_id,
-                folder_id=folder_id,
-                filename=filename,
-                content=pdf_bytes,
-                content_type="application/pdf",
-            )
-            uploaded_files.append(filename)
-            uploaded_any_in_folder = True
-
-        if uploaded_any_in_folder:
-            uploaded_folders += 1
-
-    if uploaded_folders == 0:
-        return JsonResponse({
-            "ok": False,
-            "error": "PDF не було завантажено в жодну папку."
-        }, status=400)
+    job, created = enqueue_pdf_sync(order, mode, job_payload)
 
     return JsonResponse({
-        "ok": True,
-        "mode": mode,
-        "work_type": order.work_type,
-        "uploaded_to": uploaded_folders,
-        "files": uploaded_files,
-    })
+        **job_status_payload(job),
+        "deduplicated": not created,
+        "status_url": reverse("pdf_sync_job_status", args=[job.id]),
+    }, status=202)
 
 
+def pdf_sync_job_status(request, job_id):
+    job = get_object_or_404(PdfSyncJob, id=job_id)
+    return JsonResponse(job_status_payload(job))